@@ -74,6 +74,11 @@ async def create_mongodb_indexes():
     await events_collection.create_index([("agent_id", 1), ("timestamp", -1)])
     await events_collection.create_index([("event_type", 1)])
 
+    # DLP events collection: cloud pollers batch-check duplicates by id
+    dlp_events_collection = mongodb_database["dlp_events"]
+    await dlp_events_collection.create_index("id", unique=True)
+    await dlp_events_collection.create_index([("agent_id", 1), ("timestamp", -1)])
+
     # Audit logs collection indexes
     audit_collection = mongodb_database["audit_logs"]
     await audit_collection.create_index("timestamp")
@@ -0,0 +1,27 @@
+"""remember OneDrive delta query support per connection
+
+Revision ID: onedrive_supports_delta
+Revises: onedrive_token_expiry_epoch
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "onedrive_supports_delta"
+down_revision = "onedrive_token_expiry_epoch"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "onedrive_connections",
+        sa.Column("supports_delta", sa.Boolean(), nullable=False, server_default=sa.true()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("onedrive_connections", "supports_delta")
@@ -0,0 +1,27 @@
+"""remember OneDrive folder-scoped delta support per connection
+
+Revision ID: onedrive_supports_folder_delta
+Revises: onedrive_supports_delta
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "onedrive_supports_folder_delta"
+down_revision = "onedrive_supports_delta"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "onedrive_connections",
+        sa.Column("supports_folder_delta", sa.Boolean(), nullable=False, server_default=sa.true()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("onedrive_connections", "supports_folder_delta")
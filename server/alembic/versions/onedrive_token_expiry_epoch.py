@@ -0,0 +1,39 @@
+"""store OneDrive token expiry as epoch seconds
+
+Revision ID: onedrive_token_expiry_epoch
+Revises: add_onedrive_tables
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "onedrive_token_expiry_epoch"
+down_revision = "add_onedrive_tables"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing values are naive UTC timestamps
+    op.alter_column(
+        "onedrive_connections",
+        "token_expiry",
+        existing_type=sa.DateTime(),
+        type_=sa.BigInteger(),
+        existing_nullable=True,
+        postgresql_using="EXTRACT(EPOCH FROM token_expiry AT TIME ZONE 'UTC')::bigint",
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "onedrive_connections",
+        "token_expiry",
+        existing_type=sa.BigInteger(),
+        type_=sa.DateTime(),
+        existing_nullable=True,
+        postgresql_using="(to_timestamp(token_expiry) AT TIME ZONE 'UTC')",
+    )
@@ -194,6 +194,25 @@ async def list_onedrive_folders(
     )
 
 
+@router.get("/connections/{connection_id}/folders/tree")
+async def list_onedrive_folder_tree(
+    connection_id: UUID,
+    max_depth: int = Query(2, ge=1, le=5),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    List the folder tree of a OneDrive connection in a single request.
+    Subfolders are fetched concurrently server-side.
+    """
+    service = OneDriveOAuthService(db)
+    return await service.list_folders_recursive(
+        user_id=current_user.id,
+        connection_id=connection_id,
+        max_depth=max_depth,
+    )
+
+
 @router.delete("/connections/{connection_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_onedrive_connection(
     connection_id: UUID,
@@ -106,6 +106,16 @@ class CacheService:
             logger.warning("Cache set failed", key=key, error=str(e))
             return False
 
+    async def set_if_absent(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        """
+        Set value only if key does not exist (SET NX). Returns True when set.
+        """
+        try:
+            return bool(await self.client.set(key, json.dumps(value), ex=expire, nx=True))
+        except Exception as e:
+            logger.warning("Cache set_if_absent failed", key=key, error=str(e))
+            return False
+
     async def delete(self, key: str) -> bool:
         """
         Delete value from cache
@@ -52,6 +52,10 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = Field(default="cybersentinel_dlp")
     POSTGRES_POOL_SIZE: int = Field(default=20)
     POSTGRES_MAX_OVERFLOW: int = Field(default=10)
+    # Compiled-statement cache entries per engine (SQLAlchemy default is 500)
+    POSTGRES_QUERY_CACHE_SIZE: int = Field(default=1500)
+    # asyncpg prepared statements kept per connection (SQLAlchemy's asyncpg default is 100)
+    POSTGRES_STATEMENT_CACHE_SIZE: int = Field(default=1024, ge=0)
 
     @property
     def DATABASE_URL(self) -> str:
@@ -178,6 +182,8 @@ class Settings(BaseSettings):
     ONEDRIVE_CLIENT_SECRET: Optional[str] = Field(default=None)
     ONEDRIVE_REDIRECT_URI: Optional[str] = Field(default=None)
     ONEDRIVE_TENANT_ID: Optional[str] = Field(default="consumers")  # "consumers" for personal accounts, "common" for both, or tenant ID for org accounts
+    # Keep the full Graph delta item on stored events; when False only the fields the dashboard shows are kept
+    ONEDRIVE_STORE_RAW_DELTA: bool = Field(default=True)
 
     @field_validator("CORS_ORIGINS", mode="before")
     @classmethod
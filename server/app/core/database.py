@@ -12,8 +12,12 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
 )
+from sqlalchemy import DateTime
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql.expression import FunctionElement
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
 import structlog
 
 from app.core.config import settings
@@ -23,64 +27,99 @@ logger = structlog.get_logger()
 # SQLAlchemy Base for models
 Base = declarative_base()
 
+
+class utcnow(FunctionElement):
+    """
+    Database-side current time as a naive UTC timestamp, matching the datetime.utcnow() column defaults
+    """
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow, "postgresql")
+def _pg_utcnow(element, compiler, **kw) -> str:
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw) -> str:
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
 # Global database instances
 postgres_engine: Optional[AsyncEngine] = None
 postgres_session_factory: Optional[async_sessionmaker] = None
 mongodb_client: Optional[AsyncIOMotorClient] = None
 mongodb_database: Optional[AsyncIOMotorDatabase] = None
 
+# Name of the TTL index that expires dlp_events after EVENT_RETENTION_DAYS
+EVENT_RETENTION_INDEX = "timestamp_ttl"
+
 
 async def init_databases() -> None:
     """
     Initialize database connections
+
+    Safe to call again: a backend that is already connected is left as is, so callers
+    such as Celery workers can ensure the pools exist without rebuilding them.
     """
     global postgres_engine, postgres_session_factory, mongodb_client, mongodb_database
 
     # Initialize PostgreSQL
-    try:
-        postgres_engine = create_async_engine(
-            settings.DATABASE_URL,
-            echo=settings.DEBUG,
-            pool_size=settings.POSTGRES_POOL_SIZE,
-            max_overflow=settings.POSTGRES_MAX_OVERFLOW,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-        )
-
-        postgres_session_factory = async_sessionmaker(
-            postgres_engine,
-            class_=AsyncSession,
-            expire_on_commit=False,
-            autocommit=False,
-            autoflush=False,
-        )
-
-        # Test connection
-        async with postgres_engine.begin() as conn:
-            await conn.execute(text("SELECT 1"))
-
-        logger.info(
-            "PostgreSQL connection established",
-            host=settings.POSTGRES_HOST,
-            database=settings.POSTGRES_DB,
-        )
+    if postgres_session_factory is None:
+        try:
+            engine = create_async_engine(
+                settings.DATABASE_URL,
+                echo=settings.DEBUG,
+                pool_size=settings.POSTGRES_POOL_SIZE,
+                max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+                query_cache_size=settings.POSTGRES_QUERY_CACHE_SIZE,
+                connect_args={"prepared_statement_cache_size": settings.POSTGRES_STATEMENT_CACHE_SIZE},
+            )
+            postgres_engine = engine
+
+            # Test connection
+            async with engine.begin() as conn:
+                await conn.execute(text("SELECT 1"))
+
+            # Published only once the connection works, so a failed attempt is retried next call
+            postgres_session_factory = async_sessionmaker(
+                engine,
+                class_=AsyncSession,
+                expire_on_commit=False,
+                autocommit=False,
+                autoflush=False,
+            )
+
+            logger.info(
+                "PostgreSQL connection established",
+                host=settings.POSTGRES_HOST,
+                database=settings.POSTGRES_DB,
+            )
+
+        except Exception as e:
+            logger.error("Failed to connect to PostgreSQL", error=str(e))
+            raise
 
-    except Exception as e:
-        logger.error("Failed to connect to PostgreSQL", error=str(e))
-        raise
+    if mongodb_database is not None:
+        return
 
     # Initialize MongoDB
     try:
-        mongodb_client = AsyncIOMotorClient(
+        client = AsyncIOMotorClient(
             settings.MONGODB_URL,
             maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
             serverSelectionTimeoutMS=5000,
         )
-
-        mongodb_database = mongodb_client[settings.MONGODB_DB]
+        mongodb_client = client
 
         # Test connection
-        await mongodb_client.admin.command('ping')
+        await client.admin.command('ping')
+
+        mongodb_database = client[settings.MONGODB_DB]
 
         logger.info(
             "MongoDB connection established",
@@ -92,22 +131,62 @@ async def init_databases() -> None:
         logger.error("Failed to connect to MongoDB", error=str(e))
         raise
 
+    try:
+        await ensure_event_retention_index(mongodb_database)
+    except Exception as e:
+        # Retention is housekeeping; a missing index must not keep the service from starting
+        logger.warning("Failed to ensure dlp_events retention index", error=str(e))
+
+
+async def ensure_event_retention_index(mongo_db: AsyncIOMotorDatabase) -> None:
+    """
+    Let MongoDB expire dlp_events older than EVENT_RETENTION_DAYS through a TTL index.
+
+    The TTL monitor deletes expired documents about once a minute, spreading the work
+    over the day instead of a nightly bulk delete; the index also serves timestamp range
+    queries. When EVENT_RETENTION_DAYS changes, the existing index is retuned in place
+    with collMod rather than dropped and rebuilt.
+    """
+    expire_after = settings.EVENT_RETENTION_DAYS * 86400
+    events_collection = mongo_db["dlp_events"]
+    try:
+        await events_collection.create_index(
+            "timestamp",
+            name=EVENT_RETENTION_INDEX,
+            expireAfterSeconds=expire_after,
+            background=True,
+        )
+    except OperationFailure as e:
+        # 85/86: an index on timestamp exists with another expiry (or none, or another name)
+        if e.code not in (85, 86):
+            raise
+        await mongo_db.command(
+            "collMod",
+            "dlp_events",
+            index={"keyPattern": {"timestamp": 1}, "expireAfterSeconds": expire_after},
+        )
+        logger.info("Updated dlp_events retention index", expire_after_seconds=expire_after)
+
 
 async def close_databases() -> None:
     """
     Close database connections
     """
-    global postgres_engine, mongodb_client
+    global postgres_engine, postgres_session_factory, mongodb_client, mongodb_database
 
     # Close PostgreSQL
     if postgres_engine is not None:
         await postgres_engine.dispose()
         logger.info("PostgreSQL connection closed")
+    postgres_engine = None
+    postgres_session_factory = None
 
     # Close MongoDB
     if mongodb_client is not None:
         mongodb_client.close()
         logger.info("MongoDB connection closed")
+    mongodb_client = None
+    mongodb_database = None
 
 
 @asynccontextmanager
@@ -7,6 +7,7 @@ import logging
 import sys
 from typing import Any
 
+import orjson
 import structlog
 from structlog.types import EventDict, Processor
 
@@ -23,6 +24,20 @@ def add_app_context(logger: Any, method_name: str, event_dict: EventDict) -> Eve
     return event_dict
 
 
+def orjson_dumps(obj: Any, **kwargs: Any) -> str:
+    """
+    JSON serializer for structlog's JSONRenderer backed by orjson
+
+    Naive datetimes are rendered as UTC and non-string keys are allowed, matching
+    what the stdlib serializer would accept for our event dicts.
+    """
+    return orjson.dumps(
+        obj,
+        default=kwargs.get("default"),
+        option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    ).decode()
+
+
 def setup_logging() -> None:
     """
     Configure structured logging with JSON output
@@ -32,6 +47,8 @@ def setup_logging() -> None:
 
     # Configure processors
     processors: list[Processor] = [
+        # Drop events below the configured level before any processor formats or renders them
+        structlog.stdlib.filter_by_level,
         structlog.contextvars.merge_contextvars,
         structlog.stdlib.add_logger_name,
         structlog.stdlib.add_log_level,
@@ -44,7 +61,7 @@ def setup_logging() -> None:
 
     # Add appropriate renderer based on format
     if settings.LOG_FORMAT == "json":
-        processors.append(structlog.processors.JSONRenderer())
+        processors.append(structlog.processors.JSONRenderer(serializer=orjson_dumps))
     else:
         processors.append(structlog.dev.ConsoleRenderer())
 
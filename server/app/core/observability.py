@@ -12,6 +12,8 @@ from prometheus_client import Counter, Histogram, Gauge, Info
 from fastapi import Request
 import logging
 
+from app.core.logging import orjson_dumps
+
 # Configure structlog
 structlog.configure(
     processors=[
@@ -23,7 +25,7 @@ structlog.configure(
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
         structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
+        structlog.processors.JSONRenderer(serializer=orjson_dumps)
     ],
     context_class=dict,
     logger_factory=structlog.stdlib.LoggerFactory(),
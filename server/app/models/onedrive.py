@@ -6,12 +6,16 @@ from __future__ import annotations
 
 import base64
 import hashlib
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Optional, ClassVar
 
 from cryptography.fernet import Fernet
 from sqlalchemy import (
+    BigInteger,
+    Boolean,
     Column,
     DateTime,
     ForeignKey,
@@ -56,10 +60,14 @@ class OneDriveConnection(Base):
     tenant_id = Column(String(255), nullable=True)  # For multi-tenant support
     refresh_token = Column(Text, nullable=False)
     access_token = Column(Text, nullable=True)
-    token_expiry = Column(DateTime, nullable=True)
+    token_expiry = Column(BigInteger, nullable=True)  # UNIX epoch seconds (UTC)
     scopes = Column(JSON, nullable=True, default=list)
     last_delta_token = Column(String(512), nullable=True)  # Graph API delta token
     last_polled_at = Column(DateTime, nullable=True)
+    # False once Graph rejects delta queries (e.g. personal accounts without SPO license)
+    supports_delta = Column(Boolean, default=True, nullable=False)
+    # False once Graph rejects folder-scoped delta (/items/{id}/delta); root delta is used instead
+    supports_folder_delta = Column(Boolean, default=True, nullable=False)
     status = Column(String(20), nullable=False, default="active")
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -74,6 +82,12 @@ class OneDriveConnection(Base):
     __allow_unmapped__ = True
 
     _cipher: ClassVar[Optional[Fernet]] = None
+    # Treat tokens as expired slightly early so in-flight Graph calls don't race expiry
+    TOKEN_EXPIRY_SKEW_SECONDS: ClassVar[int] = 60
+    # Decrypted access tokens keyed by ciphertext. Every poll cycle reloads the same ciphertext until
+    # the token is refreshed, and a refresh stores a new ciphertext, so entries never go stale.
+    _access_token_cache: ClassVar["OrderedDict[str, str]"] = OrderedDict()
+    ACCESS_TOKEN_CACHE_SIZE: ClassVar[int] = 256
 
     @classmethod
     def _get_cipher(cls) -> Fernet:
@@ -105,16 +119,28 @@ class OneDriveConnection(Base):
 
     def get_access_token(self) -> Optional[str]:
         """Return decrypted access token if present."""
-        if not self.access_token:
+        ciphertext = self.access_token
+        if not ciphertext:
             return None
-        cipher = self._get_cipher()
-        return cipher.decrypt(self.access_token.encode("utf-8")).decode("utf-8")
+        cache = OneDriveConnection._access_token_cache
+        token = cache.get(ciphertext)
+        if token is None:
+            cipher = self._get_cipher()
+            token = cipher.decrypt(ciphertext.encode("utf-8")).decode("utf-8")
+            cache[ciphertext] = token
+            if len(cache) > self.ACCESS_TOKEN_CACHE_SIZE:
+                cache.popitem(last=False)
+        return token
 
     def is_token_expired(self) -> bool:
         """True when the cached access token is missing or expired."""
         if not self.token_expiry or not self.access_token:
             return True
-        return datetime.utcnow() >= self.token_expiry
+        return time.time() >= self.token_expiry - self.TOKEN_EXPIRY_SKEW_SECONDS
+
+    def set_token_expiry(self, expires_in: Optional[int]) -> None:
+        """Store the access token expiry as epoch seconds from an ``expires_in`` lifetime."""
+        self.token_expiry = int(time.time()) + int(expires_in) if expires_in else None
 
     def mark_error(self, message: str) -> None:
         """Record last sync error and flip status."""
@@ -8,13 +8,13 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Callable, AsyncIterator
-import re
 import structlog
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_postgres_session
 from app.services.policy_service import PolicyService
+from app.utils.policy_transformer import compile_rule_regex
 
 logger = structlog.get_logger()
 
@@ -46,7 +46,6 @@ class DatabasePolicyEvaluator:
         self._cache_ttl = timedelta(seconds=cache_ttl_seconds)
         self._cached_policies: List[Any] = []
         self._cache_expires_at: Optional[datetime] = None
-        self._regex_cache: Dict[str, re.Pattern] = {}
 
     async def evaluate_event(self, event: Dict[str, Any]) -> List[PolicyMatch]:
         """
@@ -83,6 +82,12 @@ class DatabasePolicyEvaluator:
 
         return matches
 
+    async def preload_policies(self) -> None:
+        """
+        Warm the policy cache so a batch of concurrent evaluations shares one load.
+        """
+        await self._get_cached_policies()
+
     async def _get_cached_policies(self) -> List[Any]:
         if self._cache_expires_at and self._cache_expires_at > datetime.utcnow() and self._cached_policies:
             return self._cached_policies
@@ -148,7 +153,7 @@ class DatabasePolicyEvaluator:
 
         try:
             if operator == "matches_regex":
-                pattern = self._get_regex(str(value))
+                pattern = compile_rule_regex(str(value))
                 return bool(pattern.search(str(event_value)))
             if operator == "starts_with":
                 return str(event_value).lower().startswith(str(value).lower())
@@ -233,9 +238,3 @@ class DatabasePolicyEvaluator:
             prepared_actions.append(action_payload)
 
         return prepared_actions
-
-    def _get_regex(self, pattern: str) -> re.Pattern:
-        if pattern not in self._regex_cache:
-            self._regex_cache[pattern] = re.compile(pattern, re.IGNORECASE)
-        return self._regex_cache[pattern]
-
@@ -5,6 +5,7 @@ Handles event validation, normalization, enrichment, classification, and policy
 
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+import asyncio
 import structlog
 import re
 import hashlib
@@ -27,6 +28,9 @@ class EventProcessor:
     6. Action Execution
     """
 
+    # Maximum events processed concurrently by process_batch
+    BATCH_CONCURRENCY = 32
+
     def __init__(
         self,
         policy_evaluator: Optional[DatabasePolicyEvaluator] = None,
@@ -528,21 +532,37 @@ class EventProcessor:
         """
         Process multiple events in batch
 
-        More efficient than processing one-by-one
+        Enabled policies are loaded once for the whole batch, then events run
+        through the pipeline concurrently. Failed events are logged and left out;
+        the remaining events keep their input order.
         """
-        processed_events = []
+        if not events:
+            return []
+
+        await self.policy_evaluator.preload_policies()
+        # Bound the fan-out so action executors don't exhaust downstream connection pools
+        semaphore = asyncio.Semaphore(self.BATCH_CONCURRENCY)
+
+        async def _process(event: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.process_event(event)
 
-        for event in events:
-            try:
-                processed_event = await self.process_event(event)
-                processed_events.append(processed_event)
-            except Exception as e:
+        results = await asyncio.gather(
+            *(_process(event) for event in events),
+            return_exceptions=True,
+        )
+
+        processed_events = []
+        for event, result in zip(events, results):
+            if isinstance(result, Exception):
                 logger.error(
                     "Failed to process event in batch",
                     event_id=event.get("event_id"),
-                    error=str(e)
+                    error=str(result)
                 )
                 # Continue with other events
+                continue
+            processed_events.append(result)
 
         logger.info(
             "Batch processing complete",
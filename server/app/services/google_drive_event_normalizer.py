@@ -6,6 +6,7 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Any, Dict, Optional, Tuple
 
 from app.models.google_drive import GoogleDriveConnection, GoogleDriveProtectedFolder
@@ -37,13 +38,36 @@ TRACKED_EVENT_SUBTYPES = {
 }
 
 
+def folder_event_fields(
+    connection: GoogleDriveConnection,
+    folder: GoogleDriveProtectedFolder,
+) -> Dict[str, Any]:
+    """
+    Event fields that depend only on the connection and protected folder.
+
+    Callers normalizing many activities for one folder compute this once and pass
+    it to ``normalize_drive_activity`` instead of re-deriving it per activity.
+    """
+    return {
+        "file_path": folder.folder_path or folder.folder_name or "Google Drive",
+        "connection_id": str(connection.id),
+        "folder_id": folder.folder_id,
+        "protected_folder_id": str(folder.id),
+        "folder_name": folder.folder_name,
+        "folder_path": folder.folder_path,
+    }
+
+
 def normalize_drive_activity(
     activity: Dict[str, Any],
     connection: GoogleDriveConnection,
     folder: GoogleDriveProtectedFolder,
+    folder_fields: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """Convert a Drive Activity resource into the internal event schema."""
 
+    if folder_fields is None:
+        folder_fields = folder_event_fields(connection, folder)
     event_subtype, severity = _determine_action(activity)
     actor_email = _extract_actor(activity)
     file_meta = _extract_file_metadata(activity)
@@ -51,8 +75,8 @@ def normalize_drive_activity(
 
     event_id = _build_event_id(
         activity_id=activity.get("id"),
-        connection_id=str(connection.id),
-        folder_internal_id=str(folder.id),
+        connection_id=folder_fields["connection_id"],
+        folder_internal_id=folder_fields["protected_folder_id"],
         folder_drive_id=folder.folder_id or "",
         file_id=file_meta.get("file_id") or "",
         file_name=file_meta.get("file_name") or "",
@@ -70,16 +94,11 @@ def normalize_drive_activity(
         "action": "logged",
         "timestamp": timestamp,
         "user_email": actor_email,
-        "file_path": folder.folder_path or folder.folder_name or "Google Drive",
         "file_name": file_meta.get("file_name"),
         "file_id": file_meta.get("file_id"),
         "mime_type": file_meta.get("mime_type"),
         "owner": file_meta.get("owner"),
-        "connection_id": str(connection.id),
-        "folder_id": folder.folder_id,
-        "protected_folder_id": str(folder.id),
-        "folder_name": folder.folder_name,
-        "folder_path": folder.folder_path,
+        **folder_fields,
         "google_event_id": activity.get("id"),
         "details": activity,
     }
@@ -177,9 +196,11 @@ def _build_event_id(
     return f"gdrive-{derived}"
 
 
+@lru_cache(maxsize=4096)
 def _ensure_iso_z(value: str) -> str:
+    # Memoized: activities in one response often share timestamps
     try:
-        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        dt = datetime.fromisoformat(value)
     except ValueError:
         return value
 
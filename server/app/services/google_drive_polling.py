@@ -5,14 +5,19 @@ Polling service that fetches Google Drive Activity events and ingests them into
 from __future__ import annotations
 
 import asyncio
+import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, ClassVar, Dict, List, Optional, Set, Tuple
 
+import httplib2
 import structlog
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from sqlalchemy import select
+from pymongo.errors import BulkWriteError
+from sqlalchemy import inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from app.core.config import settings
 from app.core.database import get_mongodb
@@ -20,19 +25,43 @@ from app.models.google_drive import GoogleDriveConnection, GoogleDriveProtectedF
 from app.services.event_processor import EventProcessor, get_event_processor
 from app.services.google_drive_event_normalizer import (
     TRACKED_EVENT_SUBTYPES,
+    folder_event_fields,
     normalize_drive_activity,
 )
 from app.services.google_drive_oauth import GoogleDriveOAuthService
+from app.utils.timestamps import as_naive_utc, format_timestamp_utc, parse_timestamp_utc
 
 
 logger = structlog.get_logger(__name__)
 
+# MongoDB E11000: another writer already stored this event id
+_DUPLICATE_KEY_ERROR = 11000
+
+_UTC = timezone.utc
+
+# Constant parts of every EventProcessor payload; copied per event, never mutated in place
+_AGENT_STATIC: Dict[str, str] = {"name": "Google Drive Cloud", "type": "cloud"}
+_BASE_TAGS: Tuple[str, ...] = ("google_drive", "cloud")
+# Shared fallback for missing processor sub-dicts; read-only, never handed out without copying
+_EMPTY: Dict[str, Any] = {}
+
 
 class GoogleDrivePollingService:
     """
     Pulls Drive Activity events for each connected account/folder and feeds them to EventProcessor.
     """
 
+    _indexes_ensured: ClassVar[bool] = False
+    # Upper bound on documents per insert_many call
+    INSERT_BATCH_SIZE = 500
+    # Upper bound on ids per duplicate-check $in query
+    DUPLICATE_LOOKUP_BATCH_SIZE = 500
+    FOLDER_POLL_CONCURRENCY = 4
+    # poll_all_connections commits after this many connections instead of after each one
+    COMMIT_EVERY_CONNECTIONS = 32
+    # Same as googleapiclient's own transport default
+    HTTP_TIMEOUT_SECONDS = 60
+
     def __init__(
         self,
         db: AsyncSession,
@@ -47,20 +76,62 @@ class GoogleDrivePollingService:
     async def poll_all_connections(self) -> int:
         """
         Poll every Google Drive connection. Returns number of processed events.
+
+        Kept for manual runs; scheduled polling fans out one poll_connection_by_id
+        task per connection instead. Changes are committed every COMMIT_EVERY_CONNECTIONS connections and once at the
+        end rather than per connection. If a poll fails, the uncommitted cursors of the
+        connections since the last checkpoint are rolled back with it; those events are
+        fetched again next cycle and skipped as duplicates.
         """
-        stmt = select(GoogleDriveConnection)
+        stmt = select(GoogleDriveConnection).options(selectinload(GoogleDriveConnection.folders))
         result = await self.db.execute(stmt)
         connections = result.scalars().all()
         processed = 0
-        for connection in connections:
-            processed += await self.poll_connection(connection)
+        for index, connection in enumerate(connections, start=1):
+            processed += await self.poll_connection(connection, commit=False)
+            if index % self.COMMIT_EVERY_CONNECTIONS == 0:
+                await self.db.commit()
+        await self.db.commit()
         return processed
 
-    async def poll_connection(self, connection: GoogleDriveConnection) -> int:
+    @staticmethod
+    async def get_connection_ids(db: AsyncSession) -> List[str]:
+        """
+        Return the id of every Google Drive connection, for polling them as separate tasks.
+        """
+        result = await db.execute(select(GoogleDriveConnection.id))
+        return [str(connection_id) for connection_id in result.scalars()]
+
+    async def poll_connection_by_id(self, connection_id: str) -> int:
+        """
+        Load one connection with its folders and poll it, committing its cursors.
+
+        Returns 0 if the connection has been deleted since it was scheduled.
+        """
+        stmt = (
+            select(GoogleDriveConnection)
+            .options(selectinload(GoogleDriveConnection.folders))
+            .where(GoogleDriveConnection.id == uuid.UUID(str(connection_id)))
+        )
+        result = await self.db.execute(stmt)
+        connection = result.scalar_one_or_none()
+        if connection is None:
+            logger.info("Skipping deleted connection", connection_id=str(connection_id))
+            return 0
+        return await self.poll_connection(connection)
+
+    async def poll_connection(self, connection: GoogleDriveConnection, commit: bool = True) -> int:
         """
         Poll a single connection and ingest events.
+
+        Args:
+            connection: Connection to poll
+            commit: Commit cursor/status changes before returning; poll_all_connections
+                passes False and commits in batches instead
         """
-        await self.db.refresh(connection, attribute_names=["folders"])
+        # poll_all_connections eager-loads folders; only hit the database for a bare connection
+        if "folders" in inspect(connection).unloaded:
+            await self.db.refresh(connection, attribute_names=["folders"])
         if not connection.folders:
             logger.debug("Skipping connection with no protected folders", connection_id=str(connection.id))
             return 0
@@ -68,10 +139,14 @@ class GoogleDrivePollingService:
         if connection.is_token_expired():
             await self.oauth_service.refresh_access_token(connection)
 
+        # Build the Drive Activity client once per connection: discovery parsing is then shared
+        # by every folder and page below.
         credentials = self._build_credentials(connection)
+        service = self._build_drive_activity_service(credentials)
         total = 0
         latest_connection_timestamp: Optional[datetime] = self._parse_timestamp(connection.last_activity_cursor)
 
+        active_folders: List[GoogleDriveProtectedFolder] = []
         for folder in connection.folders:
             if not folder.last_seen_timestamp:
                 folder.touch()
@@ -82,25 +157,67 @@ class GoogleDrivePollingService:
                     baseline=folder.last_seen_timestamp,
                 )
                 continue
+            active_folders.append(folder)
+
+        # Folder queries are independent API calls; run them concurrently and apply the results
+        # to the session afterwards from this single task. httplib2 transports aren't thread-safe,
+        # so each in-flight query borrows one from a pool sized to the concurrency limit, and the
+        # pooled transports keep their connections alive across folders and pages.
+        transports: asyncio.Queue = asyncio.Queue()
+        for _ in range(min(self.FOLDER_POLL_CONCURRENCY, len(active_folders))):
+            transports.put_nowait(self._build_http(credentials))
+        results = await asyncio.gather(
+            *(self._poll_one_folder(transports, service, connection, folder) for folder in active_folders)
+        )
 
-            events, latest_folder_timestamp = await self._fetch_folder_events(credentials, connection, folder)
+        candidates: Dict[str, Dict[str, Any]] = {}
+        for events, latest_folder_timestamp, folder in results:
+            total += len(events)
             for event in events:
-                await self._persist_event(event)
-                total += 1
+                # Nested protected folders can report the same activity; only the first copy is kept
+                candidates.setdefault(event["event_id"], event)
 
             if latest_folder_timestamp:
-                folder.touch(self._as_naive_utc(latest_folder_timestamp))
+                latest_naive = as_naive_utc(latest_folder_timestamp)
+                # Only write folders whose cursor actually moved; idle folders then produce no UPDATE
+                if latest_naive != folder.last_seen_timestamp:
+                    folder.touch(latest_naive)
                 if not latest_connection_timestamp or latest_folder_timestamp > latest_connection_timestamp:
                     latest_connection_timestamp = latest_folder_timestamp
 
+        # One $in lookup for the whole connection instead of a find_one per event
+        existing_ids = await self._filter_duplicates(list(candidates))
+        fresh = [event for event_id, event in candidates.items() if event_id not in existing_ids]
+        if existing_ids:
+            logger.debug("Skipped duplicate Google Drive events", duplicates=len(existing_ids))
+        pending_docs = await self._prepare_events(fresh)
+
+        # One insert_many per batch for the whole connection instead of one insert per event
+        await self._flush_events(pending_docs)
+
         connection.mark_polled(
             cursor=self._format_timestamp(latest_connection_timestamp) if latest_connection_timestamp else None
         )
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
 
         logger.info("Google Drive polling completed", connection_id=str(connection.id), events=total)
         return total
 
+    async def _poll_one_folder(
+        self,
+        transports: asyncio.Queue,
+        service,
+        connection: GoogleDriveConnection,
+        folder: GoogleDriveProtectedFolder,
+    ) -> Tuple[List[Dict[str, Any]], Optional[datetime], GoogleDriveProtectedFolder]:
+        http = await transports.get()
+        try:
+            events, latest_timestamp = await self._fetch_folder_events(service, connection, folder, http=http)
+        finally:
+            transports.put_nowait(http)
+        return events, latest_timestamp, folder
+
     def _build_credentials(self, connection: GoogleDriveConnection) -> Credentials:
         config = self.oauth_service.get_client_config()
         return Credentials(
@@ -114,15 +231,15 @@ class GoogleDrivePollingService:
 
     async def _fetch_folder_events(
         self,
-        credentials: Credentials,
+        service,
         connection: GoogleDriveConnection,
         folder: GoogleDriveProtectedFolder,
+        http: Optional[AuthorizedHttp] = None,
     ) -> Tuple[List[Dict[str, Any]], Optional[datetime]]:
         """
         Query Drive Activity API for a single folder and return any new events plus
         the most recent activity timestamp observed.
         """
-        service = self._build_drive_activity_service(credentials)
         normalized: List[Dict[str, Any]] = []
         latest_timestamp: Optional[datetime] = None
 
@@ -132,7 +249,7 @@ class GoogleDrivePollingService:
         }
 
         if folder.last_seen_timestamp:
-            start_iso = self._format_timestamp(self._as_aware_utc(folder.last_seen_timestamp))
+            start_iso = self._format_timestamp(folder.last_seen_timestamp)
             body["filter"] = f'time > "{start_iso}"'
 
         logger.info(
@@ -144,20 +261,23 @@ class GoogleDrivePollingService:
         )
 
         next_page_token: Optional[str] = None
+        # Per-folder event fields are the same for every activity; derive them once
+        folder_fields = folder_event_fields(connection, folder)
+        parse_timestamp = self._parse_timestamp
         while True:
             request_body = dict(body)
             if next_page_token:
                 request_body["pageToken"] = next_page_token
 
-            response = await asyncio.to_thread(self._execute_activity_query, service, request_body)
+            response = await asyncio.to_thread(self._execute_activity_query, service, request_body, http)
             activities = response.get("activities", [])
             for activity in activities:
-                normalized_event = normalize_drive_activity(activity, connection, folder)
-                if normalized_event.get("event_subtype") not in TRACKED_EVENT_SUBTYPES:
+                normalized_event = normalize_drive_activity(activity, connection, folder, folder_fields)
+                if normalized_event["event_subtype"] not in TRACKED_EVENT_SUBTYPES:
                     continue
 
                 normalized.append(normalized_event)
-                event_ts = self._parse_timestamp(normalized_event.get("timestamp"))
+                event_ts = parse_timestamp(normalized_event["timestamp"])
                 if event_ts and (latest_timestamp is None or event_ts > latest_timestamp):
                     latest_timestamp = event_ts
 
@@ -171,162 +291,223 @@ class GoogleDrivePollingService:
         return build("driveactivity", "v2", credentials=credentials, cache_discovery=False)
 
     @staticmethod
-    def _execute_activity_query(service, body: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_http(credentials: Credentials) -> AuthorizedHttp:
+        return AuthorizedHttp(credentials, http=httplib2.Http(timeout=GoogleDrivePollingService.HTTP_TIMEOUT_SECONDS))
+
+    @staticmethod
+    def _execute_activity_query(
+        service, body: Dict[str, Any], http: Optional[AuthorizedHttp] = None
+    ) -> Dict[str, Any]:
         """
         Execute Google Drive Activity API query with detailed error logging.
         """
-        import json
-        logger.debug(
-            "Executing Drive Activity API query",
-            request_body=json.dumps(body, indent=2),
-            body_type=type(body).__name__,
-            body_keys=list(body.keys()) if isinstance(body, dict) else None,
-        )
         try:
-            result = service.activity().query(body=body).execute()
-            logger.debug("Drive Activity API query succeeded", activities_count=len(result.get("activities", [])))
-            return result
+            return service.activity().query(body=body).execute(http=http)
         except Exception as e:
             logger.error(
                 "Drive Activity API query failed",
                 error_type=type(e).__name__,
                 error_message=str(e),
-                request_body=json.dumps(body, indent=2),
-                body_keys=list(body.keys()) if isinstance(body, dict) else None,
+                request_body=body,
             )
             raise
 
-    async def _persist_event(self, normalized_event: Dict[str, Any]) -> None:
-        """
-        Run event through EventProcessor and persist it to MongoDB.
+    async def _prepare_events(self, normalized_events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        if await self._is_duplicate(normalized_event["event_id"]):
-            logger.debug("Skipping duplicate Google Drive event", event_id=normalized_event["event_id"])
-            return
+        Run events through EventProcessor in one batch and build MongoDB documents for the matches.
 
-        payload = self._build_processor_payload(normalized_event)
-        processed = await self.event_processor.process_event(payload)
+        Returns:
+            Documents to insert; events without policy matches (or that failed processing) are dropped
+        """
+        if not normalized_events:
+            return []
+        # Both builders need the agent id; derive it once per event
+        batch = [(event, f"gdrive-{event['connection_id']}") for event in normalized_events]
+        processed_events = await self.event_processor.process_batch(
+            [self._build_processor_payload(event, agent_id) for event, agent_id in batch]
+        )
+        # process_batch drops events that failed processing, so pair results back up by id
+        processed_by_id = {processed.get("event_id"): processed for processed in processed_events}
+
+        docs: List[Dict[str, Any]] = []
+        unmatched = 0
+        for normalized_event, agent_id in batch:
+            processed = processed_by_id.get(normalized_event["event_id"])
+            if processed is None:
+                continue
+            matched_policies = processed.get("matched_policies")
+            if not matched_policies:
+                unmatched += 1
+                continue
 
-        matched_policies = processed.get("matched_policies")
-        if not matched_policies:
-            logger.debug(
-                "Skipping event with no policy matches",
+            logger.info(
+                "Google Drive event matched policies",
                 event_id=normalized_event["event_id"],
-                folder_id=normalized_event["folder_id"],
+                match_count=len(matched_policies),
+                policies=[policy.get("policy_name") for policy in matched_policies],
             )
+            docs.append(self._build_event_document(normalized_event, processed, agent_id))
+        if unmatched:
+            logger.debug("Skipped Google Drive events with no policy matches", events=unmatched)
+        return docs
+
+    async def _flush_events(self, docs: List[Dict[str, Any]]) -> int:
+        """
+        Write prepared event documents to MongoDB in unordered batches.
+
+        The unique ``id`` index turns a concurrent writer's copy of the same event into
+        an E11000 write error, which is counted as already stored rather than raised.
+
+        Returns:
+            Number of documents inserted
+        """
+        if not docs:
+            return 0
+        await self._ensure_indexes()
+        inserted = 0
+        for start in range(0, len(docs), self.INSERT_BATCH_SIZE):
+            batch = docs[start:start + self.INSERT_BATCH_SIZE]
+            try:
+                result = await self.events_collection.insert_many(batch, ordered=False)
+            except BulkWriteError as exc:
+                details = exc.details or {}
+                write_errors = details.get("writeErrors", [])
+                duplicates = sum(1 for error in write_errors if error.get("code") == _DUPLICATE_KEY_ERROR)
+                if duplicates:
+                    logger.debug("Skipped Google Drive events already stored", duplicates=duplicates)
+                if len(write_errors) > duplicates:
+                    logger.warning(
+                        "Some Google Drive events failed to insert",
+                        inserted=details.get("nInserted", 0),
+                        errors=len(write_errors) - duplicates,
+                    )
+                inserted += details.get("nInserted", 0)
+                continue
+            inserted += len(result.inserted_ids)
+        return inserted
+
+    async def _ensure_indexes(self) -> None:
+        """
+        Create the unique dlp_events ``id`` index duplicate detection relies on, once per process.
+        """
+        if GoogleDrivePollingService._indexes_ensured:
             return
+        # Attempt once per process; a failure (e.g. legacy duplicate ids) shouldn't be retried every poll
+        GoogleDrivePollingService._indexes_ensured = True
+        try:
+            await self.events_collection.create_index("id", unique=True, background=True)
+        except Exception as e:
+            logger.warning("Failed to ensure Google Drive event indexes", error=str(e))
 
-        logger.info(
-            "Google Drive event matched policies",
-            event_id=normalized_event["event_id"],
-            match_count=len(matched_policies),
-            policies=[policy.get("policy_name") for policy in matched_policies],
-        )
+    async def _filter_duplicates(self, event_ids: List[str]) -> Set[str]:
+        """
+        Return the subset of ``event_ids`` already stored.
 
-        doc = self._build_event_document(normalized_event, processed)
-        await self.events_collection.insert_one(doc)
+        Lookups are ``$in`` queries covered by the ``id`` index and projected to the id alone;
+        more than DUPLICATE_LOOKUP_BATCH_SIZE ids are split into chunks queried concurrently.
+        """
+        if not event_ids:
+            return set()
+        size = self.DUPLICATE_LOOKUP_BATCH_SIZE
+        if len(event_ids) <= size:
+            return await self._stored_ids(event_ids)
+        chunks = await asyncio.gather(
+            *(self._stored_ids(event_ids[start:start + size]) for start in range(0, len(event_ids), size))
+        )
+        return set().union(*chunks)
 
-    async def _is_duplicate(self, event_id: str) -> bool:
-        existing = await self.events_collection.find_one({"id": event_id})
-        return existing is not None
+    async def _stored_ids(self, event_ids: List[str]) -> Set[str]:
+        cursor = self.events_collection.find({"id": {"$in": event_ids}}, {"id": 1, "_id": 0})
+        return {doc["id"] async for doc in cursor}
 
-    def _build_processor_payload(self, event: Dict[str, Any]) -> Dict[str, Any]:
-        payload = {
+    def _build_processor_payload(self, event: Dict[str, Any], agent_id: str) -> Dict[str, Any]:
+        get = event.get
+        source = event["source"]
+        return {
             "event_id": event["event_id"],
-            "source": event["source"],
-            "agent": {
-                "id": f"gdrive-{event['connection_id']}",
-                "name": "Google Drive Cloud",
-                "type": "cloud",
-            },
+            "source": source,
+            "agent": {"id": agent_id, **_AGENT_STATIC},
             "event": {
                 "type": event["event_type"],
                 "severity": event["severity"],
-                "source_type": event["source"],
-                "action": event.get("action", "logged"),
-                "subtype": event.get("event_subtype"),
+                "source_type": source,
+                "action": get("action", "logged"),
+                "subtype": get("event_subtype"),
             },
             "metadata": {
                 "ingest_source": "google_drive",
                 "folder_id": event["folder_id"],
-                "protected_folder_id": event.get("protected_folder_id"),
+                "protected_folder_id": get("protected_folder_id"),
                 "connection_id": event["connection_id"],
             },
-            "tags": ["google_drive", "cloud"],
-            "user": {"email": event.get("user_email", "unknown@drive")},
+            "tags": list(_BASE_TAGS),
+            "user": {"email": get("user_email", "unknown@drive")},
+            "file": {
+                "path": get("folder_path"),
+                "name": get("file_name"),
+                "id": get("file_id"),
+                "mime_type": get("mime_type"),
+            },
         }
 
-        payload.setdefault("file", {})
-        payload["file"]["path"] = event.get("folder_path")
-        payload["file"]["name"] = event.get("file_name")
-        payload["file"]["id"] = event.get("file_id")
-        payload["file"]["mime_type"] = event.get("mime_type")
-
-        return payload
-
     def _parse_timestamp(self, value: Optional[str]) -> Optional[datetime]:
         if not value:
             return None
-        try:
-            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
-        except ValueError:
-            return None
-        return self._as_aware_utc(dt)
-
-    @staticmethod
-    def _as_aware_utc(dt: datetime) -> datetime:
-        if dt.tzinfo is None:
-            return dt.replace(tzinfo=timezone.utc)
-        return dt.astimezone(timezone.utc)
-
-    def _as_naive_utc(self, dt: datetime) -> datetime:
-        return self._as_aware_utc(dt).replace(tzinfo=None)
+        return parse_timestamp_utc(value)
 
     def _format_timestamp(self, dt: datetime) -> str:
-        return self._as_aware_utc(dt).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+        return format_timestamp_utc(dt)
 
-    def _build_event_document(self, event: Dict[str, Any], processed: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_event_document(
+        self, event: Dict[str, Any], processed: Dict[str, Any], agent_id: str
+    ) -> Dict[str, Any]:
+        get = event.get
+        processed_get = processed.get
         event_ts = (
-            self._parse_timestamp(event.get("timestamp"))
+            self._parse_timestamp(get("timestamp"))
             or self._extract_activity_timestamp(event)
-            or datetime.utcnow().replace(tzinfo=timezone.utc)
+            or datetime.now(_UTC)
         )
-        persisted_ts = self._as_naive_utc(event_ts)
+        persisted_ts = as_naive_utc(event_ts)
+        processed_event = processed_get("event") or _EMPTY
+        folder_path = get("folder_path")
 
-        metadata = dict(processed.get("metadata", {}))
-        metadata.setdefault("activity_timestamp", persisted_ts)
+        # Share the processor's metadata when it already carries the timestamp; copy only to add it
+        metadata = processed_get("metadata") or _EMPTY
+        if "activity_timestamp" not in metadata:
+            metadata = {**metadata, "activity_timestamp": persisted_ts}
 
         return {
             "id": event["event_id"],
             "timestamp": persisted_ts,
             "event_type": event["event_type"],
-            "event_subtype": event.get("event_subtype"),
-            "description": event.get("description", "Google Drive file activity"),  # Include description
-            "severity": processed.get("event", {}).get("severity", event["severity"]),
+            "event_subtype": get("event_subtype"),
+            "description": get("description", "Google Drive file activity"),  # Include description
+            "severity": processed_event.get("severity", event["severity"]),
             "source": event["source"],
-            "agent_id": f"gdrive-{event['connection_id']}",
-            "user_email": event.get("user_email", "unknown@drive"),
+            "agent_id": agent_id,
+            "user_email": get("user_email", "unknown@drive"),
             "classification_score": 0.0,
             "classification_labels": [],
-            "action_taken": processed.get("event", {}).get("action", event.get("action", "logged")),
-            "file_path": event.get("folder_path"),
-            "file_name": event.get("file_name"),
-            "file_id": event.get("file_id"),
-            "mime_type": event.get("mime_type"),
-            "folder_id": event.get("folder_id"),
-            "protected_folder_id": event.get("protected_folder_id"),
-            "folder_name": event.get("folder_name"),
-            "folder_path": event.get("folder_path"),
+            "action_taken": processed_event.get("action", get("action", "logged")),
+            "file_path": folder_path,
+            "file_name": get("file_name"),
+            "file_id": get("file_id"),
+            "mime_type": get("mime_type"),
+            "folder_id": get("folder_id"),
+            "protected_folder_id": get("protected_folder_id"),
+            "folder_name": get("folder_name"),
+            "folder_path": folder_path,
             "blocked": False,
             "details": {
-                "google_event_id": event.get("google_event_id"),
-                "raw_activity": event.get("details"),
+                "google_event_id": get("google_event_id"),
+                "raw_activity": get("details"),
             },
-            "matched_policies": processed.get("matched_policies", []),
-            "policy_action_summaries": processed.get("policy_action_summaries", []),
+            "matched_policies": processed_get("matched_policies", []),
+            "policy_action_summaries": processed_get("policy_action_summaries", []),
             "metadata": metadata,
-            "tags": processed.get("tags", ["google_drive"]),
-            "policy_version": processed.get("policy_version"),
+            "tags": processed_get("tags", ["google_drive"]),
+            "policy_version": processed_get("policy_version"),
         }
 
     def _extract_activity_timestamp(self, event: Dict[str, Any]) -> Optional[datetime]:
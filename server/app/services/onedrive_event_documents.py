@@ -0,0 +1,135 @@
+"""
+Builders that turn normalized OneDrive events into EventProcessor payloads and MongoDB documents.
+
+Kept free of I/O and service state, and fully annotated, so the module can be compiled
+with mypyc without changing its callers.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Final, Tuple
+
+# Constant parts of every EventProcessor payload; copied per event, never mutated in place
+_AGENT_STATIC: Final[Dict[str, str]] = {"name": "OneDrive Cloud", "type": "cloud"}
+_BASE_TAGS: Final[Tuple[str, ...]] = ("onedrive", "cloud")
+# Shared fallback for missing processor sub-dicts; read-only, never handed out without copying
+_EMPTY: Final[Dict[str, Any]] = {}
+# Delta item fields kept when ONEDRIVE_STORE_RAW_DELTA is off (the events page shows the move target path)
+_RAW_DELTA_KEPT_FIELDS: Final[Tuple[str, ...]] = ("id", "name", "parentReference")
+
+
+def build_processor_payload(event: Dict[str, Any], agent_id: str) -> Dict[str, Any]:
+    """
+    Build the EventProcessor input for a normalized OneDrive event.
+
+    Args:
+        event: Event returned by ``normalize_delta_item``
+        agent_id: Pseudo-agent id of the owning connection
+
+    Returns:
+        Payload for ``EventProcessor.process_event`` / ``process_batch``
+    """
+    get = event.get
+    source = event["source"]
+    return {
+        "event_id": event["event_id"],
+        "source": source,
+        "agent": {"id": agent_id, **_AGENT_STATIC},
+        "event": {
+            "type": event["event_type"],
+            "severity": event["severity"],
+            "source_type": source,
+            "action": get("action", "logged"),
+            "subtype": get("event_subtype"),
+        },
+        "metadata": {
+            "ingest_source": "onedrive",
+            "folder_id": event["folder_id"],
+            "protected_folder_id": get("protected_folder_id"),
+            "connection_id": event["connection_id"],
+        },
+        "tags": list(_BASE_TAGS),
+        "user": {"email": get("user_email", "unknown@onedrive")},
+        "file": {
+            "path": get("folder_path"),
+            "name": get("file_name"),
+            "id": get("file_id"),
+            "size": get("file_size"),
+            "mime_type": get("mime_type"),
+        },
+    }
+
+
+def build_event_document(
+    event: Dict[str, Any],
+    processed: Dict[str, Any],
+    agent_id: str,
+    persisted_ts: datetime,
+    store_raw_delta: bool = True,
+) -> Dict[str, Any]:
+    """
+    Build the ``dlp_events`` document for a normalized event and its processor result.
+
+    Args:
+        event: Event returned by ``normalize_delta_item``
+        processed: EventProcessor result for the event
+        agent_id: Pseudo-agent id of the owning connection
+        persisted_ts: Naive UTC activity time to store
+        store_raw_delta: Keep the full Graph delta item instead of the fields the UI reads
+
+    Returns:
+        Document ready for insertion
+    """
+    get = event.get
+    processed_get = processed.get
+    processed_event = processed_get("event") or _EMPTY
+    folder_path = get("folder_path")
+    raw_delta_item = get("details")
+    if raw_delta_item and not store_raw_delta:
+        # Graph items are often larger than the rest of the document; keep only what the UI reads
+        raw_delta_item = {key: raw_delta_item[key] for key in _RAW_DELTA_KEPT_FIELDS if key in raw_delta_item}
+
+    # Share the processor's metadata when it already carries the timestamp; copy only to add it
+    metadata = processed_get("metadata") or _EMPTY
+    if "activity_timestamp" not in metadata:
+        metadata = {**metadata, "activity_timestamp": persisted_ts}
+
+    # A single dict literal is deliberate: CPython builds it in one step from an interned key tuple,
+    # and Motor needs a dict anyway, so a staging object would only add an allocation per event.
+    return {
+        "id": event["event_id"],
+        "timestamp": persisted_ts,
+        "event_type": event["event_type"],
+        "event_subtype": get("event_subtype"),
+        "description": get("description", "OneDrive file activity"),
+        "severity": processed_event.get("severity", event["severity"]),
+        "source": event["source"],
+        "agent_id": agent_id,
+        "user_email": get("user_email", "unknown@onedrive"),
+        "classification_score": 0.0,
+        "classification_labels": [],
+        "action_taken": processed_event.get("action", get("action", "logged")),
+        "file_path": folder_path,
+        "file_name": get("file_name"),
+        "file_id": get("file_id"),
+        "file_size": get("file_size"),
+        "mime_type": get("mime_type"),
+        "folder_id": get("folder_id"),
+        "protected_folder_id": get("protected_folder_id"),
+        "folder_name": get("folder_name"),
+        "folder_path": folder_path,
+        "blocked": False,
+        "details": {
+            "onedrive_event_id": get("onedrive_event_id"),
+            "change_type": get("change_type"),
+            "etag": get("etag"),
+            "version": get("version"),
+            "raw_delta_item": raw_delta_item,
+        },
+        "matched_policies": processed_get("matched_policies", []),
+        "policy_action_summaries": processed_get("policy_action_summaries", []),
+        "metadata": metadata,
+        "tags": processed_get("tags", ["onedrive"]),
+        "policy_version": processed_get("policy_version"),
+    }
@@ -36,6 +36,7 @@ def normalize_delta_item(
     change_type: str,
     connection: OneDriveConnection,
     folder: OneDriveProtectedFolder,
+    event_subtype: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Convert a Graph API delta item into the internal event schema.
@@ -45,6 +46,9 @@ def normalize_delta_item(
         change_type: The change type from @microsoft.graph.changeType
         connection: OneDriveConnection instance
         folder: OneDriveProtectedFolder instance
+        event_subtype: Subtype already decided by the caller (e.g. a verified
+            modification); when given, it and ``change_type`` are used verbatim
+            instead of the created/updated heuristic
     """
     # If Graph marks the item as deleted, treat it as such regardless of changeType
     if delta_item.get("deleted") is not None:
@@ -53,11 +57,12 @@ def normalize_delta_item(
     # Improve change type detection: if createdDateTime and lastModifiedDateTime are close,
     # it's likely a file creation, not a modification
     normalized_change_type = _improve_change_type_detection(delta_item, change_type)
+    forced_subtype = event_subtype
     event_subtype, severity = _determine_action(normalized_change_type)
     
     # Extract file metadata from delta item
     file_meta = _extract_file_metadata(delta_item)
-    timestamp = _extract_timestamp(delta_item)
+    timestamp, parsed_timestamp = _extract_timestamp(delta_item)
     
     # Extract user email (from createdBy or lastModifiedBy)
     user_email = _extract_user_email(delta_item)
@@ -79,6 +84,10 @@ def normalize_delta_item(
         timestamp=timestamp or "",
         change_type=normalized_change_type,
     )
+    if forced_subtype:
+        # The event id above keeps the heuristic type so ids stay stable for dedup
+        event_subtype = forced_subtype
+        normalized_change_type = change_type
 
     # Build a descriptive message based on the action and file name
     file_name = file_meta.get("file_name") or "Unknown file"
@@ -111,6 +120,8 @@ def normalize_delta_item(
         "etag": etag,  # ETag for modification detection
         "version": version,  # File version (if available)
         "details": delta_item,
+        # Parsed form of "timestamp" for the poller; internal only, never persisted
+        "_ts": parsed_timestamp,
     }
 
 
@@ -194,20 +205,24 @@ def _extract_owner(delta_item: Dict[str, Any]) -> Optional[str]:
     return None
 
 
-def _extract_timestamp(delta_item: Dict[str, Any]) -> str:
-    """Extract timestamp from delta item (lastModifiedDateTime or createdDateTime)."""
-    # Prefer lastModifiedDateTime (when file was changed)
-    timestamp = delta_item.get("lastModifiedDateTime")
-    if timestamp:
-        return _ensure_iso_z(timestamp)
-    
-    # Fallback to createdDateTime
-    timestamp = delta_item.get("createdDateTime")
+def _extract_timestamp(delta_item: Dict[str, Any]) -> Tuple[str, Optional[datetime]]:
+    """
+    Extract timestamp from delta item (lastModifiedDateTime or createdDateTime).
+
+    Returns the ISO string with Z suffix together with the aware UTC datetime it was
+    parsed from (None when Graph sent something unparseable), so callers don't parse twice.
+    """
+    # Prefer lastModifiedDateTime (when file was changed), fall back to createdDateTime
+    timestamp = delta_item.get("lastModifiedDateTime") or delta_item.get("createdDateTime")
     if timestamp:
-        return _ensure_iso_z(timestamp)
-    
+        dt = _parse_utc(timestamp)
+        if dt is None:
+            return timestamp, None
+        return _format_iso_z(dt), dt
+
     # Default to current time
-    return datetime.utcnow().replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
+    dt = datetime.utcnow().replace(tzinfo=timezone.utc)
+    return _format_iso_z(dt), dt
 
 
 def _build_event_id(
@@ -254,17 +269,18 @@ def _build_event_id(
     return f"onedrive-{derived}"
 
 
-def _ensure_iso_z(value: str) -> str:
-    """Ensure timestamp is in ISO format with Z suffix."""
+def _parse_utc(value: str) -> Optional[datetime]:
+    """Parse an ISO timestamp into an aware UTC datetime; None if it can't be parsed."""
     try:
         dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
     except ValueError:
-        return value
+        return None
 
     if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    else:
-        dt = dt.astimezone(timezone.utc)
-    return dt.isoformat().replace("+00:00", "Z")
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
 
 
+def _format_iso_z(dt: datetime) -> str:
+    """Format an aware UTC datetime in ISO format with Z suffix."""
+    return dt.isoformat().replace("+00:00", "Z")
@@ -5,17 +5,25 @@ OneDrive OAuth service for connecting user accounts.
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Any, ClassVar, Dict, List, Optional, Sequence, Tuple
 from uuid import UUID
 import secrets
 
+import orjson
 import structlog
 import httpx
 from fastapi import HTTPException, status
 from msal import ConfidentialClientApplication
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from app.core.cache import CacheService, get_cache
 from app.core.config import settings
@@ -25,6 +33,11 @@ from app.models.onedrive import OneDriveConnection, OneDriveProtectedFolder
 logger = structlog.get_logger(__name__)
 
 
+def _utcnow_naive() -> datetime:
+    """Current UTC time as a naive datetime, matching the OneDrive model columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class OneDriveOAuthService:
     """
     Handles Microsoft OAuth flow, token storage, and connection management.
@@ -41,6 +54,14 @@ class OneDriveOAuthService:
     )
     STATE_CACHE_PREFIX = "onedrive:oauth:state:"
     STATE_TTL_SECONDS = 600
+    # Signed state layout: user_id (16) | issued_at (4) | nonce (16) | hmac-sha256[:16]
+    _STATE_NONCE_BYTES = 16
+    _STATE_SIG_BYTES = 16
+    _STATE_PAYLOAD_BYTES = 16 + 4 + _STATE_NONCE_BYTES
+    # Process-wide replay guard used only when Redis is unavailable
+    _fallback_nonces: ClassVar[Dict[str, float]] = {}
+    PROFILE_CACHE_PREFIX = "ms:profile:"
+    PROFILE_CACHE_TTL_SECONDS = 60
 
     def __init__(
         self,
@@ -49,7 +70,6 @@ class OneDriveOAuthService:
     ) -> None:
         self.db = db
         self.state_store = state_store or self._init_cache_store()
-        self._fallback_state: Dict[str, Dict[str, Any]] = {} if self.state_store is None else {}
         self._client_config_cache: Optional[Dict[str, Any]] = None
 
     def _init_cache_store(self) -> Optional[CacheService]:
@@ -105,25 +125,57 @@ class OneDriveOAuthService:
             authority=config["authority"],
         )
 
-    def _state_key(self, state: str) -> str:
-        return f"{self.STATE_CACHE_PREFIX}{state}"
+    @staticmethod
+    def _state_signing_key() -> bytes:
+        # Domain-separated so the state key is never the raw SECRET_KEY
+        return hashlib.sha256(b"onedrive-oauth-state:" + settings.SECRET_KEY.encode("utf-8")).digest()
 
-    async def _store_state(self, state: str, payload: Dict[str, Any]) -> None:
-        key = self._state_key(state)
-        payload["created_at"] = datetime.utcnow().isoformat()
-        if self.state_store:
-            await self.state_store.set(key, payload, expire=self.STATE_TTL_SECONDS)
-        else:
-            self._fallback_state[key] = payload
+    def _sign_state(self, payload: bytes) -> bytes:
+        return hmac.new(self._state_signing_key(), payload, hashlib.sha256).digest()[: self._STATE_SIG_BYTES]
+
+    def _encode_state(self, user_id: UUID) -> str:
+        """
+        Build an opaque, signed OAuth state that carries the user id itself.
+        """
+        payload = user_id.bytes + struct.pack("!I", int(time.time())) + secrets.token_bytes(self._STATE_NONCE_BYTES)
+        return base64.urlsafe_b64encode(payload + self._sign_state(payload)).rstrip(b"=").decode("ascii")
+
+    def _decode_state(self, state: str) -> Optional[Tuple[UUID, bytes]]:
+        """
+        Verify a signed OAuth state and return (user_id, nonce) if valid and fresh.
+        """
+        try:
+            raw = base64.urlsafe_b64decode(state + "=" * (-len(state) % 4))
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) != self._STATE_PAYLOAD_BYTES + self._STATE_SIG_BYTES:
+            return None
+
+        payload, signature = raw[: self._STATE_PAYLOAD_BYTES], raw[self._STATE_PAYLOAD_BYTES :]
+        if not hmac.compare_digest(signature, self._sign_state(payload)):
+            return None
 
-    async def _pop_state(self, state: str) -> Optional[Dict[str, Any]]:
-        key = self._state_key(state)
+        (issued_at,) = struct.unpack("!I", payload[16:20])
+        if not 0 <= int(time.time()) - issued_at < self.STATE_TTL_SECONDS:
+            return None
+        return UUID(bytes=payload[:16]), payload[20:]
+
+    async def _claim_state_nonce(self, nonce: bytes) -> bool:
+        """
+        Mark a state nonce as used; False if it was already consumed (replay).
+        """
+        key = f"{self.STATE_CACHE_PREFIX}{nonce.hex()}"
         if self.state_store:
-            payload = await self.state_store.get(key)
-            if payload:
-                await self.state_store.delete(key)
-            return payload
-        return self._fallback_state.pop(key, None)
+            return await self.state_store.set_if_absent(key, 1, expire=self.STATE_TTL_SECONDS)
+
+        now = time.time()
+        used = self._fallback_nonces
+        for stale in [k for k, expires_at in used.items() if expires_at <= now]:
+            del used[stale]
+        if key in used:
+            return False
+        used[key] = now + self.STATE_TTL_SECONDS
+        return True
 
     async def initiate_oauth(self, user_id: UUID) -> Dict[str, str]:
         """
@@ -132,9 +184,8 @@ class OneDriveOAuthService:
         app = self._build_msal_app()
         config = self._ensure_oauth_config()
 
-        # Generate state for CSRF protection
-        state = secrets.token_urlsafe(32)
-        await self._store_state(state, {"user_id": str(user_id)})
+        # Signed state for CSRF protection; no server-side storage needed
+        state = self._encode_state(user_id)
 
         # Build authorization URL with full Graph + offline_access scopes
         auth_url = app.get_authorization_request_url(
@@ -149,11 +200,11 @@ class OneDriveOAuthService:
         """
         Complete OAuth flow, store tokens, and upsert a connection.
         """
-        stored_state = await self._pop_state(state)
-        if not stored_state:
+        decoded = self._decode_state(state)
+        if not decoded or not await self._claim_state_nonce(decoded[1]):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired OAuth state")
 
-        user_id = UUID(stored_state["user_id"])
+        user_id = decoded[0]
         tokens = await self._exchange_code_for_tokens(code)
         profile = await self._fetch_user_profile(tokens["access_token"])
 
@@ -185,14 +236,27 @@ class OneDriveOAuthService:
     async def _fetch_user_profile(self, access_token: str) -> Dict[str, Any]:
         """
         Fetch Microsoft account profile using Graph API.
+
+        Responses are cached briefly per access token so retried OAuth
+        callbacks don't re-hit Graph for the same profile.
         """
+        # Key on a digest so raw access tokens never land in Redis
+        cache_key = self.PROFILE_CACHE_PREFIX + hashlib.blake2b(access_token.encode(), digest_size=16).hexdigest()
+        cached = await self.state_store.get(cache_key) if self.state_store else None
+        if cached:
+            return cached
+
         async with httpx.AsyncClient() as client:
             response = await client.get(
                 "https://graph.microsoft.com/v1.0/me",
                 headers={"Authorization": f"Bearer {access_token}"},
             )
             response.raise_for_status()
-            return response.json()
+            profile = orjson.loads(response.content)
+
+        if self.state_store and profile.get("id"):
+            await self.state_store.set(cache_key, profile, expire=self.PROFILE_CACHE_TTL_SECONDS)
+        return profile
 
     async def _upsert_connection(
         self,
@@ -203,6 +267,15 @@ class OneDriveOAuthService:
         """
         Insert or update OneDriveConnection record with encrypted tokens.
         """
+        access_token = tokens.get("access_token")
+        refresh_token = tokens.get("refresh_token")
+        expires_in = tokens.get("expires_in", 3600)
+        if not refresh_token:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Microsoft did not return a refresh token. Please re-authorize.",
+            )
+
         stmt = select(OneDriveConnection).where(
             OneDriveConnection.user_id == user_id,
             OneDriveConnection.microsoft_user_id == profile["id"],
@@ -214,10 +287,7 @@ class OneDriveOAuthService:
             connection = OneDriveConnection(
                 user_id=user_id,
                 microsoft_user_id=profile["id"],
-                microsoft_user_email=profile.get("mail") or profile.get("userPrincipalName"),
                 tenant_id=profile.get("tenantId"),
-                scopes=list(self.SCOPES),
-                status="active",
             )
             self.db.add(connection)
 
@@ -227,22 +297,10 @@ class OneDriveOAuthService:
         connection.status = "active"
         connection.error_message = None
 
-        # Parse token expiry
-        expires_in = tokens.get("expires_in", 3600)
-        if expires_in:
-            connection.token_expiry = datetime.utcnow().replace(tzinfo=None) + timedelta(seconds=expires_in)
-        else:
-            connection.token_expiry = None
-
-        if tokens.get("access_token"):
-            connection.set_access_token(tokens["access_token"])
-
-        refresh_token = tokens.get("refresh_token")
-        if not refresh_token:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Microsoft did not return a refresh token. Please re-authorize.",
-            )
+        # Token expiry is stored as epoch seconds
+        connection.set_token_expiry(expires_in)
+        if access_token:
+            connection.set_access_token(access_token)
         connection.set_refresh_token(refresh_token)
 
         await self.db.commit()
@@ -250,18 +308,20 @@ class OneDriveOAuthService:
         return connection
 
     async def list_connections(self, user_id: UUID) -> List[OneDriveConnection]:
-        stmt = select(OneDriveConnection).where(OneDriveConnection.user_id == user_id).order_by(
-            OneDriveConnection.created_at.desc()
+        # Eager-load folders with one IN query so callers touching connection.folders
+        # don't lazy-load per connection; monitoring_since is derived from them.
+        stmt = (
+            select(OneDriveConnection)
+            .options(selectinload(OneDriveConnection.folders))
+            .where(OneDriveConnection.user_id == user_id)
+            .order_by(OneDriveConnection.created_at.desc())
         )
         result = await self.db.execute(stmt)
         connections = list(result.scalars().all())
 
         for connection in connections:
-            monitoring_stmt = select(func.min(OneDriveProtectedFolder.last_seen_timestamp)).where(
-                OneDriveProtectedFolder.connection_id == connection.id
-            )
-            monitoring_result = await self.db.execute(monitoring_stmt)
-            connection.monitoring_since = monitoring_result.scalar()
+            seen = [folder.last_seen_timestamp for folder in connection.folders if folder.last_seen_timestamp]
+            connection.monitoring_since = min(seen) if seen else None
 
         return connections
 
@@ -306,24 +366,24 @@ class OneDriveOAuthService:
         result = await self.db.execute(stmt)
         folders = list(result.scalars().all())
 
+        # Single clock read shared by the baseline and every folder's updated_at.
+        now = _utcnow_naive()
+        baseline_time = self._normalize_baseline_time(start_time, now)
         if not folders:
-            return 0, self._normalize_baseline_time(start_time)
+            return 0, baseline_time
 
-        baseline_time = self._normalize_baseline_time(start_time)
-        updated = 0
         for folder in folders:
             folder.last_seen_timestamp = baseline_time
             folder.delta_token = None  # Reset delta token when resetting baseline
-            folder.updated_at = datetime.utcnow()
-            updated += 1
+            folder.updated_at = now
 
         await self.db.commit()
-        return updated, baseline_time
+        return len(folders), baseline_time
 
     @staticmethod
-    def _normalize_baseline_time(start_time: Optional[datetime]) -> datetime:
-        if not start_time:
-            return datetime.utcnow()
+    def _normalize_baseline_time(start_time: Optional[datetime], now: datetime) -> datetime:
+        if start_time is None:
+            return now
         if start_time.tzinfo is None:
             return start_time
         return start_time.astimezone(timezone.utc).replace(tzinfo=None)
@@ -338,6 +398,81 @@ class OneDriveOAuthService:
         """
         List folders in a OneDrive connection using Graph API.
         """
+        access_token = await self._get_folder_access_token(user_id, connection_id)
+
+        # Basic params for listing children. Some consumer accounts/endpoints
+        # are picky about $filter/$orderby combinations, so we fetch a page
+        # and filter client-side to avoid 400 errors from Graph.
+        params: Dict[str, Any] = {
+            "$top": 50,
+        }
+        if page_token:
+            params["$skiptoken"] = page_token
+
+        async with httpx.AsyncClient() as client:
+            files, next_link = await self._fetch_folder_page(
+                client, access_token, self._children_endpoint(parent_id), params
+            )
+
+        return {
+            "files": files,
+            "nextPageToken": next_link,  # Use nextLink as page token
+        }
+
+    async def list_folders_recursive(
+        self,
+        user_id: UUID,
+        connection_id: UUID,
+        max_depth: int = 2,
+        concurrency: int = 10,
+    ) -> Dict[str, Any]:
+        """
+        List the folder tree of a OneDrive connection down to ``max_depth`` levels.
+
+        Every page and every subfolder listing is fetched concurrently over a
+        single HTTP client, bounded by ``concurrency`` in-flight requests, so a
+        tree of F folders costs roughly ceil(F / concurrency) round trips
+        instead of F.
+
+        Args:
+            user_id: Owner of the connection
+            connection_id: OneDrive connection to browse
+            max_depth: Number of folder levels to expand (1 = root children only)
+            concurrency: Maximum number of concurrent Graph requests
+
+        Returns:
+            ``{"files": [...]}`` where each folder carries a nested ``children`` list
+        """
+        access_token = await self._get_folder_access_token(user_id, connection_id)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        limits = httpx.Limits(max_connections=max(10, concurrency), max_keepalive_connections=max(10, concurrency))
+
+        async with httpx.AsyncClient(limits=limits) as client:
+
+            async def _fetch(endpoint: str, params: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+                async with semaphore:
+                    return await self._fetch_folder_page(client, access_token, endpoint, params)
+
+            async def _list_children(parent_id: str, depth: int) -> List[Dict[str, Any]]:
+                folders, next_link = await _fetch(self._children_endpoint(parent_id), {"$top": 200})
+                while next_link:
+                    # nextLink already carries $top/$skiptoken
+                    page, next_link = await _fetch(next_link, None)
+                    folders.extend(page)
+
+                if depth < max_depth and folders:
+                    subtrees = await asyncio.gather(
+                        *(_list_children(folder["id"], depth + 1) for folder in folders)
+                    )
+                    for folder, children in zip(folders, subtrees):
+                        folder["children"] = children
+                return folders
+
+            files = await _list_children("root", 1) if max_depth >= 1 else []
+
+        return {"files": files}
+
+    async def _get_folder_access_token(self, user_id: UUID, connection_id: UUID) -> str:
         connection = await self._get_user_connection(user_id, connection_id)
 
         if connection.is_token_expired():
@@ -346,81 +481,123 @@ class OneDriveOAuthService:
         access_token = connection.get_access_token()
         if not access_token:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No access token available")
+        return access_token
 
-        # Build Graph API endpoint
+    @staticmethod
+    def _children_endpoint(parent_id: str) -> str:
         if parent_id == "root":
-            endpoint = "https://graph.microsoft.com/v1.0/me/drive/root/children"
-        else:
-            endpoint = f"https://graph.microsoft.com/v1.0/me/drive/items/{parent_id}/children"
+            return "https://graph.microsoft.com/v1.0/me/drive/root/children"
+        return f"https://graph.microsoft.com/v1.0/me/drive/items/{parent_id}/children"
 
-        # Basic params for listing children. Some consumer accounts/endpoints
-        # are picky about $filter/$orderby combinations, so we fetch a page
-        # and filter client-side to avoid 400 errors from Graph.
-        params = {
-            "$top": 50,
-        }
-        if page_token:
-            params["$skiptoken"] = page_token
+    async def _fetch_folder_page(
+        self,
+        client: httpx.AsyncClient,
+        access_token: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]],
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Fetch one page of children and return (folders, nextLink).
+        """
+        response = await client.get(
+            endpoint,
+            headers={"Authorization": f"Bearer {access_token}"},
+            params=params,
+        )
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            # Log and surface a cleaner error up to the API layer
+            error_body = exc.response.text
+            logger.warning(
+                "OneDrive list folders failed",
+                status_code=exc.response.status_code,
+                url=str(exc.request.url),
+                body=error_body,
+            )
 
-        async def _fetch_folders() -> Dict[str, Any]:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    endpoint,
-                    headers={"Authorization": f"Bearer {access_token}"},
-                    params=params,
-                )
-                try:
-                    response.raise_for_status()
-                except httpx.HTTPStatusError as exc:
-                    # Log and surface a cleaner error up to the API layer
-                    error_body = exc.response.text
-                    logger.warning(
-                        "OneDrive list folders failed",
-                        status_code=exc.response.status_code,
-                        url=str(exc.request.url),
-                        body=error_body,
-                    )
-                    
-                    # Check for specific Graph API errors
-                    try:
-                        error_json = exc.response.json()
-                        error_msg = error_json.get("error", {}).get("message", "")
-                        if "SPO license" in error_msg or "does not have a SPO license" in error_msg:
-                            raise HTTPException(
-                                status_code=status.HTTP_400_BAD_REQUEST,
-                                detail="Your Microsoft account does not have OneDrive/SharePoint Online access. Personal OneDrive accounts may have limitations. Please ensure your account has OneDrive enabled.",
-                            ) from exc
-                    except (ValueError, KeyError):
-                        pass  # Fall through to generic error
-                    
+            # Check for specific Graph API errors
+            try:
+                error_json = exc.response.json()
+                error_msg = error_json.get("error", {}).get("message", "")
+                if "SPO license" in error_msg or "does not have a SPO license" in error_msg:
                     raise HTTPException(
-                        status_code=status.HTTP_502_BAD_GATEWAY,
-                        detail=f"Failed to list OneDrive folders: {error_body[:200]}",
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Your Microsoft account does not have OneDrive/SharePoint Online access. Personal OneDrive accounts may have limitations. Please ensure your account has OneDrive enabled.",
                     ) from exc
+            except (ValueError, KeyError):
+                pass  # Fall through to generic error
+
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Failed to list OneDrive folders: {error_body[:200]}",
+            ) from exc
+
+        data = orjson.loads(response.content)
+
+        # Transform to match Google Drive format for frontend compatibility
+        files = [
+            {
+                "id": item["id"],
+                "name": item["name"],
+                "mimeType": "application/vnd.google-apps.folder",  # For compatibility
+                "iconLink": None,  # Graph API doesn't provide icon links
+            }
+            for item in data.get("value", [])
+            if item.get("folder")  # Only folders
+        ]
+        return files, data.get("@odata.nextLink")
 
-                data = response.json()
+    async def refresh_access_token(self, connection: OneDriveConnection) -> OneDriveConnection:
+        """
+        Refresh Microsoft access token if expired.
+        """
+        tokens = await self._acquire_refreshed_tokens(connection)
+        self._apply_refreshed_tokens(connection, tokens)
 
-                # Transform to match Google Drive format for frontend compatibility
-                files = []
-                for item in data.get("value", []):
-                    if item.get("folder"):  # Only folders
-                        files.append({
-                            "id": item["id"],
-                            "name": item["name"],
-                            "mimeType": "application/vnd.google-apps.folder",  # For compatibility
-                            "iconLink": None,  # Graph API doesn't provide icon links
-                        })
+        await self.db.commit()
+        await self.db.refresh(connection)
+        return connection
 
-                return {
-                    "files": files,
-                    "nextPageToken": data.get("@odata.nextLink"),  # Use nextLink as page token
-                }
+    async def refresh_all_expired(self, user_id: UUID) -> List[OneDriveConnection]:
+        """
+        Refresh every expired connection of a user concurrently.
 
-        return await _fetch_folders()
+        Token acquisition runs in parallel; results are applied to the session
+        sequentially and committed once, since an AsyncSession must not be
+        used from concurrent tasks. Connections whose refresh fails are marked
+        as errored instead of aborting the batch.
 
-    async def refresh_access_token(self, connection: OneDriveConnection) -> OneDriveConnection:
+        Returns:
+            All of the user's connections (refreshed where needed)
         """
-        Refresh Microsoft access token if expired.
+        connections = await self.list_connections(user_id)
+        expired = [connection for connection in connections if connection.is_token_expired()]
+        if not expired:
+            return connections
+
+        results = await asyncio.gather(
+            *(self._acquire_refreshed_tokens(connection) for connection in expired),
+            return_exceptions=True,
+        )
+        for connection, tokens in zip(expired, results):
+            if isinstance(tokens, BaseException):
+                message = tokens.detail if isinstance(tokens, HTTPException) else str(tokens)
+                logger.warning(
+                    "OneDrive token refresh failed",
+                    connection_id=str(connection.id),
+                    error=message,
+                )
+                connection.mark_error(message)
+                continue
+            self._apply_refreshed_tokens(connection, tokens)
+
+        await self.db.commit()
+        return connections
+
+    async def _acquire_refreshed_tokens(self, connection: OneDriveConnection) -> Dict[str, Any]:
+        """
+        Redeem the connection's refresh token with MSAL without touching the session.
         """
         refresh_token = connection.get_refresh_token()
         if not refresh_token:
@@ -437,21 +614,20 @@ class OneDriveOAuthService:
                 raise ValueError(f"Token refresh failed: {result.get('error_description', result.get('error'))}")
             return result
 
-        tokens = await asyncio.to_thread(_refresh)
-
-        if tokens.get("access_token"):
-            connection.set_access_token(tokens["access_token"])
-        if tokens.get("refresh_token"):
-            connection.set_refresh_token(tokens["refresh_token"])
+        return await asyncio.to_thread(_refresh)
 
+    @staticmethod
+    def _apply_refreshed_tokens(connection: OneDriveConnection, tokens: Dict[str, Any]) -> None:
+        access_token = tokens.get("access_token")
+        new_refresh_token = tokens.get("refresh_token")
         expires_in = tokens.get("expires_in", 3600)
+
+        if access_token:
+            connection.set_access_token(access_token)
+        if new_refresh_token:
+            connection.set_refresh_token(new_refresh_token)
         if expires_in:
-            connection.token_expiry = datetime.utcnow().replace(tzinfo=None) + timedelta(seconds=expires_in)
+            connection.set_token_expiry(expires_in)
 
         connection.status = "active"
         connection.error_message = None
-
-        await self.db.commit()
-        await self.db.refresh(connection)
-        return connection
-
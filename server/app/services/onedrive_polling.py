@@ -5,35 +5,82 @@ Polling service that fetches OneDrive Graph API delta events and ingests them in
 from __future__ import annotations
 
 import asyncio
+import uuid
+import random
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
-from urllib.parse import urlparse, parse_qs
+from typing import Any, ClassVar, Dict, List, Optional, Sequence, Set, Tuple
 
-import json
+import orjson
 import structlog
 import httpx
-from sqlalchemy import select
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from sqlalchemy import inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
+from app.core.config import settings
 from app.core.database import get_mongodb
 from app.core.cache import get_cache
 from app.models.onedrive import OneDriveConnection, OneDriveProtectedFolder
 from app.services.event_processor import EventProcessor, get_event_processor
+from app.services.onedrive_event_documents import build_event_document, build_processor_payload
 from app.services.onedrive_event_normalizer import (
     TRACKED_EVENT_SUBTYPES,
     normalize_delta_item,
 )
 from app.services.onedrive_oauth import OneDriveOAuthService
+from app.utils.timestamps import as_naive_utc, format_timestamp_utc, parse_iso, parse_timestamp_utc
 
 
 logger = structlog.get_logger(__name__)
 
+# Graph delta change types we act on (compared after lowercasing once per item)
+_TRACKED_CHANGE_TYPES = frozenset({"created", "updated", "deleted", "moved", "renamed", "copied"})
+
+# Graph responses worth retrying: throttling and transient gateway/service failures
+_RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+# Bound once at module scope so hot helpers use a single global load
+_UTC = timezone.utc
+
+# MongoDB E11000: another writer already stored this event id
+_DUPLICATE_KEY_ERROR = 11000
+
 
 class OneDrivePollingService:
     """
     Pulls Graph API delta events for each connected account/folder and feeds them to EventProcessor.
     """
 
+    _indexes_ensured: ClassVar[bool] = False
+    # Worker-wide LRU of event ids already handled, checked before Redis/Mongo
+    _recent_event_ids: ClassVar[OrderedDict[str, None]] = OrderedDict()
+    RECENT_EVENT_IDS_MAX = 50_000
+    HTTP_TIMEOUT_SECONDS = 30.0
+    GRAPH_MAX_ATTEMPTS = 5
+    GRAPH_RETRY_BASE_SECONDS = 1.0
+    GRAPH_RETRY_MAX_SECONDS = 60.0
+    # Keep idle connections around long enough to span gaps between folders in one cycle
+    HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+    FOLDER_POLL_CONCURRENCY = 8
+    METADATA_FETCH_CONCURRENCY = 16
+    # File state TTL in Redis: 90 days
+    FILE_STATE_TTL_SECONDS = 7776000
+    # Seen-event markers only need to outlive the window in which Graph may redeliver an item
+    SEEN_EVENT_TTL_SECONDS = 86400
+    # Upper bound on documents per bulk_write call
+    INSERT_BATCH_SIZE = 500
+    # Upper bound on ids per duplicate-check $in query
+    DUPLICATE_LOOKUP_BATCH_SIZE = 500
+    # poll_all_connections commits after this many connections instead of after each one
+    COMMIT_EVERY_CONNECTIONS = 32
+    CHILDREN_SELECT = (
+        "id,name,eTag,size,file,folder,parentReference,createdDateTime,lastModifiedDateTime,createdBy,lastModifiedBy"
+    )
+    DELTA_SELECT = f"{CHILDREN_SELECT},deleted"
+
     def __init__(
         self,
         db: AsyncSession,
@@ -44,30 +91,94 @@ class OneDrivePollingService:
         self.oauth_service = OneDriveOAuthService(db)
         self.event_processor = event_processor or get_event_processor()
         self.events_collection = events_collection or get_mongodb()["dlp_events"]
+        self._store_raw_delta = settings.ONEDRIVE_STORE_RAW_DELTA
         # Redis client for file state storage (optional, gracefully handles if unavailable)
         try:
             self.redis_client = get_cache()
         except RuntimeError:
             logger.warning("Redis not available, file state tracking disabled")
             self.redis_client = None
+        # Per-poll-cycle view of Redis file state keyed by (connection_id, file_id);
+        # None records a known miss so it isn't re-queried within the cycle.
+        self._state_cache: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        # One pooled HTTP/2 client for every Graph request made by this service, so
+        # delta pages, fallbacks and metadata lookups reuse warm connections.
+        # Authorization is set per request since tokens differ per connection.
+        # Graph's nextLink/deltaLink URLs are canonical, so redirects are never followed.
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=self.HTTP_LIMITS,
+            timeout=self.HTTP_TIMEOUT_SECONDS,
+            follow_redirects=False,
+            headers={"User-Agent": "dlp-onedrive"},
+        )
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled Graph HTTP client.
+        """
+        await self._http.aclose()
 
     async def poll_all_connections(self) -> int:
         """
         Poll every OneDrive connection. Returns number of processed events.
+
+        Kept for manual runs; scheduled polling fans out one poll_connection_by_id
+        task per connection instead. Folder cursors (delta tokens and timestamps) are
+        committed every COMMIT_EVERY_CONNECTIONS connections and once at the end. If a
+        poll fails, the uncommitted cursors of the connections since the last checkpoint
+        are rolled back with it; those events are fetched again next cycle and skipped
+        as duplicates.
         """
-        stmt = select(OneDriveConnection)
+        stmt = select(OneDriveConnection).options(selectinload(OneDriveConnection.folders))
         result = await self.db.execute(stmt)
         connections = result.scalars().all()
         processed = 0
-        for connection in connections:
-            processed += await self.poll_connection(connection)
+        for index, connection in enumerate(connections, start=1):
+            processed += await self.poll_connection(connection, commit=False)
+            if index % self.COMMIT_EVERY_CONNECTIONS == 0:
+                await self.db.commit()
+        await self.db.commit()
         return processed
 
-    async def poll_connection(self, connection: OneDriveConnection) -> int:
+    @staticmethod
+    async def get_connection_ids(db: AsyncSession) -> List[str]:
+        """
+        Return the id of every OneDrive connection, for polling them as separate tasks.
+        """
+        result = await db.execute(select(OneDriveConnection.id))
+        return [str(connection_id) for connection_id in result.scalars()]
+
+    async def poll_connection_by_id(self, connection_id: str) -> int:
+        """
+        Load one connection with its folders and poll it, committing its cursors.
+
+        Returns 0 if the connection has been deleted since it was scheduled.
+        """
+        stmt = (
+            select(OneDriveConnection)
+            .options(selectinload(OneDriveConnection.folders))
+            .where(OneDriveConnection.id == uuid.UUID(str(connection_id)))
+        )
+        result = await self.db.execute(stmt)
+        connection = result.scalar_one_or_none()
+        if connection is None:
+            logger.info("Skipping deleted connection", connection_id=str(connection_id))
+            return 0
+        return await self.poll_connection(connection)
+
+    async def poll_connection(self, connection: OneDriveConnection, commit: bool = True) -> int:
         """
         Poll a single connection and ingest events.
+
+        Args:
+            connection: Connection to poll
+            commit: Commit cursor/status changes before returning; poll_all_connections
+                passes False and commits in batches instead
         """
-        await self.db.refresh(connection, attribute_names=["folders"])
+        # poll_all_connections eager-loads folders; only hit the database for a bare connection
+        if "folders" in inspect(connection).unloaded:
+            await self.db.refresh(connection, attribute_names=["folders"])
         if not connection.folders:
             logger.debug("Skipping connection with no protected folders", connection_id=str(connection.id))
             return 0
@@ -79,12 +190,29 @@ class OneDrivePollingService:
         if not access_token:
             logger.error("No access token available for connection", connection_id=str(connection.id))
             connection.mark_error("No access token available")
-            await self.db.commit()
+            if commit:
+                await self.db.commit()
             return 0
 
+        self._state_cache = {}
+        try:
+            total = await self._poll_connection_folders(connection, access_token)
+        finally:
+            self._state_cache = {}
+        if commit:
+            await self.db.commit()
+        return total
+
+    async def _poll_connection_folders(self, connection: OneDriveConnection, access_token: str) -> int:
+        """
+        Fetch and persist events for every protected folder of a connection and update
+        its cursors in the session; the caller decides when to commit.
+        """
         total = 0
         latest_connection_timestamp: Optional[datetime] = None
+        pending_events: List[Dict[str, Any]] = []
 
+        active_folders: List[OneDriveProtectedFolder] = []
         for folder in connection.folders:
             if not folder.last_seen_timestamp:
                 folder.touch()
@@ -95,33 +223,114 @@ class OneDrivePollingService:
                     baseline=folder.last_seen_timestamp,
                 )
                 continue
+            active_folders.append(folder)
 
-            events, latest_folder_timestamp, delta_token = await self._fetch_folder_events(
-                access_token, connection, folder
-            )
-            for event in events:
-                await self._persist_event(event)
-                total += 1
+        # Folder fetches are independent Graph I/O; run them concurrently and apply
+        # the results to the session afterwards from this single task.
+        semaphore = asyncio.Semaphore(self.FOLDER_POLL_CONCURRENCY)
+        results = await asyncio.gather(
+            *(self._poll_one_folder(semaphore, access_token, connection, folder) for folder in active_folders)
+        )
+
+        # Only write folder columns that actually changed; idle folders then produce no UPDATEs.
+        # Baselines initialized above already count as a change.
+        dirty = len(active_folders) != len(connection.folders)
+        for events, latest_folder_timestamp, delta_token, folder in results:
+            pending_events.extend(events)
+            total += len(events)
 
             if latest_folder_timestamp:
-                folder.touch(self._as_naive_utc(latest_folder_timestamp))
+                latest_naive = as_naive_utc(latest_folder_timestamp)
+                if latest_naive != folder.last_seen_timestamp:
+                    folder.touch(latest_naive)
+                    dirty = True
                 if not latest_connection_timestamp or latest_folder_timestamp > latest_connection_timestamp:
                     latest_connection_timestamp = latest_folder_timestamp
 
             # Store delta token for next incremental sync
-            if delta_token:
+            if delta_token and delta_token != folder.delta_token:
                 folder.set_delta_token(delta_token)
+                dirty = True
 
-        # Update connection-level delta token if we have one
-        connection.mark_polled(
-            delta_token=None,  # Connection-level delta token not used (per-folder tokens instead)
-            polled_at=datetime.utcnow(),
-        )
-        await self.db.commit()
+        # One processor fan-out and one Mongo round-trip for the whole connection
+        await self._persist_events(pending_events)
+
+        polled_at = datetime.now(_UTC).replace(tzinfo=None)
+        if total or dirty or connection.status != "active" or connection.error_message:
+            connection.mark_polled(
+                delta_token=None,  # Connection-level delta token not used (per-folder tokens instead)
+                polled_at=polled_at,
+            )
+        else:
+            # Nothing changed: record the poll time only and leave status/updated_at alone
+            connection.last_polled_at = polled_at
 
         logger.info("OneDrive polling completed", connection_id=str(connection.id), events=total)
         return total
 
+    async def _poll_one_folder(
+        self,
+        semaphore: asyncio.Semaphore,
+        access_token: str,
+        connection: OneDriveConnection,
+        folder: OneDriveProtectedFolder,
+    ) -> Tuple[List[Dict[str, Any]], Optional[datetime], Optional[str], OneDriveProtectedFolder]:
+        async with semaphore:
+            events, latest_timestamp, delta_token = await self._fetch_folder_events(access_token, connection, folder)
+        return events, latest_timestamp, delta_token, folder
+
+    async def _graph_get(
+        self,
+        url: str,
+        access_token: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        """
+        GET a Graph URL, backing off on throttling and transient failures.
+
+        429/502/503/504 responses and transport errors are retried up to
+        GRAPH_MAX_ATTEMPTS times, sleeping for Retry-After when Graph sends one and
+        for exponential backoff with jitter otherwise. The last response is returned
+        as-is so callers keep their own status handling; the last transport error is raised.
+        """
+        kwargs: Dict[str, Any] = {"headers": {"Authorization": f"Bearer {access_token}"}, "params": params}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._http.get(url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt >= self.GRAPH_MAX_ATTEMPTS:
+                    raise
+                delay = self._retry_delay(attempt, None)
+                logger.warning("Graph request failed, retrying", error=str(e), attempt=attempt, delay=delay)
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code not in _RETRYABLE_STATUS_CODES or attempt >= self.GRAPH_MAX_ATTEMPTS:
+                return response
+            delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+            logger.warning(
+                "Graph request throttled, retrying",
+                status_code=response.status_code,
+                attempt=attempt,
+                delay=delay,
+            )
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        backoff = self.GRAPH_RETRY_BASE_SECONDS * (2 ** (attempt - 1)) + random.random()
+        if retry_after:
+            try:
+                # Graph sends delta-seconds; never retry sooner than it asks
+                backoff = max(float(retry_after), backoff)
+            except ValueError:
+                pass
+        return min(backoff, self.GRAPH_RETRY_MAX_SECONDS)
+
     async def _fetch_folder_events(
         self,
         access_token: str,
@@ -132,36 +341,35 @@ class OneDrivePollingService:
         Query Graph API delta endpoint for a single folder and return any new events plus
         the most recent timestamp observed and delta token for next sync.
         """
-        normalized: List[Dict[str, Any]] = []
         latest_timestamp: Optional[datetime] = None
         delta_token: Optional[str] = None
 
+        # Account already known to reject delta queries - skip the doomed request
+        if connection.supports_delta is False:
+            return await self._fetch_folder_events_via_children(access_token, connection, folder)
+
         # Build delta query endpoint
         # Graph API delta works as follows:
         # 1. First sync: Use /delta endpoint to get all items + deltaLink
         # 2. Subsequent syncs: Use deltaLink from previous sync to get only changes
-        # 
-        # IMPORTANT: For personal OneDrive accounts, folder-specific delta endpoints
-        # may require SPO license. Use root delta endpoint and filter client-side.
+        #
+        # Folder-scoped delta only returns the protected folder's subtree, so it is tried first.
+        # Personal OneDrive accounts reject it without an SPO license; once that's been seen
+        # (supports_folder_delta is False) use the root delta endpoint and filter client-side.
+        # deltaLink/nextLink URLs already carry the query options, so $select is only sent initially.
         use_root_delta = False
+        params: Dict[str, Any] = {}
         if folder.delta_token:
-            # Check if delta token is for a folder-specific endpoint (which may fail with SPO error)
-            # For personal accounts, we'll use root delta and filter client-side
-            if "/items/" in folder.delta_token and "/delta" in folder.delta_token:
-                # This is a folder-specific delta token - may fail with SPO license error
-                # We'll try it first, but fall back to root delta if it fails
-                endpoint = folder.delta_token
-                params: Dict[str, Any] = {}
-            else:
-                # Root delta token - safe to use
-                endpoint = folder.delta_token
-                params: Dict[str, Any] = {}
+            endpoint = folder.delta_token
+            # Tokens from root delta cover the whole drive and still need the client-side filter
+            use_root_delta = "/root/delta" in endpoint
+        elif connection.supports_folder_delta is not False and folder.folder_id != "root":
+            endpoint = f"https://graph.microsoft.com/v1.0/me/drive/items/{folder.folder_id}/delta"
+            params = {"$select": self.DELTA_SELECT}
         else:
-            # Initial sync: always use root delta for personal accounts to avoid SPO errors
-            # We'll filter results client-side to only include items from the protected folder
             endpoint = "https://graph.microsoft.com/v1.0/me/drive/root/delta"
             use_root_delta = True
-            params: Dict[str, Any] = {}
+            params = {"$select": self.DELTA_SELECT}
 
         logger.info(
             "OneDrive Graph API Delta Request",
@@ -172,29 +380,40 @@ class OneDrivePollingService:
         )
 
         next_link: Optional[str] = None
+        candidates: List[Tuple[Dict[str, Any], str]] = []
+        # Bind per-folder match inputs once; the item loop below runs for every change on the drive
+        folder_id = folder.folder_id
+        # OneDrive paths are case-insensitive; match the folder as a whole path component
+        folder_name_seg = f"/{folder.folder_name}".casefold()
+        folder_name_dir = f"{folder_name_seg}/"
+        filter_to_folder = use_root_delta and folder_id != "root"
         while True:
             # Use next_link if available, otherwise use endpoint
             request_url = next_link or endpoint
-            if next_link:
-                # Extract delta token from next_link if it's a deltaLink
-                parsed = urlparse(next_link)
-                if "deltaLink" in parsed.path or "delta" in parsed.path:
-                    delta_token = next_link
 
             try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(
-                        request_url,
-                        headers={"Authorization": f"Bearer {access_token}"},
-                        params=params if not next_link else None,
-                        timeout=30.0,
-                    )
-                    response.raise_for_status()
-                    data = response.json()
+                response = await self._graph_get(request_url, access_token, params=params if not next_link else None)
+                response.raise_for_status()
+                data = orjson.loads(response.content)
             except httpx.HTTPStatusError as e:
                 error_text = e.response.text
                 status_code = e.response.status_code
                 # Gracefully handle SPO license errors for personal accounts
+                if (
+                    status_code == 400
+                    and "Tenant does not have a SPO license" in error_text
+                    and "/items/" in request_url
+                    and connection.supports_folder_delta is not False
+                ):
+                    # Folder-scoped delta needs SPO; remember that and resync this folder from root delta
+                    logger.info(
+                        "Folder-scoped delta not supported, using root delta",
+                        folder_id=folder.folder_id,
+                        connection_id=str(connection.id),
+                    )
+                    folder.set_delta_token(None)
+                    connection.supports_folder_delta = False
+                    return await self._fetch_folder_events(access_token, connection, folder)
                 if status_code == 400 and "Tenant does not have a SPO license" in error_text:
                     # Delta queries not supported for personal accounts - use children endpoint fallback
                     logger.info(
@@ -202,8 +421,10 @@ class OneDrivePollingService:
                         folder_id=folder.folder_id,
                         connection_id=str(connection.id),
                     )
-                    # Clear delta token and use children endpoint instead
+                    # Clear delta token, remember the capability (committed with the poll)
+                    # and use children endpoint instead
                     folder.set_delta_token(None)
+                    connection.supports_delta = False
                     # Use children endpoint with timestamp filtering
                     return await self._fetch_folder_events_via_children(
                         access_token, connection, folder
@@ -226,128 +447,38 @@ class OneDrivePollingService:
 
             items = data.get("value", [])
             for item in items:
+                # Cheap per-item checks first; the folder-membership path test below only runs
+                # for tracked file changes.
+                # Extract change type from item; lowercase once so later checks are plain comparisons
+                change_type = item.get("@microsoft.graph.changeType", "updated").lower()
+                if change_type not in _TRACKED_CHANGE_TYPES:
+                    continue
+
+                # Skip folder-only items; we track files, not folder create/rename
+                if item.get("folder") and not item.get("file") and not item.get("deleted"):
+                    continue
+
                 # If using root delta, filter to only include items from the protected folder
-                if use_root_delta and folder.folder_id != "root":
+                if filter_to_folder:
                     # Check if item is in the protected folder by comparing parentReference.id
                     parent_ref = item.get("parentReference", {})
-                    item_parent_id = parent_ref.get("id")
-                    
+
                     # Match if parent ID matches folder_id (item is directly in the folder)
                     # OR if the item itself is the folder (for folder-level changes)
-                    if item_parent_id != folder.folder_id and item.get("id") != folder.folder_id:
-                        # For nested items, check if the path contains our folder
+                    if parent_ref.get("id") != folder_id and item.get("id") != folder_id:
+                        # For nested items, check that our folder is a component of the path
                         # Path format: /drive/root:/folder/subfolder
-                        item_path = parent_ref.get("path", "")
-                        if not item_path or f"/{folder.folder_name}" not in item_path:
+                        item_path = parent_ref.get("path")
+                        if not item_path:
+                            continue
+                        item_path = item_path.casefold()
+                        if not item_path.endswith(folder_name_seg) and folder_name_dir not in item_path:
                             continue
-                
-                # Extract change type from item
-                change_type = item.get("@microsoft.graph.changeType", "updated")
-                
-                # Skip folder-only items; we track files, not folder create/rename
-                if item.get("folder") and not item.get("file") and not item.get("deleted"):
-                    continue
-
-                # Skip if not a tracked change type
-                if change_type.lower() not in ["created", "updated", "deleted", "moved", "renamed", "copied"]:
-                    continue
-
-                file_id = item.get("id")
-                normalized_event: Optional[Dict[str, Any]] = None
-
-                # Handle different change types with hybrid approach
-                if change_type.lower() == "deleted":
-                    # Deletions are reliable from delta - use as-is
-                    normalized_event = normalize_delta_item(item, change_type, connection, folder)
-                    # Remove file state from Redis on deletion
-                    if file_id:
-                        try:
-                            if self.redis_client:
-                                key = f"onedrive:file_state:{connection.id}:{file_id}"
-                                await self.redis_client.delete(key)
-                        except Exception as e:
-                            logger.debug(
-                                "Failed to delete file state from Redis",
-                                file_id=file_id,
-                                error=str(e),
-                            )
-                elif change_type.lower() == "created":
-                    # Check if file_id exists in Redis - if so, it's likely a modification misreported as creation
-                    if file_id:
-                        stored_state = await self._get_file_state(str(connection.id), file_id)
-                        if stored_state:
-                            # File exists in Redis - this is a suspected modification
-                            logger.debug(
-                                "Suspected modification (delta reports 'created' but file exists in Redis)",
-                                file_id=file_id,
-                                connection_id=str(connection.id),
-                            )
-                            # Detect modification using metadata comparison
-                            normalized_event = await self._detect_file_modification(
-                                item, access_token, connection, folder
-                            )
-                            if normalized_event:
-                                # Modification detected and normalized
-                                pass
-                            else:
-                                # Fallback: treat as creation (might be a re-upload)
-                                normalized_event = normalize_delta_item(item, change_type, connection, folder)
-                        else:
-                            # Genuine creation - use delta as-is
-                            normalized_event = normalize_delta_item(item, change_type, connection, folder)
-                            # Store file state after normalization
-                            if file_id and normalized_event:
-                                file_meta = item.get("file", {})
-                                await self._store_file_state(
-                                    str(connection.id),
-                                    file_id,
-                                    etag=item.get("eTag"),
-                                    last_modified=item.get("lastModifiedDateTime"),
-                                    version=file_meta.get("version") if file_meta else None,
-                                )
-                    else:
-                        # No file_id - use delta as-is
-                        normalized_event = normalize_delta_item(item, change_type, connection, folder)
-                elif change_type.lower() == "updated":
-                    # Verify modification using metadata comparison
-                    if file_id:
-                        normalized_event = await self._detect_file_modification(
-                            item, access_token, connection, folder
-                        )
-                        if not normalized_event:
-                            # No modification detected or error - use delta as-is
-                            normalized_event = normalize_delta_item(item, change_type, connection, folder)
-                    else:
-                        # No file_id - use delta as-is
-                        normalized_event = normalize_delta_item(item, change_type, connection, folder)
-                else:
-                    # Moved, renamed, copied - use delta as-is
-                    normalized_event = normalize_delta_item(item, change_type, connection, folder)
-                
-                if not normalized_event:
-                    continue
-                
-                if normalized_event.get("event_subtype") not in TRACKED_EVENT_SUBTYPES:
-                    continue
-
-                # Store file state for created/updated files (if not already stored)
-                if normalized_event.get("event_subtype") in ["file_created", "file_modified"]:
-                    file_id = normalized_event.get("file_id")
-                    if file_id and not await self._get_file_state(str(connection.id), file_id):
-                        # Store state if not already stored
-                        await self._store_file_state(
-                            str(connection.id),
-                            file_id,
-                            etag=item.get("eTag"),
-                            last_modified=normalized_event.get("timestamp"),
-                        )
 
-                normalized.append(normalized_event)
-                event_ts = self._parse_timestamp(normalized_event.get("timestamp"))
-                if event_ts and (latest_timestamp is None or event_ts > latest_timestamp):
-                    latest_timestamp = event_ts
+                candidates.append((item, change_type))
 
-            # Check for deltaLink (for next incremental sync) or nextLink (for pagination)
+            # Check for deltaLink (for next incremental sync) or nextLink (for pagination).
+            # Only the final deltaLink is a resumable token; nextLink pages are never stored.
             delta_link = data.get("@odata.deltaLink")
             if delta_link:
                 delta_token = delta_link
@@ -357,8 +488,129 @@ class OneDrivePollingService:
             if not next_link:
                 break  # No more pages
 
+        normalized = await self._build_folder_events(candidates, access_token, connection, folder)
+        for normalized_event in normalized:
+            # The normalizer already parsed the timestamp; reuse it instead of parsing the string again
+            event_ts = normalized_event.get("_ts")
+            if event_ts and (latest_timestamp is None or event_ts > latest_timestamp):
+                latest_timestamp = event_ts
+
         return normalized, latest_timestamp, delta_token
 
+    async def _build_folder_events(
+        self,
+        candidates: List[Tuple[Dict[str, Any], str]],
+        access_token: str,
+        connection: OneDriveConnection,
+        folder: OneDriveProtectedFolder,
+    ) -> List[Dict[str, Any]]:
+        """
+        Turn filtered delta items into normalized events using a hybrid approach.
+
+        Deletions, moves and genuine creations are taken from the delta as-is.
+        Updates and suspected creations need current Graph metadata to confirm a
+        modification; those lookups are issued concurrently (bounded by
+        METADATA_FETCH_CONCURRENCY) once all pages have been collected.
+
+        Change types in ``candidates`` are expected to be lowercase already.
+        """
+        connection_id = str(connection.id)
+        resolved: List[Optional[Dict[str, Any]]] = [None] * len(candidates)
+        needs_metadata: List[int] = []
+
+        # One MGET for every known file state; writes are buffered and flushed in one pipeline
+        stored_states = await self._get_file_states(
+            connection_id,
+            [item["id"] for item, change_type in candidates if item.get("id") and change_type != "deleted"],
+        )
+        state_writes: Dict[str, Dict[str, Any]] = {}
+        deleted_ids: List[str] = []
+
+        for index, (item, change_type) in enumerate(candidates):
+            file_id = item.get("id")
+            if change_type == "deleted":
+                # Deletions are reliable from delta - use as-is
+                resolved[index] = normalize_delta_item(item, change_type, connection, folder)
+                if file_id:
+                    deleted_ids.append(file_id)
+                    stored_states.pop(file_id, None)
+                    state_writes.pop(file_id, None)
+            elif change_type == "created" and file_id:
+                # If the file is already known in Redis it's likely a modification misreported as creation
+                if stored_states.get(file_id) or file_id in state_writes:
+                    logger.debug(
+                        "Suspected modification (delta reports 'created' but file exists in Redis)",
+                        file_id=file_id,
+                        connection_id=connection_id,
+                    )
+                    needs_metadata.append(index)
+                else:
+                    # Genuine creation - use delta as-is and remember its state
+                    resolved[index] = normalize_delta_item(item, change_type, connection, folder)
+                    file_meta = item.get("file", {})
+                    state_writes[file_id] = self._file_state(
+                        etag=item.get("eTag"),
+                        last_modified=item.get("lastModifiedDateTime"),
+                        version=file_meta.get("version") if file_meta else None,
+                    )
+            elif change_type == "updated" and file_id:
+                # Verify modification using metadata comparison
+                needs_metadata.append(index)
+            else:
+                # Moved, renamed, copied (or no file_id) - use delta as-is
+                resolved[index] = normalize_delta_item(item, change_type, connection, folder)
+
+        if needs_metadata:
+            # Delta items already carry eTag/lastModifiedDateTime and are authoritative;
+            # only hit /items/{id} for the ones that don't.
+            to_fetch = [
+                index
+                for index in needs_metadata
+                if not (candidates[index][0].get("eTag") and candidates[index][0].get("lastModifiedDateTime"))
+            ]
+            fetched: Dict[int, Optional[Dict[str, Any]]] = {}
+            if to_fetch:
+                semaphore = asyncio.Semaphore(self.METADATA_FETCH_CONCURRENCY)
+
+                async def _fetch(file_id: str) -> Optional[Dict[str, Any]]:
+                    async with semaphore:
+                        return await self._fetch_file_metadata(access_token, file_id)
+
+                metadata = await asyncio.gather(*(_fetch(candidates[index][0]["id"]) for index in to_fetch))
+                fetched = dict(zip(to_fetch, metadata))
+
+            for index in needs_metadata:
+                item, change_type = candidates[index]
+                current_metadata = fetched[index] if index in fetched else item
+                normalized_event = None
+                if current_metadata:
+                    file_id = item["id"]
+                    stored_state = state_writes.get(file_id) or stored_states.get(file_id)
+                    normalized_event = self._detect_file_modification(
+                        item, current_metadata, stored_state, connection, folder, state_writes
+                    )
+                # No modification detected or lookup failed - use delta as-is
+                resolved[index] = normalized_event or normalize_delta_item(item, change_type, connection, folder)
+
+        normalized: List[Dict[str, Any]] = []
+        for (item, _), normalized_event in zip(candidates, resolved):
+            if normalized_event.get("event_subtype") not in TRACKED_EVENT_SUBTYPES:
+                continue
+
+            # Store file state for created/updated files (if not already stored)
+            if normalized_event.get("event_subtype") in ["file_created", "file_modified"]:
+                file_id = normalized_event.get("file_id")
+                if file_id and file_id not in state_writes and not stored_states.get(file_id):
+                    state_writes[file_id] = self._file_state(
+                        etag=item.get("eTag"),
+                        last_modified=normalized_event.get("timestamp"),
+                    )
+
+            normalized.append(normalized_event)
+
+        await self._store_file_states(connection_id, state_writes, deleted_ids)
+        return normalized
+
     async def _fetch_folder_events_via_children(
         self,
         access_token: str,
@@ -384,54 +636,93 @@ class OneDrivePollingService:
             folder_name=folder.folder_name,
         )
 
-        try:
-            async with httpx.AsyncClient() as client:
-                # Get all children (files and folders)
-                # Use smaller page size to avoid potential limits
-                response = await client.get(
-                    endpoint,
-                    headers={"Authorization": f"Bearer {access_token}"},
-                    params={"$top": 200},  # Use smaller page size
-                    timeout=30.0,
-                )
+        baseline_timestamp = folder.last_seen_timestamp
+        # Project only the fields normalization needs and let Graph drop unchanged items.
+        # Newest-first ordering lets paging stop at the baseline even where $filter is rejected.
+        params: Optional[Dict[str, Any]] = {
+            "$top": 200,
+            "$select": self.CHILDREN_SELECT,
+            "$orderby": "lastModifiedDateTime desc",
+        }
+        if baseline_timestamp:
+            params["$filter"] = f"lastModifiedDateTime gt {baseline_timestamp.isoformat()}Z"
+        ordered = True
+
+        items: List[Dict[str, Any]] = []
+        request_url: Optional[str] = endpoint
+        while request_url:
+            try:
+                response = await self._graph_get(request_url, access_token, params=params)
                 response.raise_for_status()
-                data = response.json()
-        except httpx.HTTPStatusError as e:
-            error_text = e.response.text
-            logger.error(
-                "Graph API children query failed",
-                status_code=e.response.status_code,
-                error=error_text,
-                folder_id=folder.folder_id,
-            )
-            # If root children also fails, log and return empty (personal account limitation)
-            if "SPO license" in error_text or "BadRequest" in error_text:
-                logger.warning(
-                    "Root children endpoint also requires SPO license - personal account limitation",
+                data = orjson.loads(response.content)
+            except httpx.HTTPStatusError as e:
+                error_text = e.response.text
+                if (
+                    e.response.status_code == 400
+                    and params
+                    and ("$filter" in params or "$orderby" in params)
+                    and "SPO license" not in error_text
+                ):
+                    # Some drives reject $filter (then $orderby) on children; drop one and retry.
+                    # Results are still checked against the baseline client-side.
+                    dropped = "$filter" if "$filter" in params else "$orderby"
+                    logger.info(
+                        "Children query option rejected, retrying without it",
+                        option=dropped,
+                        folder_id=folder.folder_id,
+                    )
+                    params.pop(dropped)
+                    ordered = "$orderby" in params
+                    continue
+                logger.error(
+                    "Graph API children query failed",
+                    status_code=e.response.status_code,
+                    error=error_text,
                     folder_id=folder.folder_id,
                 )
-                return [], latest_timestamp, None
-            raise
-
-        items = data.get("value", [])
-        baseline_timestamp = folder.last_seen_timestamp
+                # If root children also fails, log and return empty (personal account limitation)
+                if "SPO license" in error_text or "BadRequest" in error_text:
+                    logger.warning(
+                        "Root children endpoint also requires SPO license - personal account limitation",
+                        folder_id=folder.folder_id,
+                    )
+                    return [], latest_timestamp, None
+                raise
 
+            page = data.get("value", [])
+            items.extend(page)
+            # nextLink already carries the query options
+            request_url = data.get("@odata.nextLink")
+            params = None
+            if ordered and baseline_timestamp and page:
+                # Newest first: once a page reaches the baseline, every later page is older still
+                oldest = page[-1].get("lastModifiedDateTime")
+                oldest_ts = parse_timestamp_utc(oldest) if oldest else None
+                if oldest_ts is not None and as_naive_utc(oldest_ts) <= baseline_timestamp:
+                    break
+
+        folder_id = folder.folder_id
+        folder_name_seg = f"/{folder.folder_name}".casefold()
+        folder_name_dir = f"{folder_name_seg}/"
+        is_root = folder_id == "root"
         for item in items:
+            # Skip folders - we only track files (checked before the costlier path match)
+            if item.get("folder") and not item.get("file"):
+                continue
             # Filter to only include items from the protected folder
-            if folder.folder_id != "root":
+            if not is_root:
                 parent_ref = item.get("parentReference", {})
-                item_parent_id = parent_ref.get("id")
-                
+
                 # Match if parent ID matches folder_id (item is directly in the folder)
                 # OR if the item itself is the folder
-                if item_parent_id != folder.folder_id and item.get("id") != folder.folder_id:
-                    # For nested items, check if the path contains our folder
-                    item_path = parent_ref.get("path", "")
-                    if not item_path or f"/{folder.folder_name}" not in item_path:
+                if parent_ref.get("id") != folder_id and item.get("id") != folder_id:
+                    # For nested items, check that our folder is a component of the path
+                    item_path = parent_ref.get("path")
+                    if not item_path:
+                        continue
+                    item_path = item_path.casefold()
+                    if not item_path.endswith(folder_name_seg) and folder_name_dir not in item_path:
                         continue
-            # Skip folders - we only track files
-            if item.get("folder") and not item.get("file"):
-                continue
 
             # Check if this file was modified after our baseline
             last_modified_str = item.get("lastModifiedDateTime")
@@ -439,10 +730,10 @@ class OneDrivePollingService:
                 continue
 
             try:
-                last_modified = datetime.fromisoformat(last_modified_str.replace("Z", "+00:00"))
-                last_modified_naive = self._as_naive_utc(last_modified)
+                last_modified = parse_iso(last_modified_str)
+                last_modified_naive = as_naive_utc(last_modified)
 
-                # If we have a baseline, only process files modified after it
+                # Guard against drives that ignore $filter: only process files modified after the baseline
                 if baseline_timestamp and last_modified_naive <= baseline_timestamp:
                     continue
 
@@ -452,7 +743,7 @@ class OneDrivePollingService:
                 
                 if created_str:
                     try:
-                        created = datetime.fromisoformat(created_str.replace("Z", "+00:00"))
+                        created = parse_iso(created_str)
                         time_diff = abs((last_modified - created).total_seconds())
                         if time_diff <= 60.0:
                             change_type = "created"
@@ -480,72 +771,125 @@ class OneDrivePollingService:
         # No delta token for children endpoint - return None
         return normalized, latest_timestamp, None
 
-    async def _get_file_state(
-        self, connection_id: str, file_id: str
-    ) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _file_state_key(connection_id: str, file_id: str) -> str:
+        # "fs2" = compact array encoding; legacy "file_state" JSON-object keys simply age out
+        return f"onedrive:fs2:{connection_id}:{file_id}"
+
+    @staticmethod
+    def _encode_file_state(state: Dict[str, Any]) -> str:
+        return orjson.dumps([state.get("etag"), state.get("last_modified"), state.get("version")]).decode()
+
+    @staticmethod
+    def _decode_file_state(value: str) -> Dict[str, Any]:
+        etag, last_modified, version = orjson.loads(value)
+        return {"etag": etag, "last_modified": last_modified, "version": version}
+
+    @staticmethod
+    def _file_state(
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "version": version,
+        }
+
+    async def _get_file_states(
+        self, connection_id: str, file_ids: List[str]
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
         """
-        Retrieve stored file state from Redis.
+        Retrieve stored file states from Redis with a single MGET.
         
         Returns:
-            Dict with keys: etag, last_modified, version, or None if not found/unavailable
+            Dict mapping file_id to its state (keys: etag, last_modified, version);
+            files with no stored state are omitted
         """
-        if not self.redis_client:
-            return None
-        
+        if not self.redis_client or not file_ids:
+            return {}
+
+        cache = self._state_cache
+        states: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing: List[str] = []
+        for file_id in file_ids:
+            cache_key = (connection_id, file_id)
+            if cache_key in cache:
+                if cache[cache_key]:
+                    states[file_id] = cache[cache_key]
+            else:
+                missing.append(file_id)
+        if not missing:
+            return states
+
         try:
-            key = f"onedrive:file_state:{connection_id}:{file_id}"
-            value = await self.redis_client.get(key)
-            if value:
-                return json.loads(value)
-            return None
+            values = await self.redis_client.mget(
+                [self._file_state_key(connection_id, file_id) for file_id in missing]
+            )
         except Exception as e:
             logger.warning(
-                "Failed to get file state from Redis",
+                "Failed to get file states from Redis",
                 connection_id=connection_id,
-                file_id=file_id,
+                count=len(missing),
                 error=str(e),
             )
-            return None
+            return states
 
-    async def _store_file_state(
+        for file_id, value in zip(missing, values):
+            state = None
+            if value:
+                try:
+                    state = self._decode_file_state(value)
+                except (ValueError, TypeError):
+                    logger.debug("Ignoring unreadable file state", file_id=file_id)
+            cache[(connection_id, file_id)] = state
+            if state:
+                states[file_id] = state
+        return states
+
+    async def _store_file_states(
         self,
         connection_id: str,
-        file_id: str,
-        etag: Optional[str] = None,
-        last_modified: Optional[str] = None,
-        version: Optional[str] = None,
+        states: Dict[str, Dict[str, Any]],
+        deleted_ids: Sequence[str] = (),
     ) -> bool:
         """
-        Store file state in Redis.
+        Flush a batch's file-state changes to Redis in one non-transactional pipeline.
+
+        Deleted files are UNLINKed before the writes, so a file re-created later in
+        the same batch keeps its new state.
         
         Args:
             connection_id: OneDrive connection ID
-            file_id: File ID from Graph API
-            etag: File ETag (changes when content changes)
-            last_modified: Last modified timestamp
-            version: File version (if available)
+            states: Mapping of file_id to state (etag, last_modified, version)
+            deleted_ids: File IDs whose stored state should be removed
         
         Returns:
             True if stored successfully, False otherwise
         """
-        if not self.redis_client:
+        if not self.redis_client or not (states or deleted_ids):
             return False
-        
+
+        for file_id in deleted_ids:
+            self._state_cache[(connection_id, file_id)] = None
+        for file_id, state in states.items():
+            self._state_cache[(connection_id, file_id)] = state
         try:
-            key = f"onedrive:file_state:{connection_id}:{file_id}"
-            state = {
-                "etag": etag,
-                "last_modified": last_modified,
-                "version": version,
-            }
-            # Store with 90 day TTL (7776000 seconds)
-            await self.redis_client.setex(key, 7776000, json.dumps(state))
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                if deleted_ids:
+                    pipe.unlink(*(self._file_state_key(connection_id, file_id) for file_id in deleted_ids))
+                for file_id, state in states.items():
+                    key = self._file_state_key(connection_id, file_id)
+                    pipe.setex(key, self.FILE_STATE_TTL_SECONDS, self._encode_file_state(state))
+                await pipe.execute()
             return True
         except Exception as e:
             logger.warning(
-                "Failed to store file state in Redis",
+                "Failed to store file states in Redis",
                 connection_id=connection_id,
-                file_id=file_id,
+                count=len(states),
+                deleted=len(deleted_ids),
                 error=str(e),
             )
             return False
@@ -568,16 +912,10 @@ class OneDrivePollingService:
             params = {
                 "$select": "id,name,eTag,lastModifiedDateTime,fileSystemInfo,createdDateTime"
             }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    endpoint,
-                    headers={"Authorization": f"Bearer {access_token}"},
-                    params=params,
-                    timeout=10.0,
-                )
-                response.raise_for_status()
-                return response.json()
+
+            response = await self._graph_get(endpoint, access_token, params=params, timeout=10.0)
+            response.raise_for_status()
+            return orjson.loads(response.content)
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 404:
                 # File not found - treat as deletion
@@ -598,21 +936,25 @@ class OneDrivePollingService:
             )
             return None
 
-    async def _detect_file_modification(
+    def _detect_file_modification(
         self,
         delta_item: Dict[str, Any],
-        access_token: str,
+        current_metadata: Dict[str, Any],
+        stored_state: Optional[Dict[str, Any]],
         connection: OneDriveConnection,
         folder: OneDriveProtectedFolder,
+        state_writes: Dict[str, Dict[str, Any]],
     ) -> Optional[Dict[str, Any]]:
         """
         Detect if a file modification occurred by comparing current state with stored state.
         
         Args:
             delta_item: Delta item from Graph API
-            access_token: OAuth access token
+            current_metadata: Current file metadata fetched from Graph API
+            stored_state: Previously stored file state, if any
             connection: OneDriveConnection instance
             folder: OneDriveProtectedFolder instance
+            state_writes: Buffer of file states to flush to Redis; updated on detection
         
         Returns:
             Normalized event dict with event_subtype="file_modified" if modification detected,
@@ -622,18 +964,9 @@ class OneDrivePollingService:
         if not file_id:
             return None
         
-        # Fetch current file metadata
-        current_metadata = await self._fetch_file_metadata(access_token, file_id)
-        if not current_metadata:
-            # File not found - might be a deletion, let delta handle it
-            return None
-        
         current_etag = current_metadata.get("eTag")
         current_last_modified = current_metadata.get("lastModifiedDateTime")
         
-        # Get stored state
-        stored_state = await self._get_file_state(str(connection.id), file_id)
-        
         if stored_state:
             # File was seen before - check if ETag changed
             stored_etag = stored_state.get("etag")
@@ -645,47 +978,19 @@ class OneDrivePollingService:
                     old_etag=stored_etag,
                     new_etag=current_etag,
                 )
-                # Update delta item with current metadata for accurate normalization
-                delta_item["eTag"] = current_etag
-                delta_item["lastModifiedDateTime"] = current_last_modified
-                normalized_event = normalize_delta_item(
-                    delta_item, "updated", connection, folder
-                )
-                # Ensure it's marked as modification
-                normalized_event["event_subtype"] = "file_modified"
-                normalized_event["change_type"] = "updated"
-                # Store updated state
-                await self._store_file_state(
-                    str(connection.id),
-                    file_id,
-                    etag=current_etag,
-                    last_modified=current_last_modified,
-                )
-                return normalized_event
             elif current_last_modified and stored_state.get("last_modified"):
                 # ETag same but timestamp changed - metadata-only change, still log as modification
                 stored_last_modified = stored_state.get("last_modified")
-                if current_last_modified != stored_last_modified:
-                    logger.debug(
-                        "File metadata change detected",
-                        file_id=file_id,
-                        old_timestamp=stored_last_modified,
-                        new_timestamp=current_last_modified,
-                    )
-                    delta_item["eTag"] = current_etag
-                    delta_item["lastModifiedDateTime"] = current_last_modified
-                    normalized_event = normalize_delta_item(
-                        delta_item, "updated", connection, folder
-                    )
-                    normalized_event["event_subtype"] = "file_modified"
-                    normalized_event["change_type"] = "updated"
-                    await self._store_file_state(
-                        str(connection.id),
-                        file_id,
-                        etag=current_etag,
-                        last_modified=current_last_modified,
-                    )
-                    return normalized_event
+                if current_last_modified == stored_last_modified:
+                    return None
+                logger.debug(
+                    "File metadata change detected",
+                    file_id=file_id,
+                    old_timestamp=stored_last_modified,
+                    new_timestamp=current_last_modified,
+                )
+            else:
+                return None
         else:
             # File not in Redis - first time seeing it, but delta says "updated"
             # This might be a modification that happened before we started tracking
@@ -694,157 +999,279 @@ class OneDrivePollingService:
                 "File not in Redis but delta reports update - treating as modification",
                 file_id=file_id,
             )
-            await self._store_file_state(
-                str(connection.id),
-                file_id,
-                etag=current_etag,
-                last_modified=current_last_modified,
-            )
-            delta_item["eTag"] = current_etag
-            delta_item["lastModifiedDateTime"] = current_last_modified
-            normalized_event = normalize_delta_item(
-                delta_item, "updated", connection, folder
-            )
-            normalized_event["event_subtype"] = "file_modified"
-            normalized_event["change_type"] = "updated"
-            return normalized_event
-        
-        return None
 
-    async def _persist_event(self, normalized_event: Dict[str, Any]) -> None:
+        return self._emit_modified(
+            file_id, delta_item, current_etag, current_last_modified, connection, folder, state_writes
+        )
+
+    def _emit_modified(
+        self,
+        file_id: str,
+        delta_item: Dict[str, Any],
+        current_etag: Optional[str],
+        current_last_modified: Optional[str],
+        connection: OneDriveConnection,
+        folder: OneDriveProtectedFolder,
+        state_writes: Dict[str, Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Record the file's current state and build a ``file_modified`` event from its current metadata.
+        """
+        state_writes[file_id] = self._file_state(etag=current_etag, last_modified=current_last_modified)
+        # Update delta item with current metadata for accurate normalization
+        delta_item["eTag"] = current_etag
+        delta_item["lastModifiedDateTime"] = current_last_modified
+        # Ensure it's marked as modification
+        return normalize_delta_item(delta_item, "updated", connection, folder, event_subtype="file_modified")
+
+    async def _persist_events(self, normalized_events: List[Dict[str, Any]]) -> int:
+        """
+        Run a batch of events through EventProcessor and persist matches to MongoDB.
+
+        Events go through ``EventProcessor.process_batch`` in one call and are
+        written with unordered ``bulk_write`` upserts so one bad document
+        doesn't abort the rest.
+
+        Returns:
+            Number of documents inserted
         """
-        Run event through EventProcessor and persist it to MongoDB.
+        recent_ids = OneDrivePollingService._recent_event_ids
+        unique_events: Dict[str, Dict[str, Any]] = {}
+        recently_seen = 0
+        for normalized_event in normalized_events:
+            event_id = normalized_event["event_id"]
+            if event_id in recent_ids:
+                # Seen by this worker recently; skip without a Redis/Mongo round-trip
+                recent_ids.move_to_end(event_id)
+                recently_seen += 1
+                continue
+            unique_events.setdefault(event_id, normalized_event)
+
+        # Redis SET NX claims every id in one round-trip; Mongo is only consulted when Redis is unavailable
+        event_ids = list(unique_events)
+        claimed = await self._claim_event_ids(event_ids)
+        if claimed is not None:
+            duplicates = set(event_ids) - claimed
+        else:
+            duplicates = await self._filter_duplicates(event_ids)
+        fresh = [event for event_id, event in unique_events.items() if event_id not in duplicates]
+        if recently_seen or duplicates:
+            logger.debug("Skipped duplicate OneDrive events", duplicates=recently_seen + len(duplicates))
+
+        if not fresh:
+            return 0
+
+        fresh_ids = [event["event_id"] for event in fresh]
+        try:
+            inserted, handled_ids = await self._process_and_store(fresh)
+        except Exception:
+            # Claimed ids would otherwise read as seen for SEEN_EVENT_TTL_SECONDS and the events be lost
+            if claimed is not None:
+                await self._release_event_ids(fresh_ids)
+            raise
+
+        # Only ids that were stored (or needed no write) are remembered, so failures get retried
+        self._remember_event_ids(handled_ids)
+        if claimed is not None and len(handled_ids) < len(fresh_ids):
+            handled = set(handled_ids)
+            await self._release_event_ids([event_id for event_id in fresh_ids if event_id not in handled])
+        return inserted
+
+    async def _process_and_store(self, fresh: List[Dict[str, Any]]) -> Tuple[int, List[str]]:
         """
-        if await self._is_duplicate(normalized_event["event_id"]):
-            logger.debug("Skipping duplicate OneDrive event", event_id=normalized_event["event_id"])
-            return
+        Run new events through EventProcessor and upsert the policy matches.
 
-        payload = self._build_processor_payload(normalized_event)
-        processed = await self.event_processor.process_event(payload)
+        Returns:
+            Number of documents inserted, and the ids that were stored or needed no
+            write; events dropped by processing or rejected by Mongo are left out
+        """
+        # Both builders need the agent id; derive it once per event
+        batch = [(event, f"onedrive-{event['connection_id']}") for event in fresh]
+        processed_events = await self.event_processor.process_batch(
+            [self._build_processor_payload(event, agent_id) for event, agent_id in batch]
+        )
+        # process_batch drops events that failed processing, so pair results back up by id
+        processed_by_id = {processed.get("event_id"): processed for processed in processed_events}
+
+        docs: List[Dict[str, Any]] = []
+        # Ids fully handled without a write; they join the LRU alongside stored ids
+        handled_ids: List[str] = []
+        for normalized_event, agent_id in batch:
+            processed = processed_by_id.get(normalized_event["event_id"])
+            if processed is None:
+                continue
+            matched_policies = processed.get("matched_policies")
+            if not matched_policies:
+                handled_ids.append(normalized_event["event_id"])
+                continue
 
-        matched_policies = processed.get("matched_policies")
-        if not matched_policies:
-            logger.debug(
-                "Skipping event with no policy matches",
+            logger.info(
+                "OneDrive event matched policies",
                 event_id=normalized_event["event_id"],
-                folder_id=normalized_event["folder_id"],
+                match_count=len(matched_policies),
+                policies=[policy.get("policy_name") for policy in matched_policies],
             )
+            docs.append(self._build_event_document(normalized_event, processed, agent_id))
+        if handled_ids:
+            logger.debug("Skipped OneDrive events with no policy matches", events=len(handled_ids))
+
+        inserted = 0
+        if docs:
+            await self._ensure_indexes()
+            for start in range(0, len(docs), self.INSERT_BATCH_SIZE):
+                chunk = docs[start:start + self.INSERT_BATCH_SIZE]
+                chunk_inserted, failed_ids = await self._insert_documents(chunk)
+                inserted += chunk_inserted
+                handled_ids.extend(doc["id"] for doc in chunk if doc["id"] not in failed_ids)
+        return inserted, handled_ids
+
+    def _remember_event_ids(self, event_ids: List[str]) -> None:
+        recent_ids = OneDrivePollingService._recent_event_ids
+        for event_id in event_ids:
+            recent_ids[event_id] = None
+        while len(recent_ids) > self.RECENT_EVENT_IDS_MAX:
+            recent_ids.popitem(last=False)
+
+    async def _ensure_indexes(self) -> None:
+        """
+        Create the dlp_events indexes the poller relies on, once per process.
+
+        The unique ``id`` index backs duplicate detection (E11000 on insert, covered
+        ``$in`` lookups); ``(agent_id, timestamp)`` serves per-connection scans, since
+        agent_id is derived from the connection id.
+        """
+        if OneDrivePollingService._indexes_ensured:
             return
+        # Attempt once per process; a failure (e.g. legacy duplicate ids) shouldn't be retried every batch
+        OneDrivePollingService._indexes_ensured = True
+        try:
+            await self.events_collection.create_index("id", unique=True, background=True)
+            await self.events_collection.create_index([("agent_id", 1), ("timestamp", -1)], background=True)
+        except Exception as e:
+            logger.warning("Failed to ensure OneDrive event indexes", error=str(e))
 
-        logger.info(
-            "OneDrive event matched policies",
-            event_id=normalized_event["event_id"],
-            match_count=len(matched_policies),
-            policies=[policy.get("policy_name") for policy in matched_policies],
-        )
+    async def _insert_documents(self, docs: List[Dict[str, Any]]) -> Tuple[int, Set[str]]:
+        """
+        Write one chunk of event documents as unordered ``$setOnInsert`` upserts keyed on ``id``.
 
-        doc = self._build_event_document(normalized_event, processed)
-        await self.events_collection.insert_one(doc)
-
-    async def _is_duplicate(self, event_id: str) -> bool:
-        existing = await self.events_collection.find_one({"id": event_id})
-        return existing is not None
-
-    def _build_processor_payload(self, event: Dict[str, Any]) -> Dict[str, Any]:
-        payload = {
-            "event_id": event["event_id"],
-            "source": event["source"],
-            "agent": {
-                "id": f"onedrive-{event['connection_id']}",
-                "name": "OneDrive Cloud",
-                "type": "cloud",
-            },
-            "event": {
-                "type": event["event_type"],
-                "severity": event["severity"],
-                "source_type": event["source"],
-                "action": event.get("action", "logged"),
-                "subtype": event.get("event_subtype"),
-            },
-            "metadata": {
-                "ingest_source": "onedrive",
-                "folder_id": event["folder_id"],
-                "protected_folder_id": event.get("protected_folder_id"),
-                "connection_id": event["connection_id"],
-            },
-            "tags": ["onedrive", "cloud"],
-            "user": {"email": event.get("user_email", "unknown@onedrive")},
-        }
+        An event another poller already stored simply matches and is left untouched, so
+        concurrent workers can't create duplicates and no separate existence check is
+        needed at write time.
 
-        payload.setdefault("file", {})
-        payload["file"]["path"] = event.get("folder_path")
-        payload["file"]["name"] = event.get("file_name")
-        payload["file"]["id"] = event.get("file_id")
-        payload["file"]["size"] = event.get("file_size")
-        payload["file"]["mime_type"] = event.get("mime_type")
+        Returns:
+            Number of documents newly stored, and the ids of documents that failed to write
+        """
+        operations = [UpdateOne({"id": doc["id"]}, {"$setOnInsert": doc}, upsert=True) for doc in docs]
+        try:
+            result = await self.events_collection.bulk_write(
+                operations, ordered=False, bypass_document_validation=True
+            )
+        except BulkWriteError as exc:
+            details = exc.details or {}
+            write_errors = details.get("writeErrors", [])
+            # Two upserts racing on the same id can still surface E11000; the event is stored either way
+            duplicates = sum(1 for error in write_errors if error.get("code") == _DUPLICATE_KEY_ERROR)
+            if duplicates:
+                logger.debug("Skipped OneDrive events already stored", duplicates=duplicates)
+            failed_ids = {
+                docs[error["index"]]["id"]
+                for error in write_errors
+                if error.get("code") != _DUPLICATE_KEY_ERROR
+            }
+            if failed_ids:
+                logger.warning(
+                    "Some OneDrive events failed to insert",
+                    inserted=details.get("nUpserted", 0),
+                    errors=len(failed_ids),
+                )
+            return details.get("nUpserted", 0), failed_ids
 
-        return payload
+        already_stored = len(docs) - result.upserted_count
+        if already_stored:
+            logger.debug("Skipped OneDrive events already stored", duplicates=already_stored)
+        return result.upserted_count, set()
 
-    def _parse_timestamp(self, value: Optional[str]) -> Optional[datetime]:
-        if not value:
+    async def _claim_event_ids(self, event_ids: List[str]) -> Optional[Set[str]]:
+        """
+        Mark event ids as seen in Redis with pipelined ``SET NX EX``.
+
+        Returns:
+            The ids that were not seen before, or None if Redis can't be used
+            (callers then fall back to the Mongo duplicate check)
+        """
+        if not self.redis_client:
             return None
+        if not event_ids:
+            return set()
         try:
-            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
-        except ValueError:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for event_id in event_ids:
+                    pipe.set(f"onedrive:evt:{event_id}", "1", nx=True, ex=self.SEEN_EVENT_TTL_SECONDS)
+                results = await pipe.execute()
+        except Exception as e:
+            logger.warning("Seen-event cache unavailable, using Mongo duplicate check", error=str(e))
             return None
-        return self._as_aware_utc(dt)
+        return {event_id for event_id, created in zip(event_ids, results) if created}
 
-    @staticmethod
-    def _as_aware_utc(dt: datetime) -> datetime:
-        if dt.tzinfo is None:
-            return dt.replace(tzinfo=timezone.utc)
-        return dt.astimezone(timezone.utc)
-
-    def _as_naive_utc(self, dt: datetime) -> datetime:
-        return self._as_aware_utc(dt).replace(tzinfo=None)
+    async def _release_event_ids(self, event_ids: List[str]) -> None:
+        """
+        Drop seen-event claims for events that were not stored, so the next poll retries them.
+        """
+        if not self.redis_client or not event_ids:
+            return
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.unlink(*(f"onedrive:evt:{event_id}" for event_id in event_ids))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to release OneDrive seen-event claims", events=len(event_ids), error=str(e))
 
-    def _format_timestamp(self, dt: datetime) -> str:
-        return self._as_aware_utc(dt).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    async def _filter_duplicates(self, event_ids: List[str]) -> Set[str]:
+        """
+        Return the subset of ``event_ids`` already stored.
 
-    def _build_event_document(self, event: Dict[str, Any], processed: Dict[str, Any]) -> Dict[str, Any]:
-        event_ts = (
-            self._parse_timestamp(event.get("timestamp"))
-            or datetime.utcnow().replace(tzinfo=timezone.utc)
+        Lookups are ``$in`` queries covered by the ``id`` index and projected to the id alone;
+        more than DUPLICATE_LOOKUP_BATCH_SIZE ids are split into chunks queried concurrently.
+        """
+        if not event_ids:
+            return set()
+        size = self.DUPLICATE_LOOKUP_BATCH_SIZE
+        if len(event_ids) <= size:
+            return await self._stored_ids(event_ids)
+        chunks = await asyncio.gather(
+            *(self._stored_ids(event_ids[start:start + size]) for start in range(0, len(event_ids), size))
         )
-        persisted_ts = self._as_naive_utc(event_ts)
+        return set().union(*chunks)
 
-        metadata = dict(processed.get("metadata", {}))
-        metadata.setdefault("activity_timestamp", persisted_ts)
+    async def _stored_ids(self, event_ids: List[str]) -> Set[str]:
+        cursor = self.events_collection.find({"id": {"$in": event_ids}}, {"id": 1, "_id": 0})
+        return {doc["id"] async for doc in cursor}
 
-        return {
-            "id": event["event_id"],
-            "timestamp": persisted_ts,
-            "event_type": event["event_type"],
-            "event_subtype": event.get("event_subtype"),
-            "description": event.get("description", "OneDrive file activity"),
-            "severity": processed.get("event", {}).get("severity", event["severity"]),
-            "source": event["source"],
-            "agent_id": f"onedrive-{event['connection_id']}",
-            "user_email": event.get("user_email", "unknown@onedrive"),
-            "classification_score": 0.0,
-            "classification_labels": [],
-            "action_taken": processed.get("event", {}).get("action", event.get("action", "logged")),
-            "file_path": event.get("folder_path"),
-            "file_name": event.get("file_name"),
-            "file_id": event.get("file_id"),
-            "file_size": event.get("file_size"),
-            "mime_type": event.get("mime_type"),
-            "folder_id": event.get("folder_id"),
-            "protected_folder_id": event.get("protected_folder_id"),
-            "folder_name": event.get("folder_name"),
-            "folder_path": event.get("folder_path"),
-            "blocked": False,
-            "details": {
-                "onedrive_event_id": event.get("onedrive_event_id"),
-                "change_type": event.get("change_type"),
-                "etag": event.get("etag"),
-                "version": event.get("version"),
-                "raw_delta_item": event.get("details"),
-            },
-            "matched_policies": processed.get("matched_policies", []),
-            "policy_action_summaries": processed.get("policy_action_summaries", []),
-            "metadata": metadata,
-            "tags": processed.get("tags", ["onedrive"]),
-            "policy_version": processed.get("policy_version"),
-        }
+    def _build_processor_payload(self, event: Dict[str, Any], agent_id: str) -> Dict[str, Any]:
+        return build_processor_payload(event, agent_id)
 
+    def _parse_timestamp(self, value: Optional[str]) -> Optional[datetime]:
+        if not value:
+            return None
+        return parse_timestamp_utc(value)
+
+    @staticmethod
+    def _strip_tz(dt: datetime) -> datetime:
+        """Drop tzinfo from a datetime already known to be in UTC."""
+        return dt.replace(tzinfo=None)
+
+    def _format_timestamp(self, dt: datetime) -> str:
+        return format_timestamp_utc(dt)
+
+    def _build_event_document(
+        self, event: Dict[str, Any], processed: Dict[str, Any], agent_id: str
+    ) -> Dict[str, Any]:
+        event_ts = (
+            event.get("_ts")
+            or self._parse_timestamp(event.get("timestamp"))
+            or datetime.now(_UTC)
+        )
+        # Every source above yields an aware UTC datetime, so dropping tzinfo is enough
+        return build_event_document(
+            event, processed, agent_id, self._strip_tz(event_ts), store_raw_delta=self._store_raw_delta
+        )
@@ -2,20 +2,40 @@
 Policy Service - Business logic for DLP policy management
 """
 
-from typing import Optional, List
-from datetime import datetime
-from sqlalchemy import select
+import time
+import uuid
+from typing import Any, ClassVar, Optional, List, Tuple
+from sqlalchemy import Row, func, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.database import utcnow
 from app.models.policy import Policy
 
+VALID_MATCH_TYPES = ["all", "any", "none"]
+VALID_ACTIONS = ["alert", "block", "quarantine", "encrypt", "redact", "log"]
+_VALID_ACTION_SET = frozenset(VALID_ACTIONS)
+
 
 class PolicyService:
     """Service for policy-related operations"""
 
+    # Enabled policies shared by every PolicyService in the process. Policy writes are rare and all
+    # go through this service, which clears the cache after committing; other workers pick up a
+    # change once the TTL lapses.
+    ENABLED_POLICIES_CACHE_TTL_SECONDS: ClassVar[float] = 30.0
+    _enabled_policies_cache: ClassVar[Optional[Tuple[float, List[Policy]]]] = None
+
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    @classmethod
+    def invalidate_policy_cache(cls) -> None:
+        """
+        Drop the cached enabled-policy list so the next read reloads it
+        """
+        cls._enabled_policies_cache = None
+
     async def get_policy_by_id(self, policy_id: str) -> Optional[Policy]:
         """
         Fetch policy by ID
@@ -26,10 +46,14 @@ class PolicyService:
         Returns:
             Policy object or None if not found
         """
-        result = await self.db.execute(
-            select(Policy).where(Policy.id == policy_id)
-        )
-        return result.scalar_one_or_none()
+        # Session.get() answers from the identity map when this session already loaded the policy, so
+        # repeated lookups within a request cost one SELECT. Identity keys are UUIDs, not strings.
+        if not isinstance(policy_id, uuid.UUID):
+            try:
+                policy_id = uuid.UUID(str(policy_id))
+            except ValueError:
+                return None
+        return await self.db.get(Policy, policy_id)
 
     async def get_policy_by_name(self, name: str) -> Optional[Policy]:
         """
@@ -46,6 +70,21 @@ class PolicyService:
         )
         return result.scalar_one_or_none()
 
+    async def _policy_id_by_name(self, name: str) -> Optional[uuid.UUID]:
+        """
+        Look up only the id of the policy with a name, for uniqueness checks
+
+        Args:
+            name: Policy name
+
+        Returns:
+            Policy UUID or None if no policy uses the name
+        """
+        result = await self.db.execute(
+            select(Policy.id).where(Policy.name == name).limit(1)
+        )
+        return result.scalar_one_or_none()
+
     async def get_all_policies(
         self,
         skip: int = 0,
@@ -73,6 +112,42 @@ class PolicyService:
         result = await self.db.execute(query)
         return list(result.scalars().all())
 
+    async def list_policies_lite(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        enabled_only: bool = False,
+    ) -> List[Row[Any]]:
+        """
+        Fetch policy summaries without the JSON conditions, actions and config columns
+
+        Args:
+            skip: Number of records to skip
+            limit: Maximum number of records to return
+            enabled_only: If True, return only enabled policies
+
+        Returns:
+            List of rows with id, name, enabled, priority, type, severity and updated_at attributes,
+            in the same order as get_all_policies
+        """
+        query = select(
+            Policy.id,
+            Policy.name,
+            Policy.enabled,
+            Policy.priority,
+            Policy.type,
+            Policy.severity,
+            Policy.updated_at,
+        )
+
+        if enabled_only:
+            query = query.where(Policy.enabled == True)
+
+        query = query.offset(skip).limit(limit).order_by(Policy.priority.desc(), Policy.created_at.desc())
+
+        result = await self.db.execute(query)
+        return list(result.all())
+
     async def create_policy(
         self,
         name: str,
@@ -107,11 +182,6 @@ class PolicyService:
         Raises:
             ValueError: If policy with name already exists or invalid structure
         """
-        # Check if policy already exists
-        existing_policy = await self.get_policy_by_name(name)
-        if existing_policy:
-            raise ValueError(f"Policy with name '{name}' already exists")
-
         # Validate policy structure
         self._validate_policy_structure(conditions, actions)
 
@@ -131,9 +201,18 @@ class PolicyService:
             agent_ids=agent_ids or [],
         )
 
+        # id and timestamps are Python-side column defaults set during the INSERT flush, and sessions
+        # don't expire on commit, so the instance is complete without a refresh
         self.db.add(policy)
-        await self.db.commit()
-        await self.db.refresh(policy)
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            # Name uniqueness is enforced by the constraint, so there is no check-then-insert race
+            if await self._policy_id_by_name(name):
+                raise ValueError(f"Policy with name '{name}' already exists")
+            raise
+        self.invalidate_policy_cache()
 
         return policy
 
@@ -171,55 +250,55 @@ class PolicyService:
         Raises:
             ValueError: If invalid structure
         """
-        policy = await self.get_policy_by_id(policy_id)
-        if not policy:
-            return None
+        changes = {}
 
         if name is not None:
-            # Check if new name conflicts
-            existing = await self.get_policy_by_name(name)
-            if existing and str(existing.id) != policy_id:
-                raise ValueError(f"Policy with name '{name}' already exists")
-            policy.name = name
+            changes["name"] = name
 
         if description is not None:
-            policy.description = description
+            changes["description"] = description
 
         if conditions is not None:
             self._validate_conditions(conditions)
-            policy.conditions = conditions
+            changes["conditions"] = conditions
 
         if actions is not None:
             self._validate_actions(actions)
-            policy.actions = actions
+            changes["actions"] = actions
 
         if enabled is not None:
-            policy.enabled = enabled
+            changes["enabled"] = enabled
 
         if priority is not None:
-            policy.priority = priority
+            changes["priority"] = priority
 
         if compliance_tags is not None:
-            policy.compliance_tags = compliance_tags
+            changes["compliance_tags"] = compliance_tags
 
         if type is not None:
-            policy.type = type
+            changes["type"] = type
 
         if severity is not None:
-            policy.severity = severity
+            changes["severity"] = severity
 
         if config is not None:
-            policy.config = config
+            changes["config"] = config
 
         if agent_ids is not None:
-            policy.agent_ids = agent_ids
-
-        policy.updated_at = datetime.utcnow()
+            changes["agent_ids"] = agent_ids
 
-        await self.db.commit()
-        await self.db.refresh(policy)
+        if not changes:
+            # Nothing to write: leave updated_at (and the agent bundle version derived from it) alone
+            return await self.get_policy_by_id(policy_id)
 
-        return policy
+        try:
+            return await self._update_policy_columns(policy_id, **changes)
+        except IntegrityError:
+            await self.db.rollback()
+            # Check if new name conflicts
+            if name is not None and await self._policy_id_by_name(name):
+                raise ValueError(f"Policy with name '{name}' already exists")
+            raise
 
     async def delete_policy(self, policy_id: str) -> bool:
         """
@@ -237,6 +316,7 @@ class PolicyService:
 
         await self.db.delete(policy)
         await self.db.commit()
+        self.invalidate_policy_cache()
         return True
 
     async def enable_policy(self, policy_id: str) -> Optional[Policy]:
@@ -249,17 +329,7 @@ class PolicyService:
         Returns:
             Updated Policy object or None if not found
         """
-        policy = await self.get_policy_by_id(policy_id)
-        if not policy:
-            return None
-
-        policy.enabled = True
-        policy.updated_at = datetime.utcnow()
-
-        await self.db.commit()
-        await self.db.refresh(policy)
-
-        return policy
+        return await self._update_policy_columns(policy_id, enabled=True)
 
     async def disable_policy(self, policy_id: str) -> Optional[Policy]:
         """
@@ -271,17 +341,7 @@ class PolicyService:
         Returns:
             Updated Policy object or None if not found
         """
-        policy = await self.get_policy_by_id(policy_id)
-        if not policy:
-            return None
-
-        policy.enabled = False
-        policy.updated_at = datetime.utcnow()
-
-        await self.db.commit()
-        await self.db.refresh(policy)
-
-        return policy
+        return await self._update_policy_columns(policy_id, enabled=False)
 
     async def get_enabled_policies(self) -> List[Policy]:
         """
@@ -290,7 +350,23 @@ class PolicyService:
         Returns:
             List of enabled Policy objects
         """
-        return await self.get_all_policies(enabled_only=True, limit=1000)
+        cached = PolicyService._enabled_policies_cache
+        if cached is not None and cached[0] > time.monotonic():
+            return list(cached[1])
+
+        policies = await self.get_all_policies(enabled_only=True, limit=1000)
+        dirty = self.db.dirty
+        if any(policy in dirty for policy in policies):
+            # This session holds uncommitted edits; don't cache or detach them
+            return policies
+        # Detach the cached instances so no session's identity map hands them out for modification
+        for policy in policies:
+            self.db.expunge(policy)
+        PolicyService._enabled_policies_cache = (
+            time.monotonic() + self.ENABLED_POLICIES_CACHE_TTL_SECONDS,
+            policies,
+        )
+        return list(policies)
 
     async def get_policy_count(self, enabled_only: bool = False) -> int:
         """
@@ -302,8 +378,6 @@ class PolicyService:
         Returns:
             Number of policies
         """
-        from sqlalchemy import func
-
         query = select(func.count(Policy.id))
 
         if enabled_only:
@@ -319,17 +393,15 @@ class PolicyService:
         Returns:
             Dictionary with total, active, inactive counts
         """
-        from sqlalchemy import func
-
-        # Total policies
-        total_query = select(func.count(Policy.id))
-        total_result = await self.db.execute(total_query)
-        total = total_result.scalar_one()
-
-        # Active policies
-        active_query = select(func.count(Policy.id)).where(Policy.enabled == True)
-        active_result = await self.db.execute(active_query)
-        active = active_result.scalar_one()
+        # Total and active policies from one scan
+        query = select(
+            func.count(Policy.id).label("total"),
+            func.count(Policy.id).filter(Policy.enabled == True).label("active"),
+        )
+        result = await self.db.execute(query)
+        row = result.one()
+        total = row.total
+        active = row.active
 
         # Inactive policies
         inactive = total - active
@@ -345,6 +417,32 @@ class PolicyService:
             "violations": violations,
         }
 
+    async def _update_policy_columns(self, policy_id: str, **values) -> Optional[Policy]:
+        """
+        Apply column changes to a policy with a single UPDATE ... RETURNING and commit
+
+        Args:
+            policy_id: UUID of the policy
+            **values: Column values to set; updated_at is always bumped to the database's clock
+
+        Returns:
+            Updated Policy object or None if not found
+        """
+        result = await self.db.execute(
+            update(Policy)
+            .where(Policy.id == policy_id)
+            .values(**values, updated_at=utcnow())
+            .returning(Policy)
+        )
+        policy = result.scalar_one_or_none()
+        if not policy:
+            return None
+
+        await self.db.commit()
+        self.invalidate_policy_cache()
+
+        return policy
+
     def _validate_policy_structure(self, conditions: dict, actions: dict) -> None:
         """
         Validate policy conditions and actions structure
@@ -376,9 +474,8 @@ class PolicyService:
         if "match" not in conditions:
             raise ValueError("Conditions must contain 'match' field")
 
-        valid_match_types = ["all", "any", "none"]
-        if conditions["match"] not in valid_match_types:
-            raise ValueError(f"Match type must be one of: {valid_match_types}")
+        if conditions["match"] not in VALID_MATCH_TYPES:
+            raise ValueError(f"Match type must be one of: {VALID_MATCH_TYPES}")
 
         if "rules" not in conditions:
             raise ValueError("Conditions must contain 'rules' field")
@@ -399,10 +496,7 @@ class PolicyService:
         if not isinstance(actions, dict):
             raise ValueError("Actions must be a dictionary")
 
-        # Valid action types
-        valid_actions = ["alert", "block", "quarantine", "encrypt", "redact", "log"]
-
         # At least one action must be specified
-        if not any(action in actions for action in valid_actions):
-            raise ValueError(f"At least one action must be specified: {valid_actions}")
+        if _VALID_ACTION_SET.isdisjoint(actions):
+            raise ValueError(f"At least one action must be specified: {VALID_ACTIONS}")
 
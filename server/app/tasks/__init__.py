@@ -3,9 +3,10 @@ Background Tasks
 Celery tasks for async processing
 """
 
-from .reporting_tasks import celery_app, generate_daily_reports, generate_weekly_reports, generate_monthly_reports, generate_custom_report
-from .google_drive_polling_tasks import poll_google_drive_activity
-from .onedrive_polling_tasks import poll_onedrive_activity
+from .celery_app import celery_app
+from .reporting_tasks import generate_daily_reports, generate_weekly_reports, generate_monthly_reports, generate_custom_report
+from .google_drive_polling_tasks import poll_google_drive_activity, poll_google_drive_connection
+from .onedrive_polling_tasks import poll_onedrive_activity, poll_onedrive_connection
 from .event_cleanup_tasks import cleanup_old_events
 
 __all__ = [
@@ -15,6 +16,8 @@ __all__ = [
     "generate_monthly_reports",
     "generate_custom_report",
     "poll_google_drive_activity",
+    "poll_google_drive_connection",
     "poll_onedrive_activity",
+    "poll_onedrive_connection",
     "cleanup_old_events"
 ]
@@ -0,0 +1,83 @@
+"""
+Celery Application
+Celery instance, serialization and beat schedule shared by every task module
+"""
+
+from typing import Any
+
+import orjson
+from celery import Celery
+from celery.schedules import crontab
+from kombu.serialization import register
+
+from app.core.config import settings
+
+# Initialize Celery
+celery_app = Celery(
+    "dlp_reporting",
+    broker=settings.REDIS_URL,
+    backend=settings.REDIS_URL,
+    # Task modules import celery_app from here; workers load them by name
+    include=[
+        "app.tasks.reporting_tasks",
+        "app.tasks.google_drive_polling_tasks",
+        "app.tasks.onedrive_polling_tasks",
+        "app.tasks.event_cleanup_tasks",
+    ],
+)
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    """
+    Encode a task message or result with orjson, stringifying types JSON can't carry
+    """
+    return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+register(
+    "orjson",
+    _orjson_dumps,
+    orjson.loads,
+    content_type="application/x-orjson",
+    content_encoding="utf-8",
+)
+
+# Celery configuration; plain JSON stays accepted so messages queued before a deploy still decode
+celery_app.conf.update(
+    task_serializer="orjson",
+    accept_content=["orjson", "json"],
+    result_serializer="orjson",
+    timezone="UTC",
+    enable_utc=True,
+    task_track_started=True,
+    task_time_limit=1800,  # 30 minutes
+    task_soft_time_limit=1500,  # 25 minutes
+    worker_prefetch_multiplier=1,
+    worker_max_tasks_per_child=50
+)
+
+# Define beat schedule for automated reports
+celery_app.conf.beat_schedule = {
+    "daily-reports": {
+        "task": "app.tasks.reporting_tasks.generate_daily_reports",
+        "schedule": crontab(hour=8, minute=0),  # 8:00 AM UTC every day
+    },
+    "weekly-reports": {
+        "task": "app.tasks.reporting_tasks.generate_weekly_reports",
+        "schedule": crontab(hour=9, minute=0, day_of_week=1),  # Monday 9:00 AM UTC
+    },
+    "monthly-reports": {
+        "task": "app.tasks.reporting_tasks.generate_monthly_reports",
+        "schedule": crontab(hour=10, minute=0, day_of_month=1),  # 1st of month, 10:00 AM UTC
+    },
+    "google-drive-polling": {
+        "task": "app.tasks.google_drive_polling_tasks.poll_google_drive_activity",
+        "schedule": crontab(minute="*/5"),  # Run every 5 minutes
+    },
+    "onedrive-polling": {
+        "task": "app.tasks.onedrive_polling_tasks.poll_onedrive_activity",
+        "schedule": crontab(minute="*/5"),  # Run every 5 minutes
+    },
+    # Old dlp_events are expired by MongoDB's TTL index (see ensure_event_retention_index);
+    # cleanup_old_events remains available for manual runs
+}
@@ -3,47 +3,67 @@ OneDrive Polling Tasks
 Background tasks for polling OneDrive Graph API
 """
 
-import asyncio
+from celery import group
 from celery.utils.log import get_task_logger
 
-# Avoid circular import by importing celery_app locally or using shared_task
-# using shared_task is safer if structure is complex, but here we follow the pattern
-from app.tasks.reporting_tasks import celery_app
+from app.tasks.celery_app import celery_app
 from app.services.onedrive_polling import OneDrivePollingService
 import app.core.database as database
+from app.tasks.worker_loop import run_async
 
 logger = get_task_logger(__name__)
 
+# Per-connection polls still queued when the next beat tick fans out are dropped; that tick covers them
+POLL_CONNECTION_EXPIRES_SECONDS = 300
+
 @celery_app.task(name="app.tasks.onedrive_polling_tasks.poll_onedrive_activity")
 def poll_onedrive_activity():
     """
-    Periodically poll all configured OneDrive connections for new activity.
+    Periodically fan out one polling task per configured OneDrive connection.
     """
     logger.info("Starting OneDrive polling task")
     
     try:
-        asyncio.run(run_polling())
-        logger.info("OneDrive polling task completed successfully")
-        return "success"
+        connection_ids = run_async(get_connection_ids())
+        if connection_ids:
+            group(
+                poll_onedrive_connection.s(connection_id).set(expires=POLL_CONNECTION_EXPIRES_SECONDS)
+                for connection_id in connection_ids
+            ).apply_async()
+        logger.info(f"Dispatched OneDrive polling for {len(connection_ids)} connections")
+        return len(connection_ids)
     except Exception as e:
         logger.error(f"OneDrive polling task failed: {str(e)}")
         raise
 
-async def run_polling():
+@celery_app.task(name="app.tasks.onedrive_polling_tasks.poll_onedrive_connection")
+def poll_onedrive_connection(connection_id: str):
     """
-    Async entry point for polling service.
+    Poll a single OneDrive connection for new activity.
     """
-    # Initialize DB (idempotent-ish)
-    await database.init_databases()
-    
-    # Use the factory to get a session
-    async with database.postgres_session_factory() as db:
-        service = OneDrivePollingService(db)
-        events_count = await service.poll_all_connections()
-        logger.info(f"Polled {events_count} new events from OneDrive")
-    
-    # We should close databases to release connections, 
-    # assuming this process is short-lived or forked per task.
-    await database.close_databases()
+    try:
+        events_count = run_async(run_connection_polling(connection_id))
+        logger.info(f"Polled {events_count} new events from OneDrive connection {connection_id}")
+        return events_count
+    except Exception as e:
+        logger.error(f"OneDrive polling failed for connection {connection_id}: {str(e)}")
+        raise
 
+async def get_connection_ids():
+    """
+    Async entry point listing the connections to poll.
+    """
+    # run_async has initialized the worker's databases; use the factory to get a session
+    async with database.postgres_session_factory() as db:
+        return await OneDrivePollingService.get_connection_ids(db)
 
+async def run_connection_polling(connection_id: str) -> int:
+    """
+    Async entry point polling one connection on its own session.
+    """
+    async with database.postgres_session_factory() as db:
+        service = OneDrivePollingService(db)
+        try:
+            return await service.poll_connection_by_id(connection_id)
+        finally:
+            await service.aclose()
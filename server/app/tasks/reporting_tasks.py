@@ -3,65 +3,66 @@ Celery Tasks for Scheduled Reporting
 Background tasks for automated report generation
 """
 
+import asyncio
 from datetime import datetime, timedelta
-from celery import Celery
-from celery.schedules import crontab
+from typing import Any, Dict, List
 
-from app.core.config import settings
-from app.core.database import get_db_session
-from app.services.reporting_service import ReportingService, DEFAULT_SCHEDULES
+import app.core.database as database
+from app.services.reporting_service import ReportingService, ReportSchedule, DEFAULT_SCHEDULES
 from app.core.observability import StructuredLogger
+from app.tasks.celery_app import celery_app
+from app.tasks.worker_loop import run_async
 
 logger = StructuredLogger(__name__)
 
-# Initialize Celery
-celery_app = Celery(
-    "dlp_reporting",
-    broker=settings.REDIS_URL,
-    backend=settings.REDIS_URL
-)
-
-# Celery configuration
-celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    timezone="UTC",
-    enable_utc=True,
-    task_track_started=True,
-    task_time_limit=1800,  # 30 minutes
-    task_soft_time_limit=1500,  # 25 minutes
-    worker_prefetch_multiplier=1,
-    worker_max_tasks_per_child=50
-)
-
-# Define beat schedule for automated reports
-celery_app.conf.beat_schedule = {
-    "daily-reports": {
-        "task": "app.tasks.reporting_tasks.generate_daily_reports",
-        "schedule": crontab(hour=8, minute=0),  # 8:00 AM UTC every day
-    },
-    "weekly-reports": {
-        "task": "app.tasks.reporting_tasks.generate_weekly_reports",
-        "schedule": crontab(hour=9, minute=0, day_of_week=1),  # Monday 9:00 AM UTC
-    },
-    "monthly-reports": {
-        "task": "app.tasks.reporting_tasks.generate_monthly_reports",
-        "schedule": crontab(hour=10, minute=0, day_of_month=1),  # 1st of month, 10:00 AM UTC
-    },
-    "google-drive-polling": {
-        "task": "app.tasks.google_drive_polling_tasks.poll_google_drive_activity",
-        "schedule": crontab(minute="*/5"),  # Run every 5 minutes
-    },
-    "onedrive-polling": {
-        "task": "app.tasks.onedrive_polling_tasks.poll_onedrive_activity",
-        "schedule": crontab(minute="*/5"),  # Run every 5 minutes
-    },
-    "event-cleanup": {
-        "task": "app.tasks.event_cleanup_tasks.cleanup_old_events",
-        "schedule": crontab(hour=2, minute=0),  # 2:00 AM UTC daily
-    },
-}
+# Schedules generated at once; each holds its own pooled connection while it runs
+REPORT_CONCURRENCY = 10
+
+# Enabled default schedules grouped by frequency; DEFAULT_SCHEDULES is fixed at import
+_SCHEDULES_BY_FREQUENCY: Dict[str, List[ReportSchedule]] = {}
+for _schedule in DEFAULT_SCHEDULES:
+    if _schedule.enabled:
+        _SCHEDULES_BY_FREQUENCY.setdefault(_schedule.frequency, []).append(_schedule)
+del _schedule
+
+
+async def run_scheduled_reports(
+    schedules: List[ReportSchedule],
+    start_date: datetime,
+    end_date: datetime,
+) -> List[Dict[str, Any]]:
+    """
+    Generate reports for a list of schedules concurrently.
+
+    An AsyncSession can't be shared between concurrent tasks, so every schedule
+    runs on its own session; REPORT_CONCURRENCY bounds how many pool connections
+    the batch holds at once. Results keep the order of ``schedules``.
+    """
+    semaphore = asyncio.Semaphore(REPORT_CONCURRENCY)
+
+    async def _run(schedule: ReportSchedule) -> Dict[str, Any]:
+        async with semaphore:
+            async with database.postgres_session_factory() as db_session:
+                reporting = ReportingService(db_session=db_session)
+                return await reporting.generate_scheduled_report(
+                    schedule=schedule,
+                    start_date=start_date,
+                    end_date=end_date
+                )
+
+    outcomes = await asyncio.gather(*(_run(schedule) for schedule in schedules), return_exceptions=True)
+
+    results = []
+    for schedule, outcome in zip(schedules, outcomes):
+        if isinstance(outcome, Exception):
+            logger.log_error(outcome, {"operation": "run_scheduled_reports", "report_name": schedule.name})
+            outcome = {"success": False, "error": str(outcome)}
+        results.append(outcome)
+
+        logger.logger.info(f"{schedule.frequency}_report_completed",
+                          report_name=schedule.name,
+                          success=outcome.get("success"))
+    return results
 
 
 @celery_app.task(name="app.tasks.reporting_tasks.generate_daily_reports")
@@ -80,32 +81,9 @@ def generate_daily_reports():
         start_date = end_date - timedelta(days=1)
 
         # Find daily schedules
-        daily_schedules = [s for s in DEFAULT_SCHEDULES if s.frequency == "daily" and s.enabled]
+        daily_schedules = _SCHEDULES_BY_FREQUENCY.get("daily", [])
 
-        results = []
-        for schedule in daily_schedules:
-            # Get database session
-            db_session = next(get_db_session())
-
-            try:
-                # Create reporting service
-                reporting = ReportingService(db_session=db_session)
-
-                # Generate report
-                result = reporting.generate_scheduled_report(
-                    schedule=schedule,
-                    start_date=start_date,
-                    end_date=end_date
-                )
-
-                results.append(result)
-
-                logger.logger.info("daily_report_completed",
-                                  report_name=schedule.name,
-                                  success=result.get("success"))
-
-            finally:
-                db_session.close()
+        results = run_async(run_scheduled_reports(daily_schedules, start_date, end_date))
 
         logger.logger.info("daily_reports_completed",
                           total_schedules=len(daily_schedules),
@@ -142,29 +120,9 @@ def generate_weekly_reports():
         end_date = start_date + timedelta(days=7)
 
         # Find weekly schedules
-        weekly_schedules = [s for s in DEFAULT_SCHEDULES if s.frequency == "weekly" and s.enabled]
+        weekly_schedules = _SCHEDULES_BY_FREQUENCY.get("weekly", [])
 
-        results = []
-        for schedule in weekly_schedules:
-            db_session = next(get_db_session())
-
-            try:
-                reporting = ReportingService(db_session=db_session)
-
-                result = reporting.generate_scheduled_report(
-                    schedule=schedule,
-                    start_date=start_date,
-                    end_date=end_date
-                )
-
-                results.append(result)
-
-                logger.logger.info("weekly_report_completed",
-                                  report_name=schedule.name,
-                                  success=result.get("success"))
-
-            finally:
-                db_session.close()
+        results = run_async(run_scheduled_reports(weekly_schedules, start_date, end_date))
 
         logger.logger.info("weekly_reports_completed",
                           total_schedules=len(weekly_schedules),
@@ -203,29 +161,9 @@ def generate_monthly_reports():
         start_date = end_date.replace(day=1)
 
         # Find monthly schedules
-        monthly_schedules = [s for s in DEFAULT_SCHEDULES if s.frequency == "monthly" and s.enabled]
-
-        results = []
-        for schedule in monthly_schedules:
-            db_session = next(get_db_session())
+        monthly_schedules = _SCHEDULES_BY_FREQUENCY.get("monthly", [])
 
-            try:
-                reporting = ReportingService(db_session=db_session)
-
-                result = reporting.generate_scheduled_report(
-                    schedule=schedule,
-                    start_date=start_date,
-                    end_date=end_date
-                )
-
-                results.append(result)
-
-                logger.logger.info("monthly_report_completed",
-                                  report_name=schedule.name,
-                                  success=result.get("success"))
-
-            finally:
-                db_session.close()
+        results = run_async(run_scheduled_reports(monthly_schedules, start_date, end_date))
 
         logger.logger.info("monthly_reports_completed",
                           total_schedules=len(monthly_schedules),
@@ -276,8 +214,6 @@ def generate_custom_report(
         end_date = datetime.fromisoformat(end_date_iso.replace('Z', '+00:00'))
 
         # Create schedule
-        from app.services.reporting_service import ReportSchedule
-
         schedule = ReportSchedule(
             name=report_name,
             frequency="custom",
@@ -287,26 +223,8 @@ def generate_custom_report(
             enabled=True
         )
 
-        # Get database session
-        db_session = next(get_db_session())
-
-        try:
-            reporting = ReportingService(db_session=db_session)
-
-            result = reporting.generate_scheduled_report(
-                schedule=schedule,
-                start_date=start_date,
-                end_date=end_date
-            )
-
-            logger.logger.info("custom_report_completed",
-                              report_name=report_name,
-                              success=result.get("success"))
-
-            return result
-
-        finally:
-            db_session.close()
+        # run_scheduled_reports logs custom_report_completed
+        return run_async(run_scheduled_reports([schedule], start_date, end_date))[0]
 
     except Exception as e:
         logger.log_error(e, {"task": "generate_custom_report"})
@@ -0,0 +1,99 @@
+"""
+Worker Event Loop
+One long-lived asyncio loop and database pool per Celery worker process
+"""
+
+import asyncio
+from typing import Any, Coroutine, Optional, TypeVar
+
+from celery.signals import worker_process_init, worker_process_shutdown
+from celery.utils.log import get_task_logger
+
+import app.core.database as database
+
+logger = get_task_logger(__name__)
+
+T = TypeVar("T")
+
+# Loop shared by every task run in this worker process. The Postgres pool and the Motor
+# client bind to the loop they were created on, so they live exactly as long as it does.
+_WORKER_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_worker_loop() -> asyncio.AbstractEventLoop:
+    global _WORKER_LOOP
+    if _WORKER_LOOP is None or _WORKER_LOOP.is_closed():
+        _WORKER_LOOP = asyncio.new_event_loop()
+        asyncio.set_event_loop(_WORKER_LOOP)
+    return _WORKER_LOOP
+
+
+async def _ensure_databases() -> None:
+    if database.postgres_session_factory is None or database.mongodb_database is None:
+        await database.init_databases()
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine to completion on the worker's persistent event loop.
+
+    Databases are initialized on first use, so this also works in processes where
+    worker_process_init never fires (solo pool, eager mode). If the call is interrupted
+    (e.g. Celery's soft time limit fires while the loop waits on I/O), the task is
+    cancelled and unwound before the exception propagates, so it can't resume inside
+    the next task's run_async.
+
+    Args:
+        coro: Task body to run
+
+    Returns:
+        The coroutine's result
+    """
+    loop = _get_worker_loop()
+
+    async def _run() -> T:
+        try:
+            await _ensure_databases()
+        except BaseException:
+            coro.close()
+            raise
+        return await coro
+
+    task = loop.create_task(_run())
+    try:
+        return loop.run_until_complete(task)
+    except BaseException:
+        if not task.done():
+            task.cancel()
+            loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+        # No-op once the body ran; avoids a never-awaited warning if it was cancelled before starting
+        coro.close()
+        raise
+
+
+@worker_process_init.connect
+def init_worker_loop(**_kwargs: Any) -> None:
+    """
+    Create the worker loop and warm the database pools when a worker process starts.
+    """
+    try:
+        _get_worker_loop().run_until_complete(_ensure_databases())
+    except Exception as e:
+        # Tasks retry the initialization through run_async
+        logger.error(f"Worker database initialization failed: {str(e)}")
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_loop(**_kwargs: Any) -> None:
+    """
+    Release the database pools and close the worker loop when a worker process exits.
+    """
+    global _WORKER_LOOP
+    loop = _WORKER_LOOP
+    if loop is None or loop.is_closed():
+        return
+    try:
+        loop.run_until_complete(database.close_databases())
+    finally:
+        loop.close()
+        _WORKER_LOOP = None
@@ -3,7 +3,47 @@ Policy Transformer
 Transforms frontend policy config format to backend conditions/actions format
 """
 
-from typing import Dict, Any, List, Optional, Tuple
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import orjson
+
+# Regexes for the clipboard policy's predefined pattern ids
+_PREDEFINED_PATTERNS: Mapping[str, str] = MappingProxyType({
+    "ssn": r"\b\d{3}-\d{2}-\d{4}\b",
+    "credit_card": r"\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b",
+    "email": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
+    "phone": r"\b\d{3}[-.]?\d{3}[-.]?\d{4}\b",
+    "api_key": r"\b[A-Za-z0-9_-]{32,}\b",
+    "private_key": r"-----BEGIN (RSA|DSA|EC|OPENSSH) PRIVATE KEY-----",
+    "password": r"(?i)(password|pwd|passwd)\s*[:=]\s*\S+",
+})
+
+
+@lru_cache(maxsize=1024)
+def compile_rule_regex(pattern: str) -> re.Pattern:
+    """
+    Compile a matches_regex rule value the way policy evaluation applies it (case-insensitive)
+
+    Shared and bounded, so each distinct pattern is compiled once per process.
+    """
+    return re.compile(pattern, re.IGNORECASE)
+
+
+# Predefined patterns are used by most clipboard policies; compile them up front
+for _pattern in _PREDEFINED_PATTERNS.values():
+    compile_rule_regex(_pattern)
+del _pattern
+
+# Frontend file event names -> agent event_subtype values
+_EVENT_NAME_MAP: Mapping[str, str] = MappingProxyType({
+    "create": "file_created",
+    "modify": "file_modified",
+    "delete": "file_deleted",
+    "move": "file_moved",
+})
 
 
 def transform_frontend_config_to_backend(
@@ -19,28 +59,57 @@ def transform_frontend_config_to_backend(
     Returns:
         Tuple of (conditions_dict, actions_dict)
     """
-    if policy_type == "clipboard_monitoring":
-        return _transform_clipboard_config(config)
-    elif policy_type == "file_system_monitoring":
-        return _transform_file_system_config(config)
-    elif policy_type == "file_transfer_monitoring":
-        return _transform_file_transfer_config(config)
-    elif policy_type == "usb_device_monitoring":
-        return _transform_usb_device_config(config)
-    elif policy_type == "usb_file_transfer_monitoring":
-        return _transform_usb_transfer_config(config)
-    elif policy_type == "google_drive_local_monitoring":
-        return _transform_google_drive_local_config(config)
-    elif policy_type == "google_drive_cloud_monitoring":
-        return _transform_google_drive_cloud_config(config)
-    elif policy_type == "onedrive_cloud_monitoring":
-        return _transform_onedrive_cloud_config(config)
-    else:
-        # Unknown type, return empty defaults
-        return (
-            {"match": "all", "rules": []},
-            {"log": {}},
-        )
+    try:
+        config_json = orjson.dumps(config)
+    except TypeError:
+        # Not plain JSON (e.g. non-string keys); transform without the cache
+        return _transform(policy_type, config)
+    conditions, actions = orjson.loads(_transform_json(policy_type, config_json))
+    return conditions, actions
+
+
+@lru_cache(maxsize=256)
+def _transform_json(policy_type: str, config_json: bytes) -> bytes:
+    """
+    Memoized transform keyed on the serialized config
+
+    UI re-saves and re-syncs submit identical configs; results are cached as JSON so every
+    caller decodes its own copy and can modify it freely.
+    """
+    return orjson.dumps(_transform(policy_type, orjson.loads(config_json)))
+
+
+def _transform(policy_type: str, config: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    handler = _TRANSFORMS_BY_TYPE.get(policy_type, _transform_unknown_config)
+    return handler(config)
+
+
+def _transform_unknown_config(config: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Unknown type, return empty defaults
+    """
+    return (
+        {"match": "all", "rules": []},
+        {"log": {}},
+    )
+
+
+def _enabled_event_rule(events: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Build the event_subtype rule for the enabled file events, or None if none are enabled
+    """
+    enabled_events = [
+        _EVENT_NAME_MAP.get(event, event)
+        for event, enabled in events.items()
+        if enabled
+    ]
+    if not enabled_events:
+        return None
+    return {
+        "field": "event_subtype",
+        "operator": "in",
+        "value": enabled_events,
+    }
 
 
 def _transform_clipboard_config(config: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
@@ -54,27 +123,16 @@ def _transform_clipboard_config(config: Dict[str, Any]) -> Tuple[Dict[str, Any],
     custom = patterns.get("custom", [])
     action = config.get("action", "log")
 
-    # Predefined pattern regexes
-    predefined_patterns = {
-        "ssn": r"\b\d{3}-\d{2}-\d{4}\b",
-        "credit_card": r"\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b",
-        "email": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
-        "phone": r"\b\d{3}[-.]?\d{3}[-.]?\d{4}\b",
-        "api_key": r"\b[A-Za-z0-9_-]{32,}\b",
-        "private_key": r"-----BEGIN (RSA|DSA|EC|OPENSSH) PRIVATE KEY-----",
-        "password": r"(?i)(password|pwd|passwd)\s*[:=]\s*\S+",
-    }
-
     rules = []
 
     # Add predefined patterns
     for pattern_id in predefined:
-        if pattern_id in predefined_patterns:
+        if pattern_id in _PREDEFINED_PATTERNS:
             rules.append(
                 {
                     "field": "clipboard_content",
                     "operator": "matches_regex",
-                    "value": predefined_patterns[pattern_id],
+                    "value": _PREDEFINED_PATTERNS[pattern_id],
                 }
             )
 
@@ -315,25 +373,9 @@ def _transform_file_system_config(config: Dict[str, Any]) -> Tuple[Dict[str, Any
             )
 
     # Add event type rules (copy is not supported for local filesystem monitoring yet)
-    event_name_map = {
-        "create": "file_created",
-        "modify": "file_modified",
-        "delete": "file_deleted",
-        "move": "file_moved",
-    }
-    enabled_events = [
-        event_name_map.get(event, event)
-        for event, enabled in events.items()
-        if enabled
-    ]
-    if enabled_events:
-        rules.append(
-            {
-                "field": "event_subtype",
-                "operator": "in",
-                "value": enabled_events,
-            }
-        )
+    event_rule = _enabled_event_rule(events)
+    if event_rule:
+        rules.append(event_rule)
 
     # Add file extension rules (if specified)
     if file_extensions:
@@ -450,25 +492,9 @@ def _transform_google_drive_local_config(config: Dict[str, Any]) -> Tuple[Dict[s
     )
 
     # Add event type rules (copy is not supported for local Google Drive monitoring yet)
-    event_name_map = {
-        "create": "file_created",
-        "modify": "file_modified",
-        "delete": "file_deleted",
-        "move": "file_moved",
-    }
-    enabled_events = [
-        event_name_map.get(event, event)
-        for event, enabled in events.items()
-        if enabled
-    ]
-    if enabled_events:
-        rules.append(
-            {
-                "field": "event_subtype",
-                "operator": "in",
-                "value": enabled_events,
-            }
-        )
+    event_rule = _enabled_event_rule(events)
+    if event_rule:
+        rules.append(event_rule)
 
     # Add file extension rules (if specified)
     if file_extensions:
@@ -685,25 +711,9 @@ def _transform_file_transfer_config(config: Dict[str, Any]) -> Tuple[Dict[str, A
         rules.append(dest_rule)
 
     # Event mapping (we care about creates/modifies/moves at the destination)
-    event_name_map = {
-        "create": "file_created",
-        "modify": "file_modified",
-        "delete": "file_deleted",
-        "move": "file_moved",
-    }
-    enabled_events = [
-        event_name_map.get(event, event)
-        for event, enabled in events.items()
-        if enabled
-    ]
-    if enabled_events:
-        rules.append(
-            {
-                "field": "event_subtype",
-                "operator": "in",
-                "value": enabled_events,
-            }
-        )
+    event_rule = _enabled_event_rule(events)
+    if event_rule:
+        rules.append(event_rule)
 
     if file_extensions:
         rules.append(
@@ -822,25 +832,9 @@ def _transform_google_drive_local_config(config: Dict[str, Any]) -> Tuple[Dict[s
     )
 
     # Add event type rules (copy is not supported for this legacy helper)
-    event_name_map = {
-        "create": "file_created",
-        "modify": "file_modified",
-        "delete": "file_deleted",
-        "move": "file_moved",
-    }
-    enabled_events = [
-        event_name_map.get(event, event)
-        for event, enabled in events.items()
-        if enabled
-    ]
-    if enabled_events:
-        rules.append(
-            {
-                "field": "event_subtype",
-                "operator": "in",
-                "value": enabled_events,
-            }
-        )
+    event_rule = _enabled_event_rule(events)
+    if event_rule:
+        rules.append(event_rule)
 
     # Add file extension rules (if specified)
     if file_extensions:
@@ -866,3 +860,16 @@ def _transform_google_drive_local_config(config: Dict[str, Any]) -> Tuple[Dict[s
         actions[action] = {}
 
     return conditions, actions
+
+
+# Policy type -> transform; defined after the transforms so each name resolves to its final definition
+_TRANSFORMS_BY_TYPE: Dict[str, Callable[[Dict[str, Any]], Tuple[Dict[str, Any], Dict[str, Any]]]] = {
+    "clipboard_monitoring": _transform_clipboard_config,
+    "file_system_monitoring": _transform_file_system_config,
+    "file_transfer_monitoring": _transform_file_transfer_config,
+    "usb_device_monitoring": _transform_usb_device_config,
+    "usb_file_transfer_monitoring": _transform_usb_transfer_config,
+    "google_drive_local_monitoring": _transform_google_drive_local_config,
+    "google_drive_cloud_monitoring": _transform_google_drive_cloud_config,
+    "onedrive_cloud_monitoring": _transform_onedrive_cloud_config,
+}
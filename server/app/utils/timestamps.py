@@ -0,0 +1,65 @@
+"""
+Timestamp helpers
+Parse and format the UTC timestamps exchanged with the cloud polling APIs
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+# Bound once at module scope so hot helpers use a single global load
+_UTC = timezone.utc
+
+
+@lru_cache(maxsize=4096)
+def parse_iso(value: str) -> datetime:
+    """
+    Parse an ISO-8601 / RFC 3339 timestamp, raising ValueError if it is malformed.
+
+    Python 3.11's fromisoformat accepts the trailing "Z" and 7-9 digit fractions
+    natively, so no string rewriting is needed; "Z" yields the timezone.utc singleton.
+    Items synced together often share timestamps, and datetimes are immutable, so
+    results are memoized.
+    """
+    return datetime.fromisoformat(value)
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp_utc(value: str) -> Optional[datetime]:
+    """
+    Parse a timestamp into an aware UTC datetime, or None if it is malformed.
+    """
+    try:
+        dt = parse_iso(value)
+    except ValueError:
+        return None
+    return as_aware_utc(dt)
+
+
+@lru_cache(maxsize=4096)
+def format_timestamp_utc(dt: datetime) -> str:
+    """
+    Format a datetime as Z-suffixed UTC seconds; naive datetimes are taken to be UTC.
+    """
+    if dt.tzinfo is not _UTC:
+        dt = dt.replace(tzinfo=_UTC) if dt.tzinfo is None else dt.astimezone(_UTC)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def as_aware_utc(dt: datetime) -> datetime:
+    # API timestamps parse to the timezone.utc singleton, so the identity check is the common case
+    tzinfo = dt.tzinfo
+    if tzinfo is _UTC:
+        return dt
+    if tzinfo is None:
+        return dt.replace(tzinfo=_UTC)
+    return dt.astimezone(_UTC)
+
+
+def as_naive_utc(dt: datetime) -> datetime:
+    tzinfo = dt.tzinfo
+    if tzinfo is None:
+        return dt
+    if tzinfo is not _UTC:
+        dt = dt.astimezone(_UTC)
+    return dt.replace(tzinfo=None)
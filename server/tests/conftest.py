@@ -13,6 +13,7 @@ from sqlalchemy.types import CHAR
 
 from app.core.database import Base
 from app.core.config import settings
+from app.services.policy_service import PolicyService
 
 
 @compiles(postgresql.UUID, "sqlite")
@@ -68,6 +69,8 @@ async def db_session(db_engine) -> AsyncGenerator[AsyncSession, None]:
         expire_on_commit=False,
     )
 
+    # Process-wide caches must not carry rows over from another test's database
+    PolicyService.invalidate_policy_cache()
     async with async_session() as session:
         yield session
 
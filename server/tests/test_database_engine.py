@@ -0,0 +1,81 @@
+"""
+Tests for the PostgreSQL engine configuration.
+"""
+
+import pytest
+
+from app.core import database
+from app.core.config import settings
+
+
+class EngineCreated(Exception):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_engine_uses_configured_pool_and_statement_caches(monkeypatch):
+    """Pool sizing and both statement caches come from settings."""
+    captured = {}
+
+    def fake_create_async_engine(url, **kwargs):
+        captured.update(kwargs)
+        raise EngineCreated()
+
+    monkeypatch.setattr(database, "create_async_engine", fake_create_async_engine)
+    monkeypatch.setattr(database, "postgres_session_factory", None)
+    monkeypatch.setattr(settings, "POSTGRES_STATEMENT_CACHE_SIZE", 64)
+
+    with pytest.raises(EngineCreated):
+        await database.init_databases()
+
+    assert captured["pool_size"] == settings.POSTGRES_POOL_SIZE
+    assert captured["max_overflow"] == settings.POSTGRES_MAX_OVERFLOW
+    assert captured["query_cache_size"] == settings.POSTGRES_QUERY_CACHE_SIZE
+    assert captured["connect_args"] == {"prepared_statement_cache_size": 64}
+
+
+@pytest.mark.asyncio
+async def test_init_databases_keeps_existing_connections(monkeypatch):
+    """Calling init again with both backends connected builds nothing new."""
+
+    def fail_create_async_engine(url, **kwargs):  # pragma: no cover - must not be reached
+        raise AssertionError("engine should not be rebuilt")
+
+    factory = object()
+    mongo = object()
+    monkeypatch.setattr(database, "create_async_engine", fail_create_async_engine)
+    monkeypatch.setattr(database, "postgres_session_factory", factory)
+    monkeypatch.setattr(database, "mongodb_database", mongo)
+
+    await database.init_databases()
+
+    assert database.postgres_session_factory is factory
+    assert database.mongodb_database is mongo
+
+
+@pytest.mark.asyncio
+async def test_close_databases_resets_handles(monkeypatch):
+    """After closing, the handles are cleared so the next init reconnects."""
+    disposed = []
+    closed = []
+
+    class FakeEngine:
+        async def dispose(self):
+            disposed.append(True)
+
+    class FakeClient:
+        def close(self):
+            closed.append(True)
+
+    monkeypatch.setattr(database, "postgres_engine", FakeEngine())
+    monkeypatch.setattr(database, "postgres_session_factory", object())
+    monkeypatch.setattr(database, "mongodb_client", FakeClient())
+    monkeypatch.setattr(database, "mongodb_database", object())
+
+    await database.close_databases()
+
+    assert disposed == [True] and closed == [True]
+    assert database.postgres_engine is None
+    assert database.postgres_session_factory is None
+    assert database.mongodb_client is None
+    assert database.mongodb_database is None
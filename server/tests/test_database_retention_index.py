@@ -0,0 +1,73 @@
+"""
+Tests for the dlp_events retention TTL index.
+"""
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from app.core import database
+from app.core.config import settings
+
+
+class FakeCollection:
+    def __init__(self, error=None):
+        self.error = error
+        self.created = []
+
+    async def create_index(self, keys, **kwargs):
+        self.created.append((keys, kwargs))
+        if self.error:
+            raise self.error
+
+
+class FakeMongo:
+    def __init__(self, collection):
+        self.collection = collection
+        self.commands = []
+
+    def __getitem__(self, name):
+        assert name == "dlp_events"
+        return self.collection
+
+    async def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+
+@pytest.mark.asyncio
+async def test_retention_index_created_with_configured_expiry(monkeypatch):
+    """A TTL index on timestamp expires events after EVENT_RETENTION_DAYS."""
+    monkeypatch.setattr(settings, "EVENT_RETENTION_DAYS", 2)
+    mongo = FakeMongo(FakeCollection())
+
+    await database.ensure_event_retention_index(mongo)
+
+    keys, options = mongo.collection.created[0]
+    assert keys == "timestamp"
+    assert options["expireAfterSeconds"] == 2 * 86400
+    assert options["name"] == database.EVENT_RETENTION_INDEX
+    assert mongo.commands == []
+
+
+@pytest.mark.asyncio
+async def test_retention_index_retuned_when_expiry_changes(monkeypatch):
+    """An existing timestamp index with another expiry is updated in place with collMod."""
+    monkeypatch.setattr(settings, "EVENT_RETENTION_DAYS", 3)
+    mongo = FakeMongo(FakeCollection(OperationFailure("options conflict", code=85)))
+
+    await database.ensure_event_retention_index(mongo)
+
+    assert mongo.commands == [
+        (
+            ("collMod", "dlp_events"),
+            {"index": {"keyPattern": {"timestamp": 1}, "expireAfterSeconds": 3 * 86400}},
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_retention_index_other_failures_propagate():
+    """Errors other than an index conflict are not swallowed."""
+    mongo = FakeMongo(FakeCollection(OperationFailure("not authorized", code=13)))
+
+    with pytest.raises(OperationFailure):
+        await database.ensure_event_retention_index(mongo)
@@ -0,0 +1,42 @@
+"""
+Tests for the event retention cleanup task.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.tasks import event_cleanup_tasks
+
+
+class FakeEventsCollection:
+    def __init__(self):
+        self.calls = []
+
+    async def delete_many(self, query):
+        self.calls.append(("delete_many", query))
+        return SimpleNamespace(deleted_count=3)
+
+    async def estimated_document_count(self):
+        self.calls.append(("estimated_document_count", None))
+        return 7
+
+    async def count_documents(self, query):  # pragma: no cover - must not be reached
+        raise AssertionError("cleanup must not scan the collection to count")
+
+
+@pytest.mark.asyncio
+async def test_run_cleanup_deletes_once_without_count_scans(monkeypatch):
+    """Old events are removed by one delete_many and totals come from collection metadata."""
+    collection = FakeEventsCollection()
+    monkeypatch.setattr(event_cleanup_tasks, "get_mongodb", lambda: {"dlp_events": collection})
+    monkeypatch.setattr(settings, "EVENT_RETENTION_DAYS", 30)
+
+    result = await event_cleanup_tasks.run_cleanup()
+
+    assert [name for name, _ in collection.calls] == ["delete_many", "estimated_document_count"]
+    assert set(collection.calls[0][1]["timestamp"]) == {"$lt"}
+    assert result["deleted_count"] == 3
+    assert result["total_events_before"] == 10
+    assert result["total_events_after"] == 7
@@ -6,7 +6,7 @@ import uuid
 from datetime import datetime
 
 from app.models.google_drive import GoogleDriveConnection, GoogleDriveProtectedFolder
-from app.services.google_drive_event_normalizer import normalize_drive_activity
+from app.services.google_drive_event_normalizer import folder_event_fields, normalize_drive_activity
 
 
 def build_connection():
@@ -85,3 +85,21 @@ def test_normalize_drive_activity_basic():
 
 
 
+
+
+def test_normalize_drive_activity_with_precomputed_folder_fields():
+    connection = build_connection()
+    folder = build_folder(connection)
+    activity = {
+        "timestamp": "2025-02-02T10:00:00Z",
+        "primaryActionDetail": {"edit": {}},
+        "actors": [{"user": {"emailAddress": "user@example.com"}}],
+        "targets": [{"driveItem": {"title": "payroll.xlsx", "name": "files/1"}}],
+    }
+
+    expected = normalize_drive_activity(activity, connection, folder)
+    result = normalize_drive_activity(activity, connection, folder, folder_event_fields(connection, folder))
+
+    assert result == expected
+    assert result["protected_folder_id"] == str(folder.id)
+    assert result["file_path"] == "My Drive/Finance"
@@ -2,10 +2,13 @@
 Tests for Google Drive polling service.
 """
 
+import asyncio
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 
 import pytest
+from pymongo.errors import BulkWriteError
 
 from app.core.config import settings
 from app.models.google_drive import GoogleDriveConnection, GoogleDriveProtectedFolder
@@ -17,6 +20,9 @@ from app.services.google_drive_polling import GoogleDrivePollingService
 class FakeCollection:
     def __init__(self) -> None:
         self.docs = []
+        self.insert_many_calls = 0
+        self.find_calls = 0
+        self.indexes = []
 
     async def find_one(self, query):
         for doc in self.docs:
@@ -24,11 +30,33 @@ class FakeCollection:
                 return doc
         return None
 
+    def find(self, query, projection=None):
+        wanted = set(query["id"]["$in"])
+        self.find_calls += 1
+
+        async def _cursor():
+            for doc in self.docs:
+                if doc["id"] in wanted:
+                    yield {"id": doc["id"]}
+
+        return _cursor()
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs.get("unique", False)))
+
     async def insert_one(self, doc):
         self.docs.append(doc)
 
+    async def insert_many(self, docs, ordered=True):
+        self.insert_many_calls += 1
+        self.docs.extend(docs)
+        return SimpleNamespace(inserted_ids=[doc["id"] for doc in docs])
+
 
 class FakeProcessor:
+    def __init__(self) -> None:
+        self.batches = 0
+
     async def process_event(self, event):
         processed = dict(event)
         processed["matched_policies"] = [
@@ -43,6 +71,10 @@ class FakeProcessor:
         processed["policy_action_summaries"] = []
         return processed
 
+    async def process_batch(self, events):
+        self.batches += 1
+        return [await self.process_event(event) for event in events]
+
 
 @pytest.mark.asyncio
 async def test_poll_connection_inserts_events(monkeypatch, db_session):
@@ -136,3 +168,316 @@ async def test_poll_connection_inserts_events(monkeypatch, db_session):
 
     assert connection.last_activity_cursor == event_timestamp_iso
     assert folder.last_seen_timestamp == event_timestamp.replace(tzinfo=None)
+
+
+async def _seed_connection(db_session, folder_count=1):
+    user = User(
+        email="batch@example.com",
+        hashed_password="hashed",
+        full_name="Batch User",
+        role=UserRole.ADMIN,
+        organization="CyberSentinel",
+    )
+    db_session.add(user)
+    await db_session.flush()
+
+    connection = GoogleDriveConnection(
+        user_id=user.id,
+        google_user_id="google-user-batch",
+        google_user_email="batch@example.com",
+    )
+    connection.set_refresh_token("refresh-token")
+    connection.set_access_token("access-token")
+    connection.token_expiry = datetime.utcnow() + timedelta(hours=1)
+    db_session.add(connection)
+    await db_session.flush()
+
+    baseline = datetime.utcnow() - timedelta(hours=1)
+    folders = []
+    for index in range(folder_count):
+        folder = GoogleDriveProtectedFolder(
+            connection_id=connection.id,
+            folder_id=f"folder-{index}",
+            folder_name=f"Folder {index}",
+            folder_path=f"My Drive/Folder {index}",
+            last_seen_timestamp=baseline,
+        )
+        db_session.add(folder)
+        folders.append(folder)
+    await db_session.commit()
+    await db_session.refresh(connection)
+    return connection, folders
+
+
+def _activity_event(connection, folder, event_id, timestamp):
+    return {
+        "event_id": event_id,
+        "source": "google_drive_cloud",
+        "event_type": "file",
+        "event_subtype": "file_created",
+        "severity": "medium",
+        "action": "logged",
+        "timestamp": timestamp.isoformat().replace("+00:00", "Z"),
+        "user_email": "actor@example.com",
+        "file_name": f"{event_id}.xlsx",
+        "file_id": f"files/{event_id}",
+        "connection_id": str(connection.id),
+        "folder_id": folder.folder_id,
+        "protected_folder_id": str(folder.id),
+        "folder_name": folder.folder_name,
+        "folder_path": folder.folder_path,
+        "details": {"id": event_id},
+    }
+
+
+@pytest.mark.asyncio
+async def test_poll_connection_inserts_all_folders_in_one_batch(monkeypatch, db_session):
+    """Matched events from every folder are written with a single insert_many, without repeats."""
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", "client")
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(settings, "GOOGLE_REDIRECT_URI", "https://example.com/callback")
+    connection, folders = await _seed_connection(db_session, folder_count=2)
+    collection = FakeCollection()
+    processor = FakeProcessor()
+    service = GoogleDrivePollingService(db_session, events_collection=collection, event_processor=processor)
+    event_timestamp = datetime.now(timezone.utc).replace(microsecond=0)
+
+    async def fake_fetch(self, _service, conn, folder, http=None):
+        events = [_activity_event(conn, folder, f"{folder.folder_id}-act", event_timestamp)]
+        # Both folders report the same shared activity
+        events.append(_activity_event(conn, folder, "shared-act", event_timestamp))
+        return events, event_timestamp
+
+    monkeypatch.setattr(GoogleDrivePollingService, "_fetch_folder_events", fake_fetch)
+
+    processed = await service.poll_connection(connection)
+
+    assert processed == 4
+    assert collection.insert_many_calls == 1
+    assert processor.batches == 1
+    assert sorted(doc["id"] for doc in collection.docs) == ["folder-0-act", "folder-1-act", "shared-act"]
+
+
+@pytest.mark.asyncio
+async def test_poll_connection_builds_activity_service_once(monkeypatch, db_session):
+    """Every folder of a connection is queried through the same Drive Activity client."""
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", "client")
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(settings, "GOOGLE_REDIRECT_URI", "https://example.com/callback")
+    connection, _folders = await _seed_connection(db_session, folder_count=3)
+    service = GoogleDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    built = []
+    used = []
+
+    def fake_build(self, credentials):
+        built.append(credentials)
+        return object()
+
+    async def fake_fetch(self, activity_service, conn, folder, http=None):
+        used.append(activity_service)
+        return [], None
+
+    monkeypatch.setattr(GoogleDrivePollingService, "_build_drive_activity_service", fake_build)
+    monkeypatch.setattr(GoogleDrivePollingService, "_fetch_folder_events", fake_fetch)
+
+    await service.poll_connection(connection)
+
+    assert len(built) == 1
+    assert len(used) == 3
+    assert len({id(activity_service) for activity_service in used}) == 1
+
+
+@pytest.mark.asyncio
+async def test_poll_connection_fetches_folders_concurrently(monkeypatch, db_session):
+    """Folder queries overlap up to FOLDER_POLL_CONCURRENCY, each on its own transport."""
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", "client")
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(settings, "GOOGLE_REDIRECT_URI", "https://example.com/callback")
+    monkeypatch.setattr(GoogleDrivePollingService, "FOLDER_POLL_CONCURRENCY", 2)
+    connection, folders = await _seed_connection(db_session, folder_count=4)
+    collection = FakeCollection()
+    service = GoogleDrivePollingService(db_session, events_collection=collection, event_processor=FakeProcessor())
+    event_timestamp = datetime.now(timezone.utc).replace(microsecond=0)
+    in_flight = []
+    peak = 0
+
+    async def fake_fetch(self, _service, conn, folder, http=None):
+        nonlocal peak
+        assert http is not None and http not in in_flight
+        in_flight.append(http)
+        peak = max(peak, len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(http)
+        return [_activity_event(conn, folder, f"{folder.folder_id}-act", event_timestamp)], event_timestamp
+
+    monkeypatch.setattr(GoogleDrivePollingService, "_fetch_folder_events", fake_fetch)
+
+    processed = await service.poll_connection(connection)
+
+    assert processed == 4
+    assert peak == 2
+    assert len(collection.docs) == 4
+    for folder in folders:
+        await db_session.refresh(folder)
+        assert folder.last_seen_timestamp == event_timestamp.replace(tzinfo=None)
+
+
+@pytest.mark.asyncio
+async def test_poll_connection_checks_duplicates_with_one_query(monkeypatch, db_session):
+    """Already-stored activities are found with a single $in lookup and not processed again."""
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", "client")
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(settings, "GOOGLE_REDIRECT_URI", "https://example.com/callback")
+    connection, folders = await _seed_connection(db_session, folder_count=2)
+    collection = FakeCollection()
+    collection.docs.append({"id": "folder-0-act"})
+    service = GoogleDrivePollingService(db_session, events_collection=collection, event_processor=FakeProcessor())
+    event_timestamp = datetime.now(timezone.utc).replace(microsecond=0)
+
+    async def fake_fetch(self, _service, conn, folder, http=None):
+        return [_activity_event(conn, folder, f"{folder.folder_id}-act", event_timestamp)], event_timestamp
+
+    monkeypatch.setattr(GoogleDrivePollingService, "_fetch_folder_events", fake_fetch)
+
+    await service.poll_connection(connection)
+
+    assert collection.find_calls == 1
+    assert [doc["id"] for doc in collection.docs] == ["folder-0-act", "folder-1-act"]
+
+
+@pytest.mark.asyncio
+async def test_filter_duplicates_chunks_large_lookups(monkeypatch, db_session):
+    """Id lists above DUPLICATE_LOOKUP_BATCH_SIZE are split into several $in queries."""
+    monkeypatch.setattr(GoogleDrivePollingService, "DUPLICATE_LOOKUP_BATCH_SIZE", 2)
+    collection = FakeCollection()
+    collection.docs.extend([{"id": "evt-0"}, {"id": "evt-3"}])
+    service = GoogleDrivePollingService(db_session, events_collection=collection, event_processor=FakeProcessor())
+
+    existing = await service._filter_duplicates([f"evt-{index}" for index in range(5)])
+
+    assert existing == {"evt-0", "evt-3"}
+    assert collection.find_calls == 3
+
+
+@pytest.mark.asyncio
+async def test_flush_events_tolerates_duplicate_key_errors(monkeypatch, db_session):
+    """E11000 write errors from a concurrent writer are counted as stored, not raised."""
+    monkeypatch.setattr(GoogleDrivePollingService, "_indexes_ensured", False)
+
+    class ConflictingCollection(FakeCollection):
+        async def insert_many(self, docs, ordered=True):
+            raise BulkWriteError(
+                {"nInserted": len(docs) - 1, "writeErrors": [{"index": 0, "code": 11000, "errmsg": "dup"}]}
+            )
+
+    collection = ConflictingCollection()
+    service = GoogleDrivePollingService(db_session, events_collection=collection, event_processor=FakeProcessor())
+
+    inserted = await service._flush_events([{"id": "a"}, {"id": "b"}, {"id": "c"}])
+
+    assert inserted == 2
+    assert collection.indexes == [("id", True)]
+
+
+@pytest.mark.asyncio
+async def test_parse_timestamp_is_memoized(db_session):
+    """Repeated Drive Activity timestamps are parsed once, including nanosecond fractions."""
+    service = GoogleDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+
+    first = service._parse_timestamp("2025-02-02T10:00:00.123456789Z")
+
+    assert first == datetime(2025, 2, 2, 10, 0, 0, 123456, tzinfo=timezone.utc)
+    assert service._parse_timestamp("2025-02-02T10:00:00.123456789Z") is first
+    assert service._parse_timestamp("not-a-date") is None
+
+
+def test_format_timestamp_is_second_precision_z_suffixed(db_session):
+    """Cursor timestamps are formatted as Z-suffixed UTC seconds whatever the input's timezone."""
+    service = GoogleDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+
+    assert service._format_timestamp(datetime(2025, 2, 2, 10, 0, 0, 500000)) == "2025-02-02T10:00:00Z"
+    assert (
+        service._format_timestamp(datetime(2025, 2, 2, 12, 0, tzinfo=timezone(timedelta(hours=2))))
+        == "2025-02-02T10:00:00Z"
+    )
+
+
+@pytest.mark.asyncio
+async def test_poll_all_connections_eager_loads_folders(monkeypatch, db_session):
+    """Folders come from the eager-loading query and unchanged folder cursors aren't rewritten."""
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", "client")
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(settings, "GOOGLE_REDIRECT_URI", "https://example.com/callback")
+    _connection, folders = await _seed_connection(db_session)
+    baseline = folders[0].last_seen_timestamp
+    stale = datetime(2024, 12, 31)
+    folders[0].updated_at = stale
+    await db_session.commit()
+    db_session.expunge_all()
+
+    async def fail_refresh(*args, **kwargs):  # pragma: no cover - must not be reached
+        raise AssertionError("folders should already be loaded")
+
+    async def fake_fetch(self, _service, conn, folder, http=None):
+        # Nothing new: the newest activity seen is the stored baseline itself
+        return [], baseline.replace(tzinfo=timezone.utc)
+
+    monkeypatch.setattr(db_session, "refresh", fail_refresh)
+    monkeypatch.setattr(GoogleDrivePollingService, "_fetch_folder_events", fake_fetch)
+    service = GoogleDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+
+    assert await service.poll_all_connections() == 0
+
+    folder = await db_session.get(GoogleDriveProtectedFolder, folders[0].id)
+    assert folder.updated_at == stale
+
+
+@pytest.mark.asyncio
+async def test_build_event_document_without_processor_event_uses_event_fields(db_session):
+    """A processor result with no "event" section falls back to the normalized event's fields."""
+    service = GoogleDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    event = {
+        "event_id": "evt-1",
+        "event_type": "file",
+        "severity": "medium",
+        "source": "google_drive",
+        "connection_id": "conn",
+        "folder_id": "folder",
+        "timestamp": "2025-01-01T00:00:00Z",
+        "action": "logged",
+    }
+
+    payload = service._build_processor_payload(event, "gdrive-conn")
+    payload["agent"]["name"] = "mutated"
+    payload["tags"].append("mutated")
+    doc = service._build_event_document(event, {"event": None, "metadata": None}, "gdrive-conn")
+
+    assert service._build_processor_payload(event, "gdrive-conn")["agent"]["name"] == "Google Drive Cloud"
+    assert service._build_processor_payload(event, "gdrive-conn")["tags"] == ["google_drive", "cloud"]
+    assert doc["agent_id"] == "gdrive-conn"
+    assert doc["severity"] == "medium"
+    assert doc["action_taken"] == "logged"
+    assert doc["metadata"] == {"activity_timestamp": datetime(2025, 1, 1)}
+
+
+@pytest.mark.asyncio
+async def test_poll_connection_by_id_loads_and_polls_one_connection(monkeypatch, db_session):
+    """Per-connection tasks list ids, then poll each id on its own; deleted ids are skipped."""
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", "client")
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(settings, "GOOGLE_REDIRECT_URI", "https://example.com/callback")
+    connection, _folders = await _seed_connection(db_session, folder_count=2)
+    db_session.expunge_all()
+    polled = []
+
+    async def fake_poll(self, conn, commit=True):
+        polled.append((conn.id, len(conn.folders), commit))
+        return 3
+
+    monkeypatch.setattr(GoogleDrivePollingService, "poll_connection", fake_poll)
+    service = GoogleDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+
+    assert await GoogleDrivePollingService.get_connection_ids(db_session) == [str(connection.id)]
+    assert await service.poll_connection_by_id(str(connection.id)) == 3
+    assert polled == [(connection.id, 2, True)]
+    assert await service.poll_connection_by_id(str(uuid.uuid4())) == 0
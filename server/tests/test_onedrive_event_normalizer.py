@@ -0,0 +1,77 @@
+"""
+Unit tests for OneDrive event normalizer.
+"""
+
+import uuid
+from datetime import datetime, timezone
+
+from app.models.onedrive import OneDriveConnection, OneDriveProtectedFolder
+from app.services.onedrive_event_normalizer import normalize_delta_item
+
+
+def build_connection():
+    conn = OneDriveConnection(
+        id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        microsoft_user_id="ms-user-1",
+        microsoft_user_email="owner@example.com",
+    )
+    conn.set_refresh_token("refresh-token")
+    return conn
+
+
+def build_folder(connection):
+    return OneDriveProtectedFolder(
+        id=uuid.uuid4(),
+        connection_id=connection.id,
+        folder_id="folder-1",
+        folder_name="Finance",
+        folder_path="/Finance",
+    )
+
+
+def test_normalize_delta_item_exposes_parsed_timestamp():
+    connection = build_connection()
+    folder = build_folder(connection)
+    item = {
+        "id": "file-1",
+        "name": "report.xlsx",
+        "lastModifiedDateTime": "2025-02-02T10:00:00.1234567Z",
+        "file": {"mimeType": "application/vnd.ms-excel"},
+    }
+
+    event = normalize_delta_item(item, "moved", connection, folder)
+
+    assert event["timestamp"] == "2025-02-02T10:00:00.123456Z"
+    assert event["_ts"] == datetime(2025, 2, 2, 10, 0, 0, 123456, tzinfo=timezone.utc)
+
+
+def test_normalize_delta_item_keeps_unparseable_timestamp():
+    connection = build_connection()
+    folder = build_folder(connection)
+    item = {"id": "file-1", "name": "report.xlsx", "lastModifiedDateTime": "yesterday"}
+
+    event = normalize_delta_item(item, "moved", connection, folder)
+
+    assert event["timestamp"] == "yesterday"
+    assert event["_ts"] is None
+
+
+def test_normalize_delta_item_honours_caller_subtype():
+    connection = build_connection()
+    folder = build_folder(connection)
+    item = {
+        "id": "file-1",
+        "name": "report.xlsx",
+        "createdDateTime": "2025-02-02T10:00:00Z",
+        "lastModifiedDateTime": "2025-02-02T10:00:30Z",
+    }
+
+    heuristic = normalize_delta_item(dict(item), "updated", connection, folder)
+    forced = normalize_delta_item(dict(item), "updated", connection, folder, event_subtype="file_modified")
+
+    assert heuristic["event_subtype"] == "file_created"
+    assert forced["event_subtype"] == "file_modified"
+    assert forced["change_type"] == "updated"
+    assert forced["description"] == "File Modified: report.xlsx"
+    assert forced["event_id"] == heuristic["event_id"]
@@ -0,0 +1,73 @@
+"""
+Smoke tests for OneDrive ORM models.
+"""
+
+import time
+
+import pytest
+
+from app.models.onedrive import OneDriveConnection
+from app.models.user import User, UserRole
+
+
+@pytest.mark.asyncio
+async def test_onedrive_connection_token_expiry_epoch(db_session):
+    """Token expiry round-trips as epoch seconds and honours the refresh skew."""
+    user = User(
+        email="onedrive-user@example.com",
+        hashed_password="hashed",
+        full_name="OneDrive User",
+        role=UserRole.ADMIN,
+        organization="CyberSentinel",
+    )
+    db_session.add(user)
+    await db_session.flush()
+
+    connection = OneDriveConnection(
+        user_id=user.id,
+        microsoft_user_id="ms-account-123",
+        microsoft_user_email="ms-account@example.com",
+        status="active",
+    )
+    connection.set_refresh_token("refresh-token-value")
+    connection.set_access_token("access-token-value")
+    connection.set_token_expiry(3600)
+
+    db_session.add(connection)
+    await db_session.commit()
+    await db_session.refresh(connection)
+
+    assert isinstance(connection.token_expiry, int)
+    assert abs(connection.token_expiry - (int(time.time()) + 3600)) <= 2
+    assert connection.is_token_expired() is False
+
+    # Inside the skew window the token is treated as expired
+    connection.token_expiry = int(time.time()) + OneDriveConnection.TOKEN_EXPIRY_SKEW_SECONDS - 1
+    assert connection.is_token_expired() is True
+
+    connection.set_token_expiry(None)
+    assert connection.token_expiry is None
+    assert connection.is_token_expired() is True
+
+
+def test_onedrive_access_token_decrypted_once_per_ciphertext(monkeypatch):
+    """Repeated reads of the same stored token skip decryption; a new token is decrypted afresh."""
+    connection = OneDriveConnection(microsoft_user_id="ms-account-456", status="active")
+    connection.set_access_token("first-token")
+    cipher = OneDriveConnection._get_cipher()
+    decrypts = []
+    real_decrypt = cipher.decrypt
+
+    def counting_decrypt(token):
+        decrypts.append(token)
+        return real_decrypt(token)
+
+    monkeypatch.setattr(cipher, "decrypt", counting_decrypt)
+
+    assert connection.get_access_token() == "first-token"
+    assert connection.get_access_token() == "first-token"
+    assert len(decrypts) == 1
+
+    connection.set_access_token("second-token")
+    assert connection.get_access_token() == "second-token"
+    assert len(decrypts) == 2
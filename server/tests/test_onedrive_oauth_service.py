@@ -0,0 +1,250 @@
+"""
+Tests for OneDrive OAuth service.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.onedrive import OneDriveConnection, OneDriveProtectedFolder
+from app.models.user import User, UserRole
+from app.services.onedrive_oauth import OneDriveOAuthService
+
+
+class MemoryStateStore:
+    """Simple in-memory async store used for tests."""
+
+    def __init__(self) -> None:
+        self.store: Dict[str, Any] = {}
+
+    async def set(self, key: str, value: Any, expire: int | None = None) -> None:
+        self.store[key] = value
+
+    async def get(self, key: str) -> Any:
+        return self.store.get(key)
+
+    async def delete(self, key: str) -> None:
+        self.store.pop(key, None)
+
+    async def set_if_absent(self, key: str, value: Any, expire: int | None = None) -> bool:
+        if key in self.store:
+            return False
+        self.store[key] = value
+        return True
+
+
+def _folder(folder_id: str) -> Dict[str, Any]:
+    return {"id": folder_id, "name": folder_id, "mimeType": "application/vnd.google-apps.folder", "iconLink": None}
+
+
+@pytest.mark.asyncio
+async def test_list_folders_recursive_follows_pages_and_bounds_concurrency(monkeypatch):
+    """Recursive listing should follow nextLinks, expand subfolders and respect the semaphore."""
+    service = OneDriveOAuthService(db=None, state_store=MemoryStateStore())
+
+    async def fake_token(self, user_id, connection_id):
+        return "access-token"
+
+    tree = {
+        "root": [["a", "b"], ["c"]],  # two pages
+        "a": [["a1"]],
+        "b": [[]],
+        "c": [["c1", "c2"]],
+    }
+    in_flight = 0
+    peak = 0
+
+    async def fake_page(self, client, access_token, endpoint, params):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+
+        if endpoint.startswith("next:"):
+            parent, index = endpoint[len("next:"):].split(":")
+            index = int(index)
+        else:
+            parent = "root" if endpoint.endswith("/root/children") else endpoint.split("/items/")[1].split("/")[0]
+            index = 0
+        pages = tree.get(parent, [[]])
+        next_link = f"next:{parent}:{index + 1}" if index + 1 < len(pages) else None
+        return [_folder(fid) for fid in pages[index]], next_link
+
+    monkeypatch.setattr(OneDriveOAuthService, "_get_folder_access_token", fake_token)
+    monkeypatch.setattr(OneDriveOAuthService, "_fetch_folder_page", fake_page)
+
+    result = await service.list_folders_recursive(uuid4(), uuid4(), max_depth=2, concurrency=2)
+
+    files = result["files"]
+    assert [f["id"] for f in files] == ["a", "b", "c"]
+    children = {f["id"]: [child["id"] for child in f["children"]] for f in files}
+    assert children == {"a": ["a1"], "b": [], "c": ["c1", "c2"]}
+    # Depth limit: grandchildren are not expanded
+    assert all("children" not in child for f in files for child in f["children"])
+    assert peak <= 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_user_profile_is_cached_per_token(monkeypatch):
+    """A second profile lookup with the same token should be served from the state store."""
+    state_store = MemoryStateStore()
+    service = OneDriveOAuthService(db=None, state_store=state_store)
+    calls = []
+
+    class FakeResponse:
+        content = b'{"id": "ms-user", "mail": "user@example.com"}'
+
+        def raise_for_status(self) -> None:
+            return None
+
+    class FakeClient:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc) -> None:
+            return None
+
+        async def get(self, url, headers=None):
+            calls.append(url)
+            return FakeResponse()
+
+    monkeypatch.setattr("app.services.onedrive_oauth.httpx.AsyncClient", lambda *a, **kw: FakeClient())
+
+    first = await service._fetch_user_profile("token-1")
+    second = await service._fetch_user_profile("token-1")
+
+    assert first == second == {"id": "ms-user", "mail": "user@example.com"}
+    assert len(calls) == 1
+    assert not any("token-1" in key for key in state_store.store)
+
+
+@pytest.mark.asyncio
+async def test_list_connections_derives_monitoring_since_from_loaded_folders(db_session):
+    """Folders are eager-loaded and monitoring_since is the earliest folder baseline."""
+    user = User(
+        email="onedrive-owner@example.com",
+        hashed_password="hashed",
+        full_name="OneDrive Owner",
+        role=UserRole.ADMIN,
+        organization="CyberSentinel",
+    )
+    db_session.add(user)
+    await db_session.flush()
+
+    earliest = datetime(2025, 1, 1, 8, 0, 0)
+    with_folders = OneDriveConnection(user_id=user.id, microsoft_user_id="ms-1", status="active")
+    with_folders.set_refresh_token("refresh-1")
+    without_folders = OneDriveConnection(user_id=user.id, microsoft_user_id="ms-2", status="active")
+    without_folders.set_refresh_token("refresh-2")
+    db_session.add_all([with_folders, without_folders])
+    await db_session.flush()
+
+    db_session.add_all(
+        [
+            OneDriveProtectedFolder(connection_id=with_folders.id, folder_id="f1", last_seen_timestamp=earliest),
+            OneDriveProtectedFolder(
+                connection_id=with_folders.id, folder_id="f2", last_seen_timestamp=earliest + timedelta(days=1)
+            ),
+            OneDriveProtectedFolder(connection_id=with_folders.id, folder_id="f3"),
+        ]
+    )
+    await db_session.commit()
+    db_session.expunge_all()
+
+    service = OneDriveOAuthService(db_session, state_store=MemoryStateStore())
+    connections = {c.microsoft_user_id: c for c in await service.list_connections(user.id)}
+
+    assert connections["ms-1"].monitoring_since == earliest
+    assert len(connections["ms-1"].folders) == 3
+    assert connections["ms-2"].monitoring_since is None
+
+
+@pytest.mark.asyncio
+async def test_signed_state_round_trip_and_replay(monkeypatch):
+    """Signed state carries the user id, rejects tampering/expiry, and is single-use."""
+    service = OneDriveOAuthService(db=None, state_store=MemoryStateStore())
+    user_id = uuid4()
+
+    state = service._encode_state(user_id)
+    decoded = service._decode_state(state)
+    assert decoded is not None and decoded[0] == user_id
+
+    tampered = ("A" if state[0] != "A" else "B") + state[1:]
+    assert service._decode_state(tampered) is None
+    assert service._decode_state("not-a-state") is None
+
+    assert await service._claim_state_nonce(decoded[1]) is True
+    assert await service._claim_state_nonce(decoded[1]) is False
+
+    async def fail_exchange(self, code):  # pragma: no cover - must not be reached
+        raise AssertionError("replayed state reached token exchange")
+
+    monkeypatch.setattr(OneDriveOAuthService, "_exchange_code_for_tokens", fail_exchange)
+    with pytest.raises(HTTPException) as exc_info:
+        await service.handle_oauth_callback("code", state)
+    assert exc_info.value.status_code == 400
+
+    future = time.time() + OneDriveOAuthService.STATE_TTL_SECONDS + 1
+    monkeypatch.setattr("app.services.onedrive_oauth.time.time", lambda: future)
+    assert service._decode_state(service._encode_state(user_id)) is not None
+    assert service._decode_state(state) is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_all_expired_refreshes_concurrently_and_isolates_failures(monkeypatch, db_session):
+    """Expired connections refresh in parallel; a failing one is marked errored without aborting the rest."""
+    user = User(
+        email="onedrive-refresh@example.com",
+        hashed_password="hashed",
+        full_name="OneDrive Refresh",
+        role=UserRole.ADMIN,
+        organization="CyberSentinel",
+    )
+    db_session.add(user)
+    await db_session.flush()
+
+    connections = []
+    for ms_id, expiry in (("ok", 0), ("bad", 0), ("fresh", int(time.time()) + 3600)):
+        connection = OneDriveConnection(user_id=user.id, microsoft_user_id=ms_id, status="active")
+        connection.set_refresh_token(f"refresh-{ms_id}")
+        connection.set_access_token(f"access-{ms_id}")
+        connection.token_expiry = expiry
+        connections.append(connection)
+    db_session.add_all(connections)
+    await db_session.commit()
+
+    in_flight = 0
+    peak = 0
+    acquired = []
+
+    async def fake_acquire(self, connection):
+        nonlocal in_flight, peak
+        acquired.append(connection.microsoft_user_id)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+        if connection.microsoft_user_id == "bad":
+            raise ValueError("Token refresh failed: invalid_grant")
+        return {"access_token": "new-access", "refresh_token": "new-refresh", "expires_in": 3600}
+
+    monkeypatch.setattr(OneDriveOAuthService, "_acquire_refreshed_tokens", fake_acquire)
+
+    service = OneDriveOAuthService(db_session, state_store=MemoryStateStore())
+    result = {c.microsoft_user_id: c for c in await service.refresh_all_expired(user.id)}
+
+    assert sorted(acquired) == ["bad", "ok"]
+    assert peak == 2
+    assert result["ok"].get_access_token() == "new-access"
+    assert result["ok"].is_token_expired() is False
+    assert result["bad"].status == "error"
+    assert "invalid_grant" in result["bad"].error_message
+    assert result["fresh"].get_access_token() == "access-fresh"
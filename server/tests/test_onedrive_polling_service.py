@@ -0,0 +1,1096 @@
+"""
+Tests for OneDrive polling service.
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.models.onedrive import OneDriveConnection, OneDriveProtectedFolder
+from app.models.user import User, UserRole
+from app.services.onedrive_event_normalizer import normalize_delta_item
+from app.services import onedrive_event_documents, onedrive_polling
+from app.services.onedrive_polling import OneDrivePollingService
+
+
+@pytest.fixture(autouse=True)
+def _reset_recent_event_ids():
+    OneDrivePollingService._recent_event_ids.clear()
+    yield
+    OneDrivePollingService._recent_event_ids.clear()
+
+
+class FakeCollection:
+    def __init__(self) -> None:
+        self.docs = []
+        self.bulk_write_calls = 0
+        self.find_calls = 0
+        self.indexes = []
+
+    def find(self, query, projection=None):
+        wanted = set(query["id"]["$in"])
+        self.find_calls += 1
+
+        async def _cursor():
+            for doc in self.docs:
+                if doc["id"] in wanted:
+                    yield {"id": doc["id"]}
+
+        return _cursor()
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs.get("unique", False)))
+
+    async def bulk_write(self, operations, ordered=True, bypass_document_validation=False):
+        self.bulk_write_calls += 1
+        stored = {doc["id"] for doc in self.docs}
+        upserted = 0
+        for operation in operations:
+            doc = operation._doc["$setOnInsert"]
+            if doc["id"] not in stored:
+                self.docs.append(doc)
+                stored.add(doc["id"])
+                upserted += 1
+        return SimpleNamespace(upserted_count=upserted)
+
+
+class FakeProcessor:
+    def __init__(self) -> None:
+        self.batches = 0
+
+    async def process_event(self, event):
+        processed = dict(event)
+        processed["matched_policies"] = [
+            {
+                "policy_id": "policy-1",
+                "policy_name": "Test Policy",
+                "severity": "medium",
+                "priority": 100,
+                "matched_rules": [],
+            }
+        ]
+        processed["policy_action_summaries"] = []
+        return processed
+
+    async def process_batch(self, events):
+        self.batches += 1
+        return [await self.process_event(event) for event in events]
+
+
+class FakePipeline:
+    def __init__(self, redis) -> None:
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    def setex(self, key, ttl, value):
+        self.commands.append(("set", key, value, False))
+        return self
+
+    def set(self, key, value, nx=False, ex=None):
+        self.commands.append(("set", key, value, nx))
+        return self
+
+    def unlink(self, *keys):
+        self.commands.append(("unlink", keys, None, False))
+        return self
+
+    async def execute(self):
+        self.redis.executes += 1
+        results = []
+        for op, key, value, nx in self.commands:
+            if op == "unlink":
+                self.redis.unlink_calls += 1
+                results.append(sum(1 for k in key if self.redis.store.pop(k, None) is not None))
+                continue
+            if nx and key in self.redis.store:
+                results.append(None)
+                continue
+            self.redis.store[key] = value
+            results.append(True)
+        return results
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.store = {}
+        self.mget_calls = 0
+        self.executes = 0
+        self.unlink_calls = 0
+
+    async def mget(self, keys):
+        self.mget_calls += 1
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+async def _seed_connection(db_session):
+    user = User(
+        email="onedrive-cloud@example.com",
+        hashed_password="hashed",
+        full_name="Cloud User",
+        role=UserRole.ADMIN,
+        organization="CyberSentinel",
+    )
+    db_session.add(user)
+    await db_session.flush()
+
+    connection = OneDriveConnection(
+        user_id=user.id,
+        microsoft_user_id="ms-user-1",
+        microsoft_user_email="cloud@example.com",
+        status="active",
+    )
+    connection.set_refresh_token("refresh-token")
+    connection.set_access_token("access-token")
+    connection.token_expiry = int(time.time()) + 3600
+    db_session.add(connection)
+    await db_session.flush()
+
+    folder = OneDriveProtectedFolder(
+        connection_id=connection.id,
+        folder_id="folder-1",
+        folder_name="Finance",
+        folder_path="/Finance",
+        last_seen_timestamp=datetime(2025, 1, 1),
+    )
+    db_session.add(folder)
+    await db_session.commit()
+    return connection, folder
+
+
+def _delta_item(item_id: str, **extra):
+    item = {
+        "id": item_id,
+        "name": f"{item_id}.docx",
+        "file": {"mimeType": "application/msword"},
+        "parentReference": {"id": "folder-1", "path": "/drive/root:/Finance"},
+        "createdDateTime": "2025-02-01T10:00:00Z",
+        "lastModifiedDateTime": "2025-02-02T10:00:00Z",
+        "lastModifiedBy": {"user": {"mail": "cloud@example.com"}},
+    }
+    item.update(extra)
+    return item
+
+
+@pytest.mark.asyncio
+async def test_poll_connection_pages_delta_over_shared_client(db_session):
+    """Delta pages are fetched on the pooled client and events/delta token are persisted."""
+    connection, folder = await _seed_connection(db_session)
+    # Root delta path: items outside the protected folder must be filtered client-side
+    connection.supports_folder_delta = False
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(str(request.url))
+        assert request.headers["Authorization"] == "Bearer access-token"
+        if "page=2" in str(request.url):
+            return httpx.Response(
+                200,
+                json={
+                    "value": [
+                        _delta_item(
+                            "file-2", deleted={"state": "deleted"}, **{"@microsoft.graph.changeType": "deleted"}
+                        )
+                    ],
+                    "@odata.deltaLink": "https://graph.microsoft.com/v1.0/me/drive/root/delta?token=next",
+                },
+            )
+        return httpx.Response(
+            200,
+            json={
+                "value": [
+                    _delta_item("file-1", **{"@microsoft.graph.changeType": "moved"}),
+                    _delta_item("outside", parentReference={"id": "other", "path": "/drive/root:/Other"}),
+                ],
+                "@odata.nextLink": "https://graph.microsoft.com/v1.0/me/drive/root/delta?page=2",
+            },
+        )
+
+    collection = FakeCollection()
+    processor = FakeProcessor()
+    service = OneDrivePollingService(db_session, events_collection=collection, event_processor=processor)
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    try:
+        processed = await service.poll_connection(connection)
+    finally:
+        await service.aclose()
+
+    assert processed == 2
+    assert len(requests) == 2
+    assert collection.bulk_write_calls == 1
+    assert processor.batches == 1
+    assert {doc["event_subtype"] for doc in collection.docs} == {"file_moved", "file_deleted"}
+    assert folder.delta_token == "https://graph.microsoft.com/v1.0/me/drive/root/delta?token=next"
+    assert folder.last_seen_timestamp == datetime(2025, 2, 2, 10, 0, 0)
+    assert connection.last_polled_at is not None
+
+
+@pytest.mark.asyncio
+async def test_root_delta_matches_folder_as_whole_path_component(db_session):
+    """Nested items match the protected folder case-insensitively, but only as a full path segment."""
+    connection, folder = await _seed_connection(db_session)
+    connection.supports_folder_delta = False
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            json={
+                "value": [
+                    _delta_item("nested", parentReference={"id": "sub", "path": "/drive/root:/finance/Q1"}),
+                    _delta_item("direct-path", parentReference={"id": "x", "path": "/drive/root:/FINANCE"}),
+                    _delta_item("lookalike", parentReference={"id": "y", "path": "/drive/root:/FinanceArchive"}),
+                    _delta_item("no-path", parentReference={"id": "z"}),
+                ],
+                "@odata.deltaLink": "https://graph.microsoft.com/v1.0/me/drive/root/delta?token=next",
+            },
+        )
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        events, _latest, _token = await service._fetch_folder_events("access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    assert sorted(event["file_id"] for event in events) == ["direct-path", "nested"]
+
+
+@pytest.mark.asyncio
+async def test_poll_connection_fetches_folders_concurrently(monkeypatch, db_session):
+    """Folders are fetched in parallel and their cursors applied after the gather."""
+    connection, first = await _seed_connection(db_session)
+    second = OneDriveProtectedFolder(
+        connection_id=connection.id,
+        folder_id="folder-2",
+        folder_name="Legal",
+        folder_path="/Legal",
+        last_seen_timestamp=datetime(2025, 1, 1),
+    )
+    db_session.add(second)
+    await db_session.commit()
+
+    in_flight = 0
+    peak = 0
+
+    async def fake_fetch(self, access_token, conn, folder):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [], datetime(2025, 3, 1, tzinfo=timezone.utc), f"delta-{folder.folder_id}"
+
+    monkeypatch.setattr(OneDrivePollingService, "_fetch_folder_events", fake_fetch)
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    try:
+        await service.poll_connection(connection)
+    finally:
+        await service.aclose()
+
+    assert peak == 2
+    assert first.delta_token == "delta-folder-1"
+    assert second.delta_token == "delta-folder-2"
+    assert second.last_seen_timestamp == datetime(2025, 3, 1)
+
+
+@pytest.mark.asyncio
+async def test_updated_items_fetch_metadata_concurrently(monkeypatch, db_session):
+    """Metadata lookups for updated items run after paging, in parallel, and keep delta order."""
+    connection, folder = await _seed_connection(db_session)
+    items = [
+        _delta_item("file-a", **{"@microsoft.graph.changeType": "updated"}),
+        _delta_item("file-b", **{"@microsoft.graph.changeType": "moved"}),
+        _delta_item("file-c", **{"@microsoft.graph.changeType": "updated"}),
+    ]
+    in_flight = 0
+    peak = 0
+
+    async def fake_metadata(self, access_token, file_id):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"id": file_id, "eTag": f"etag-{file_id}", "lastModifiedDateTime": "2025-02-03T10:00:00Z"}
+
+    monkeypatch.setattr(OneDrivePollingService, "_fetch_file_metadata", fake_metadata)
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    try:
+        events = await service._build_folder_events(
+            [(item, item["@microsoft.graph.changeType"]) for item in items], "access-token", connection, folder
+        )
+    finally:
+        await service.aclose()
+
+    assert peak == 2
+    assert [event["file_id"] for event in events] == ["file-a", "file-b", "file-c"]
+    assert [event["event_subtype"] for event in events] == ["file_modified", "file_moved", "file_modified"]
+    assert events[0]["etag"] == "etag-file-a"
+
+
+@pytest.mark.asyncio
+async def test_file_states_are_read_with_one_mget_and_written_in_one_pipeline(monkeypatch, db_session):
+    """File state lookups are batched into a single MGET and writes into a single pipeline."""
+    connection, folder = await _seed_connection(db_session)
+    redis = FakeRedis()
+    known_key = f"onedrive:fs2:{connection.id}:file-known"
+    gone_key = f"onedrive:fs2:{connection.id}:file-gone"
+    redis.store[known_key] = json.dumps(["old", "2025-01-01T00:00:00Z", None])
+    redis.store[gone_key] = json.dumps(["x", None, None])
+
+    async def fake_metadata(self, access_token, file_id):
+        return {"id": file_id, "eTag": "new", "lastModifiedDateTime": "2025-02-03T10:00:00Z"}
+
+    monkeypatch.setattr(OneDrivePollingService, "_fetch_file_metadata", fake_metadata)
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    service.redis_client = redis
+    candidates = [
+        (_delta_item("file-known", eTag="new"), "created"),
+        (_delta_item("file-new", eTag="fresh"), "created"),
+        (_delta_item("file-gone", deleted={"state": "deleted"}), "deleted"),
+    ]
+    try:
+        events = await service._build_folder_events(candidates, "access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    assert [event["event_subtype"] for event in events] == ["file_modified", "file_created", "file_deleted"]
+    assert redis.mget_calls == 1
+    assert redis.executes == 1
+    assert json.loads(redis.store[known_key])[0] == "new"
+    assert json.loads(redis.store[f"onedrive:fs2:{connection.id}:file-new"])[0] == "fresh"
+    assert gone_key not in redis.store
+    assert redis.unlink_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_deleted_file_states_are_unlinked_in_one_call(db_session):
+    """Bulk deletions are one UNLINK in the state pipeline; a re-created file keeps its state."""
+    connection, folder = await _seed_connection(db_session)
+    redis = FakeRedis()
+    keys = {file_id: f"onedrive:fs2:{connection.id}:{file_id}" for file_id in ("gone-1", "gone-2", "back")}
+    for key in keys.values():
+        redis.store[key] = json.dumps(["old", None, None])
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    service.redis_client = redis
+    candidates = [
+        (_delta_item(file_id, deleted={"state": "deleted"}), "deleted") for file_id in ("gone-1", "gone-2", "back")
+    ]
+    candidates.append((_delta_item("back", eTag="reborn"), "created"))
+    try:
+        await service._build_folder_events(candidates, "access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    assert redis.unlink_calls == 1
+    assert redis.executes == 1
+    assert keys["gone-1"] not in redis.store and keys["gone-2"] not in redis.store
+    assert json.loads(redis.store[keys["back"]])[0] == "reborn"
+
+
+@pytest.mark.asyncio
+async def test_metadata_fetch_skipped_when_delta_carries_etag(monkeypatch, db_session):
+    """Only items missing eTag/lastModifiedDateTime trigger a Graph metadata lookup."""
+    connection, folder = await _seed_connection(db_session)
+    fetched = []
+
+    async def fake_metadata(self, access_token, file_id):
+        fetched.append(file_id)
+        return {"id": file_id, "eTag": "etag-fetched", "lastModifiedDateTime": "2025-02-03T10:00:00Z"}
+
+    monkeypatch.setattr(OneDrivePollingService, "_fetch_file_metadata", fake_metadata)
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    candidates = [
+        (_delta_item("with-etag", eTag="etag-delta"), "updated"),
+        (_delta_item("without-etag"), "updated"),
+    ]
+    try:
+        events = await service._build_folder_events(candidates, "access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    assert fetched == ["without-etag"]
+    assert [event["etag"] for event in events] == ["etag-delta", "etag-fetched"]
+
+
+@pytest.mark.asyncio
+async def test_file_state_cache_avoids_repeat_redis_reads_within_cycle(db_session):
+    """Folders sharing root-delta items only read each file state from Redis once per cycle."""
+    connection, folder = await _seed_connection(db_session)
+    redis = FakeRedis()
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    service.redis_client = redis
+    candidates = [(_delta_item("file-1", eTag="e1"), "created")]
+    try:
+        await service._build_folder_events(candidates, "access-token", connection, folder)
+        events = await service._build_folder_events(candidates, "access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    # First pass misses and writes through; second pass is served from the cycle cache
+    assert redis.mget_calls == 1
+    assert events[0]["event_subtype"] == "file_created"
+
+
+@pytest.mark.asyncio
+async def test_children_fallback_filters_by_baseline(db_session):
+    """The children fallback pages newest-first and stops once it reaches the baseline."""
+    connection, folder = await _seed_connection(db_session)
+
+    filters = []
+    urls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        filters.append(request.url.params.get("$filter"))
+        urls.append(str(request.url))
+        if "page=2" in str(request.url):
+            return httpx.Response(
+                200,
+                json={"value": [_delta_item("older", lastModifiedDateTime="2024-06-01T00:00:00Z")]},
+            )
+        if filters[0] and len(filters) == 1:
+            # Drive rejects server-side filtering; service must retry unfiltered
+            return httpx.Response(400, text='{"error": {"code": "invalidRequest"}}')
+        assert request.url.params["$orderby"] == "lastModifiedDateTime desc"
+        return httpx.Response(
+            200,
+            json={
+                # Newest first; the stale item is one the server did not filter out
+                "value": [
+                    _delta_item(
+                        "new",
+                        createdDateTime="2025-02-02T09:59:30.1234567Z",
+                        lastModifiedDateTime="2025-02-02T10:00:00.1234567Z",
+                    ),
+                    _delta_item("old", lastModifiedDateTime="2024-12-31T23:59:59Z"),
+                ],
+                "@odata.nextLink": "https://graph.microsoft.com/v1.0/me/drive/root/children?page=2",
+            },
+        )
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        events, latest, delta_token = await service._fetch_folder_events_via_children(
+            "access-token", connection, folder
+        )
+    finally:
+        await service.aclose()
+
+    assert filters == ["lastModifiedDateTime gt 2025-01-01T00:00:00Z", None]
+    assert not any("page=2" in url for url in urls)
+    assert [event["file_id"] for event in events] == ["new"]
+    assert events[0]["event_subtype"] == "file_created"
+    assert latest == datetime(2025, 2, 2, 10, 0, 0, 123456)
+    assert delta_token is None
+
+
+@pytest.mark.asyncio
+async def test_children_fallback_pages_everything_when_ordering_rejected(db_session):
+    """Without server-side ordering every page is read and stale items are dropped client-side."""
+    connection, folder = await _seed_connection(db_session)
+    seen_params = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        seen_params.append(("$filter" in params, "$orderby" in params))
+        if "$filter" in params or "$orderby" in params:
+            return httpx.Response(400, text='{"error": {"code": "invalidRequest"}}')
+        if "page=2" in str(request.url):
+            return httpx.Response(
+                200,
+                json={"value": [_delta_item("new", lastModifiedDateTime="2025-02-02T10:00:00Z")]},
+            )
+        return httpx.Response(
+            200,
+            json={
+                "value": [_delta_item("old", lastModifiedDateTime="2024-12-31T23:59:59Z")],
+                "@odata.nextLink": "https://graph.microsoft.com/v1.0/me/drive/root/children?page=2",
+            },
+        )
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        events, _latest, _token = await service._fetch_folder_events_via_children("access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    assert seen_params == [(True, True), (False, True), (False, False), (False, False)]
+    assert [event["file_id"] for event in events] == ["new"]
+
+
+@pytest.mark.asyncio
+async def test_delta_unsupported_is_remembered_per_connection(db_session):
+    """After an SPO-license rejection the connection skips delta and goes straight to children."""
+    connection, folder = await _seed_connection(db_session)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path.endswith("/delta"):
+            return httpx.Response(400, text='{"error": {"message": "Tenant does not have a SPO license."}}')
+        return httpx.Response(200, json={"value": []})
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        await service.poll_connection(connection)
+        assert connection.supports_delta is False
+        requests.clear()
+        await service.poll_connection(connection)
+    finally:
+        await service.aclose()
+
+    assert requests == ["/v1.0/me/drive/root/children"]
+
+
+@pytest.mark.asyncio
+async def test_poll_all_connections_eager_loads_folders(monkeypatch, db_session):
+    """Folders come from the single eager-loading query; connections without folders are skipped."""
+    connection, _ = await _seed_connection(db_session)
+    empty = OneDriveConnection(user_id=connection.user_id, microsoft_user_id="ms-user-2", status="active")
+    empty.set_refresh_token("refresh-token-2")
+    db_session.add(empty)
+    await db_session.commit()
+    db_session.expunge_all()
+
+    polled = []
+
+    async def fake_poll_folders(self, conn, access_token):
+        polled.append(conn.microsoft_user_id)
+        return 1
+
+    async def fail_refresh(*args, **kwargs):  # pragma: no cover - must not be reached
+        raise AssertionError("folders should already be loaded")
+
+    monkeypatch.setattr(OneDrivePollingService, "_poll_connection_folders", fake_poll_folders)
+    monkeypatch.setattr(db_session, "refresh", fail_refresh)
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    try:
+        processed = await service.poll_all_connections()
+    finally:
+        await service.aclose()
+
+    assert processed == 1
+    assert polled == ["ms-user-1"]
+
+
+@pytest.mark.asyncio
+async def test_idle_poll_only_records_poll_time(monkeypatch, db_session):
+    """A poll with no events and unchanged cursors leaves folder rows untouched."""
+    connection, folder = await _seed_connection(db_session)
+    folder.delta_token = "delta-same"
+    connection.status = "active"
+    stale = datetime(2024, 12, 31)
+    folder.updated_at = stale
+    await db_session.commit()
+
+    async def fake_fetch(self, access_token, conn, fld):
+        return [], None, "delta-same"
+
+    monkeypatch.setattr(OneDrivePollingService, "_fetch_folder_events", fake_fetch)
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    try:
+        assert await service.poll_connection(connection) == 0
+    finally:
+        await service.aclose()
+
+    assert folder.updated_at == stale
+    assert folder.delta_token == "delta-same"
+    assert connection.last_polled_at is not None
+    assert connection.last_polled_at.tzinfo is None
+
+
+@pytest.mark.asyncio
+async def test_seen_event_cache_skips_mongo_lookups(db_session):
+    """Duplicate detection uses one pipelined SET NX round-trip and never queries Mongo."""
+    connection, folder = await _seed_connection(db_session)
+    redis = FakeRedis()
+    collection = FakeCollection()
+
+    service = OneDrivePollingService(db_session, events_collection=collection, event_processor=FakeProcessor())
+    service.redis_client = redis
+    events = [
+        normalize_delta_item(_delta_item("file-1"), "moved", connection, folder),
+        normalize_delta_item(_delta_item("file-2"), "moved", connection, folder),
+    ]
+    try:
+        assert await service._persist_events(events) == 2
+        OneDrivePollingService._recent_event_ids.clear()
+        assert await service._persist_events(events + events) == 0
+    finally:
+        await service.aclose()
+
+    assert collection.find_calls == 0
+    assert redis.executes == 2
+    assert len(collection.docs) == 2
+
+
+@pytest.mark.asyncio
+async def test_insert_is_chunked_and_duplicate_key_errors_are_tolerated(monkeypatch, db_session):
+    """Documents are written in bounded unordered batches and E11000 failures don't raise."""
+    connection, folder = await _seed_connection(db_session)
+    calls = []
+
+    class ConflictingCollection(FakeCollection):
+        async def bulk_write(self, operations, ordered=True, bypass_document_validation=False):
+            calls.append((len(operations), ordered))
+            if len(calls) == 1:
+                raise BulkWriteError(
+                    {"nUpserted": len(operations) - 1, "writeErrors": [{"index": 0, "code": 11000, "errmsg": "dup"}]}
+                )
+            return SimpleNamespace(upserted_count=len(operations))
+
+    monkeypatch.setattr(OneDrivePollingService, "INSERT_BATCH_SIZE", 2)
+    service = OneDrivePollingService(
+        db_session, events_collection=ConflictingCollection(), event_processor=FakeProcessor()
+    )
+    events = [
+        normalize_delta_item(_delta_item(f"file-{index}"), "moved", connection, folder) for index in range(5)
+    ]
+    try:
+        inserted = await service._persist_events(events)
+    finally:
+        await service.aclose()
+
+    assert calls == [(2, False), (2, False), (1, False)]
+    assert inserted == 4
+
+
+@pytest.mark.asyncio
+async def test_insert_upserts_leave_concurrently_stored_events_untouched(db_session):
+    """An event another worker stored between the dedup check and the write is not overwritten."""
+    connection, folder = await _seed_connection(db_session)
+    collection = FakeCollection()
+    service = OneDrivePollingService(db_session, events_collection=collection, event_processor=FakeProcessor())
+    events = [
+        normalize_delta_item(_delta_item(f"file-{index}"), "moved", connection, folder) for index in range(2)
+    ]
+    existing = {"id": events[0]["event_id"], "source": "other-worker"}
+    try:
+        docs = [{"id": event["event_id"]} for event in events]
+        collection.docs.append(existing)
+        assert await service._insert_documents(docs) == (1, set())
+    finally:
+        await service.aclose()
+
+    assert collection.docs[0] is existing
+    assert [doc["id"] for doc in collection.docs] == [events[0]["event_id"], events[1]["event_id"]]
+
+
+@pytest.mark.asyncio
+async def test_mongo_duplicate_check_is_one_query_per_batch(db_session):
+    """Without Redis, already-stored ids are found with a single $in lookup."""
+    connection, folder = await _seed_connection(db_session)
+    collection = FakeCollection()
+    service = OneDrivePollingService(db_session, events_collection=collection, event_processor=FakeProcessor())
+    events = [
+        normalize_delta_item(_delta_item(f"file-{index}"), "moved", connection, folder) for index in range(3)
+    ]
+    try:
+        assert await service._persist_events(events[:1]) == 1
+        OneDrivePollingService._recent_event_ids.clear()
+        assert await service._persist_events(events) == 2
+    finally:
+        await service.aclose()
+
+    assert collection.find_calls == 2
+    assert len(collection.docs) == 3
+
+
+def test_timestamp_helpers_are_memoized_and_utc():
+    """Repeated Graph timestamps are parsed once; formatting normalizes to a Z-suffixed UTC string."""
+    service = OneDrivePollingService.__new__(OneDrivePollingService)
+
+    first = service._parse_timestamp("2025-02-02T10:00:00.5Z")
+    assert first == datetime(2025, 2, 2, 10, 0, 0, 500000, tzinfo=timezone.utc)
+    assert service._parse_timestamp("2025-02-02T10:00:00.5Z") is first
+    assert service._parse_timestamp("not-a-date") is None
+    assert service._format_timestamp(datetime(2025, 2, 2, 10, 0, 0, 500000)) == "2025-02-02T10:00:00Z"
+
+
+@pytest.mark.asyncio
+async def test_event_indexes_are_ensured_once_per_process(monkeypatch, db_session):
+    """The unique id and per-connection indexes are created before the first insert only."""
+    connection, folder = await _seed_connection(db_session)
+    monkeypatch.setattr(OneDrivePollingService, "_indexes_ensured", False)
+    collection = FakeCollection()
+    service = OneDrivePollingService(db_session, events_collection=collection, event_processor=FakeProcessor())
+    try:
+        await service._persist_events([normalize_delta_item(_delta_item("file-1"), "moved", connection, folder)])
+        await service._persist_events([normalize_delta_item(_delta_item("file-2"), "moved", connection, folder)])
+    finally:
+        await service.aclose()
+
+    assert collection.indexes == [("id", True), ([("agent_id", 1), ("timestamp", -1)], False)]
+
+
+@pytest.mark.asyncio
+async def test_recent_event_ids_short_circuit_and_stay_bounded(monkeypatch, db_session):
+    """Ids handled by this worker skip Redis and Mongo entirely; the LRU evicts the oldest ids."""
+    connection, folder = await _seed_connection(db_session)
+    monkeypatch.setattr(OneDrivePollingService, "RECENT_EVENT_IDS_MAX", 2)
+    redis = FakeRedis()
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    service.redis_client = redis
+    events = [
+        normalize_delta_item(_delta_item(f"file-{index}"), "moved", connection, folder) for index in range(3)
+    ]
+    try:
+        assert await service._persist_events(events[:2]) == 2
+        assert await service._persist_events(events[:2]) == 0
+        assert redis.executes == 1
+        assert await service._persist_events(events[2:]) == 1
+    finally:
+        await service.aclose()
+
+    assert list(OneDrivePollingService._recent_event_ids) == [events[1]["event_id"], events[2]["event_id"]]
+
+
+@pytest.mark.asyncio
+async def test_recent_event_ids_skip_events_that_failed(db_session):
+    """Events dropped by processing or rejected by the write stay out of the LRU so they are retried."""
+    connection, folder = await _seed_connection(db_session)
+    events = [
+        normalize_delta_item(_delta_item(f"file-{index}"), "moved", connection, folder) for index in range(3)
+    ]
+
+    class DroppingProcessor(FakeProcessor):
+        async def process_batch(self, batch):
+            processed = await super().process_batch(batch)
+            return [event for event in processed if event["event_id"] != events[0]["event_id"]]
+
+    class RejectingCollection(FakeCollection):
+        async def bulk_write(self, operations, ordered=True, bypass_document_validation=False):
+            raise BulkWriteError(
+                {"nUpserted": 0, "writeErrors": [{"index": 0, "code": 121, "errmsg": "invalid"}]}
+            )
+
+    service = OneDrivePollingService(
+        db_session, events_collection=RejectingCollection(), event_processor=DroppingProcessor()
+    )
+    try:
+        assert await service._persist_events(events) == 0
+    finally:
+        await service.aclose()
+
+    assert list(OneDrivePollingService._recent_event_ids) == [events[2]["event_id"]]
+
+
+@pytest.mark.asyncio
+async def test_seen_event_claims_are_released_when_events_are_not_stored(db_session):
+    """Redis claims for dropped, rejected or errored events are unlinked so the next poll retries them."""
+    connection, folder = await _seed_connection(db_session)
+    events = [
+        normalize_delta_item(_delta_item(f"file-{index}"), "moved", connection, folder) for index in range(3)
+    ]
+    keys = [f"onedrive:evt:{event['event_id']}" for event in events]
+
+    class DroppingProcessor(FakeProcessor):
+        async def process_batch(self, batch):
+            processed = await super().process_batch(batch)
+            return [event for event in processed if event["event_id"] != events[0]["event_id"]]
+
+    class RejectingCollection(FakeCollection):
+        async def bulk_write(self, operations, ordered=True, bypass_document_validation=False):
+            raise BulkWriteError(
+                {"nUpserted": 1, "writeErrors": [{"index": 0, "code": 121, "errmsg": "invalid"}]}
+            )
+
+    class FailingProcessor(FakeProcessor):
+        async def process_batch(self, batch):
+            raise RuntimeError("policy store unavailable")
+
+    redis = FakeRedis()
+    service = OneDrivePollingService(
+        db_session, events_collection=RejectingCollection(), event_processor=DroppingProcessor()
+    )
+    service.redis_client = redis
+    try:
+        await service._persist_events(events)
+        # file-0 was dropped by processing and file-1 rejected by Mongo; only file-2 stays claimed
+        assert sorted(redis.store) == [keys[2]]
+        assert redis.unlink_calls == 1
+
+        service.event_processor = FailingProcessor()
+        with pytest.raises(RuntimeError):
+            await service._persist_events(events[:2])
+    finally:
+        await service.aclose()
+
+    assert sorted(redis.store) == [keys[2]]
+    assert redis.unlink_calls == 2
+
+
+def test_raw_delta_item_is_trimmed_when_disabled():
+    """With ONEDRIVE_STORE_RAW_DELTA off, documents keep only the delta fields the dashboard reads."""
+    connection = OneDriveConnection(microsoft_user_id="ms-user-1")
+    folder = OneDriveProtectedFolder(folder_id="folder-1", folder_name="Finance", folder_path="/Finance")
+    item = _delta_item("file-1", eTag="etag-1", size=1024)
+    event = normalize_delta_item(item, "moved", connection, folder)
+
+    service = OneDrivePollingService.__new__(OneDrivePollingService)
+    service._store_raw_delta = True
+    assert service._build_event_document(event, {}, "onedrive-x")["details"]["raw_delta_item"] is item
+
+    service._store_raw_delta = False
+    trimmed = service._build_event_document(event, {}, "onedrive-x")["details"]["raw_delta_item"]
+    assert trimmed == {"id": "file-1", "name": item["name"], "parentReference": item["parentReference"]}
+
+
+@pytest.mark.asyncio
+async def test_build_event_document_without_processor_event_uses_event_fields(db_session):
+    """A processor result with no "event" section falls back to the normalized event's fields."""
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    event = {
+        "event_id": "evt-1",
+        "event_type": "file",
+        "severity": "low",
+        "source": "onedrive",
+        "action": "quarantined",
+        "timestamp": "2025-02-02T10:00:00Z",
+    }
+
+    try:
+        doc = service._build_event_document(event, {"event": None, "metadata": None}, "onedrive-conn")
+    finally:
+        await service.aclose()
+
+    assert doc["severity"] == "low"
+    assert doc["action_taken"] == "quarantined"
+    assert doc["metadata"] == {"activity_timestamp": datetime(2025, 2, 2, 10, 0, 0)}
+    assert onedrive_event_documents._EMPTY == {}
+
+
+@pytest.mark.asyncio
+async def test_delta_token_only_taken_from_delta_link(db_session):
+    """Intermediate nextLink pages never become the stored delta token."""
+    connection, folder = await _seed_connection(db_session)
+    folder.delta_token = "https://graph.microsoft.com/v1.0/me/drive/root/delta?token=previous"
+    await db_session.commit()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if "page=2" in str(request.url):
+            # Sync cut short: the last page carries neither nextLink nor deltaLink
+            return httpx.Response(200, json={"value": []})
+        return httpx.Response(
+            200,
+            json={"value": [], "@odata.nextLink": "https://graph.microsoft.com/v1.0/me/drive/root/delta?page=2"},
+        )
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        _events, _latest, delta_token = await service._fetch_folder_events("access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    assert delta_token is None
+
+
+@pytest.mark.asyncio
+async def test_graph_get_honours_retry_after_on_throttling(monkeypatch, db_session):
+    """429/503 responses are retried after at least Retry-After seconds."""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(onedrive_polling.asyncio, "sleep", fake_sleep)
+    statuses = iter([429, 503, 200])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = next(statuses)
+        headers = {"Retry-After": "7"} if status == 429 else {}
+        return httpx.Response(status, headers=headers, json={"value": []})
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        response = await service._graph_get("https://graph.microsoft.com/v1.0/me/drive/root/delta", "token")
+    finally:
+        await service.aclose()
+
+    assert response.status_code == 200
+    assert len(delays) == 2
+    assert delays[0] >= 7
+    assert 2 <= delays[1] < 3
+
+
+@pytest.mark.asyncio
+async def test_graph_get_gives_up_after_max_attempts(monkeypatch, db_session):
+    """Persistent throttling returns the last response once attempts are exhausted."""
+    async def fake_sleep(delay):
+        pass
+
+    monkeypatch.setattr(onedrive_polling.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(OneDrivePollingService, "GRAPH_MAX_ATTEMPTS", 3)
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503, json={})
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        response = await service._graph_get("https://graph.microsoft.com/v1.0/me/drive/root/delta", "token")
+    finally:
+        await service.aclose()
+
+    assert response.status_code == 503
+    assert calls == 3
+
+
+@pytest.mark.asyncio
+async def test_initial_sync_uses_folder_scoped_delta(db_session):
+    """Without a stored token, delta is requested for the protected folder's subtree only."""
+    connection, folder = await _seed_connection(db_session)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url)
+        return httpx.Response(
+            200,
+            json={
+                "value": [_delta_item("file-1", **{"@microsoft.graph.changeType": "moved"})],
+                "@odata.deltaLink": "https://graph.microsoft.com/v1.0/me/drive/items/folder-1/delta?token=t1",
+            },
+        )
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        events, _latest, delta_token = await service._fetch_folder_events("access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    assert requests[0].path == "/v1.0/me/drive/items/folder-1/delta"
+    assert requests[0].params["$select"] == OneDrivePollingService.DELTA_SELECT
+    assert [event["file_id"] for event in events] == ["file-1"]
+    assert delta_token == "https://graph.microsoft.com/v1.0/me/drive/items/folder-1/delta?token=t1"
+
+
+@pytest.mark.asyncio
+async def test_folder_delta_spo_error_falls_back_to_root_delta(db_session):
+    """An SPO-license rejection of folder delta is remembered and the folder resyncs from root delta."""
+    connection, folder = await _seed_connection(db_session)
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        if "/items/" in request.url.path:
+            return httpx.Response(400, text='{"error": {"message": "Tenant does not have a SPO license."}}')
+        return httpx.Response(
+            200,
+            json={
+                "value": [
+                    _delta_item("file-1", **{"@microsoft.graph.changeType": "moved"}),
+                    _delta_item("outside", parentReference={"id": "other", "path": "/drive/root:/Other"}),
+                ],
+                "@odata.deltaLink": "https://graph.microsoft.com/v1.0/me/drive/root/delta?token=r1",
+            },
+        )
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    await service.aclose()
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        events, _latest, delta_token = await service._fetch_folder_events("access-token", connection, folder)
+        # A stored root-delta token keeps filtering to the protected folder
+        folder.set_delta_token(delta_token)
+        again, _latest, _token = await service._fetch_folder_events("access-token", connection, folder)
+    finally:
+        await service.aclose()
+
+    assert paths == ["/v1.0/me/drive/items/folder-1/delta", "/v1.0/me/drive/root/delta", "/v1.0/me/drive/root/delta"]
+    assert connection.supports_folder_delta is False
+    assert connection.supports_delta is True
+    assert [event["file_id"] for event in events] == ["file-1"]
+    assert [event["file_id"] for event in again] == ["file-1"]
+
+
+@pytest.mark.asyncio
+async def test_poll_all_connections_commits_in_batches(monkeypatch, db_session):
+    """Cursors are committed every COMMIT_EVERY_CONNECTIONS polls plus once at the end."""
+    connection, _ = await _seed_connection(db_session)
+    for index in range(2):
+        extra = OneDriveConnection(
+            user_id=connection.user_id, microsoft_user_id=f"ms-extra-{index}", status="active"
+        )
+        extra.set_refresh_token("refresh-token")
+        extra.set_access_token("access-token")
+        extra.token_expiry = int(time.time()) + 3600
+        db_session.add(extra)
+        await db_session.flush()
+        db_session.add(
+            OneDriveProtectedFolder(
+                connection_id=extra.id,
+                folder_id=f"folder-extra-{index}",
+                folder_name="Extra",
+                folder_path="/Extra",
+                last_seen_timestamp=datetime(2025, 1, 1),
+            )
+        )
+    await db_session.commit()
+
+    commits = 0
+    real_commit = db_session.commit
+
+    async def counting_commit():
+        nonlocal commits
+        commits += 1
+        await real_commit()
+
+    async def fake_poll_folders(self, conn, access_token):
+        return 1
+
+    monkeypatch.setattr(OneDrivePollingService, "COMMIT_EVERY_CONNECTIONS", 2)
+    monkeypatch.setattr(OneDrivePollingService, "_poll_connection_folders", fake_poll_folders)
+    monkeypatch.setattr(db_session, "commit", counting_commit)
+
+    service = OneDrivePollingService(db_session, events_collection=FakeCollection(), event_processor=FakeProcessor())
+    try:
+        processed = await service.poll_all_connections()
+    finally:
+        await service.aclose()
+
+    assert processed == 3
+    assert commits == 2
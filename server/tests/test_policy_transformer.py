@@ -0,0 +1,156 @@
+"""
+Tests for the frontend-to-backend policy config transformer.
+"""
+
+import re
+
+import pytest
+
+from app.utils.policy_transformer import _transform_json, compile_rule_regex, transform_frontend_config_to_backend
+
+
+def test_clipboard_config_builds_regex_rules():
+    """Predefined ids map to their regexes, unknown ids are skipped, custom regexes are kept."""
+    conditions, actions = transform_frontend_config_to_backend(
+        "clipboard_monitoring",
+        {
+            "patterns": {"predefined": ["ssn", "unknown", "email"], "custom": [{"regex": "ACME-\\d+"}, {"regex": ""}]},
+            "action": "alert",
+        },
+    )
+
+    assert conditions["match"] == "any"
+    assert [rule["value"] for rule in conditions["rules"]] == [
+        r"\b\d{3}-\d{2}-\d{4}\b",
+        r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
+        "ACME-\\d+",
+    ]
+    assert {rule["operator"] for rule in conditions["rules"]} == {"matches_regex"}
+    assert actions == {"alert": {}}
+
+
+@pytest.mark.parametrize(
+    "policy_type, config, expected_rules, expected_actions",
+    [
+        (
+            "file_system_monitoring",
+            {"monitoredPaths": ["C:\\Data"], "events": {"create": True, "delete": False, "move": True}, "action": "block"},
+            [
+                {"field": "file_path", "operator": "starts_with", "value": "C:\\Data"},
+                {"field": "event_subtype", "operator": "in", "value": ["file_created", "file_moved"]},
+            ],
+            {"log": {}},
+        ),
+        (
+            "google_drive_local_monitoring",
+            {"monitoredFolders": ["Team/Finance"], "events": {"modify": True}, "fileExtensions": [".pdf"]},
+            [
+                {"field": "file_path", "operator": "starts_with", "value": "G:\\My Drive\\Team\\Finance\\"},
+                {"field": "source", "operator": "equals", "value": "google_drive_local"},
+                {"field": "event_subtype", "operator": "in", "value": ["file_modified"]},
+                {"field": "file_extension", "operator": "in", "value": [".pdf"]},
+            ],
+            {"log": {}},
+        ),
+        (
+            "file_transfer_monitoring",
+            {
+                "protectedPaths": ["/opt/data", "/srv/data"],
+                "monitoredDestinations": ["/mnt/usb"],
+                "events": {"create": True, "copy": True},
+                "action": "quarantine",
+                "quarantinePath": "/quarantine",
+            },
+            [
+                {"field": "source_path", "operator": "matches_any_prefix", "value": ["/opt/data", "/srv/data"]},
+                {"field": "destination_path", "operator": "starts_with", "value": "/mnt/usb"},
+                {"field": "event_subtype", "operator": "in", "value": ["file_created", "copy"]},
+            ],
+            {"quarantine": {"path": "/quarantine"}},
+        ),
+        (
+            "usb_device_monitoring",
+            {"events": {"connect": True, "fileTransfer": True}, "action": "alert"},
+            [{"field": "usb_event_type", "operator": "in", "value": ["connect", "file_transfer"]}],
+            {"alert": {}},
+        ),
+        (
+            "onedrive_cloud_monitoring",
+            {"connectionId": "conn-1", "protectedFolders": [{"id": "f1"}, {"name": "no id"}]},
+            [
+                {"field": "source", "operator": "equals", "value": "onedrive_cloud"},
+                {"field": "connection_id", "operator": "equals", "value": "conn-1"},
+                {"field": "folder_id", "operator": "in", "value": ["f1"]},
+            ],
+            {"log": {}},
+        ),
+    ],
+)
+def test_typed_configs_transform_to_rules(policy_type, config, expected_rules, expected_actions):
+    """Each policy type is routed to its transform."""
+    conditions, actions = transform_frontend_config_to_backend(policy_type, config)
+
+    assert conditions["rules"] == expected_rules
+    assert actions == expected_actions
+
+
+def test_unknown_type_returns_fresh_defaults():
+    """Unknown policy types get empty log-only defaults that callers may modify safely."""
+    first = transform_frontend_config_to_backend("unknown_monitoring", {})
+    assert first == ({"match": "all", "rules": []}, {"log": {}})
+
+    first[0]["rules"].append({"field": "x"})
+    assert transform_frontend_config_to_backend("unknown_monitoring", {})[0]["rules"] == []
+
+
+def test_predefined_clipboard_patterns_are_precompiled():
+    """Predefined regexes emitted by the transformer are already compiled for evaluation."""
+    conditions, _actions = transform_frontend_config_to_backend(
+        "clipboard_monitoring", {"patterns": {"predefined": ["ssn"]}}
+    )
+    hits_before = compile_rule_regex.cache_info().hits
+
+    pattern = compile_rule_regex(conditions["rules"][0]["value"])
+
+    assert compile_rule_regex.cache_info().hits == hits_before + 1
+    assert pattern.search("SSN 123-45-6789")
+    assert pattern.flags & re.IGNORECASE
+
+
+def test_repeated_configs_are_served_from_cache_as_fresh_copies():
+    """Identical configs reuse the cached transform, but every caller gets its own dicts."""
+    config = {"monitoredPaths": ["C:\\Cache"], "events": {"create": True}, "action": "alert"}
+    first = transform_frontend_config_to_backend("file_system_monitoring", config)
+    hits_before = _transform_json.cache_info().hits
+
+    second = transform_frontend_config_to_backend("file_system_monitoring", dict(config))
+
+    assert _transform_json.cache_info().hits == hits_before + 1
+    assert second == first
+    first[0]["rules"].clear()
+    assert second[0]["rules"] and second[0] is not first[0]
+
+
+def test_event_order_and_value_types_are_part_of_the_cache_key():
+    """Configs differing only in key order or true-vs-1 are not conflated."""
+    forward = transform_frontend_config_to_backend(
+        "file_system_monitoring", {"events": {"create": True, "move": True}}
+    )
+    reverse = transform_frontend_config_to_backend(
+        "file_system_monitoring", {"events": {"move": True, "create": True}}
+    )
+
+    assert forward[0]["rules"][0]["value"] == ["file_created", "file_moved"]
+    assert reverse[0]["rules"][0]["value"] == ["file_moved", "file_created"]
+    as_int = transform_frontend_config_to_backend("onedrive_cloud_monitoring", {"connectionId": 1})
+    as_bool = transform_frontend_config_to_backend("onedrive_cloud_monitoring", {"connectionId": True})
+    assert as_int[0]["rules"][1]["value"] is not True
+    assert as_bool[0]["rules"][1]["value"] is True
+
+
+def test_non_json_config_is_transformed_without_cache():
+    """Configs orjson can't serialize still transform."""
+    conditions, actions = transform_frontend_config_to_backend("usb_device_monitoring", {"events": {1: True}})
+
+    assert conditions["rules"] == []
+    assert actions == {"log": {}}
@@ -0,0 +1,63 @@
+"""
+Tests for the Google Drive and OneDrive polling Celery tasks.
+"""
+
+import pytest
+
+from app.tasks import google_drive_polling_tasks, onedrive_polling_tasks
+
+
+@pytest.mark.parametrize(
+    "module, fan_out, per_connection",
+    [
+        (google_drive_polling_tasks, "poll_google_drive_activity", "poll_google_drive_connection"),
+        (onedrive_polling_tasks, "poll_onedrive_activity", "poll_onedrive_connection"),
+    ],
+)
+def test_polling_fans_out_one_task_per_connection(monkeypatch, module, fan_out, per_connection):
+    """The beat task only lists connections and dispatches a group of per-connection polls."""
+    dispatched = []
+
+    class FakeGroup:
+        def __init__(self, signatures):
+            self.signatures = list(signatures)
+
+        def apply_async(self):
+            dispatched.append(self.signatures)
+
+    def fake_run_async(coro):
+        coro.close()
+        return ["conn-1", "conn-2"]
+
+    monkeypatch.setattr(module, "run_async", fake_run_async)
+    monkeypatch.setattr(module, "group", FakeGroup)
+
+    assert getattr(module, fan_out)() == 2
+
+    [signatures] = dispatched
+    assert [sig.task for sig in signatures] == [getattr(module, per_connection).name] * 2
+    assert [sig.args for sig in signatures] == [("conn-1",), ("conn-2",)]
+    assert all(sig.options["expires"] == module.POLL_CONNECTION_EXPIRES_SECONDS for sig in signatures)
+
+
+@pytest.mark.parametrize(
+    "module, fan_out",
+    [
+        (google_drive_polling_tasks, "poll_google_drive_activity"),
+        (onedrive_polling_tasks, "poll_onedrive_activity"),
+    ],
+)
+def test_polling_without_connections_dispatches_nothing(monkeypatch, module, fan_out):
+    """No group is sent when there is nothing to poll."""
+
+    def fake_run_async(coro):
+        coro.close()
+        return []
+
+    def fail_group(_signatures):  # pragma: no cover - must not be reached
+        raise AssertionError("nothing should be dispatched")
+
+    monkeypatch.setattr(module, "run_async", fake_run_async)
+    monkeypatch.setattr(module, "group", fail_group)
+
+    assert getattr(module, fan_out)() == 0
@@ -0,0 +1,90 @@
+"""
+Tests for the scheduled reporting Celery tasks.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from kombu.serialization import dumps, loads, prepare_accept_content
+
+import app.core.database as database
+from app.services.reporting_service import DEFAULT_SCHEDULES, ReportSchedule
+from app.tasks import reporting_tasks
+from app.tasks.celery_app import celery_app
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_run_scheduled_reports_runs_schedules_concurrently(monkeypatch):
+    """Every schedule gets its own session, reports overlap, and failures don't stop the rest."""
+    sessions = []
+    running = 0
+    peak = 0
+
+    def session_factory():
+        session = FakeSession()
+        sessions.append(session)
+        return session
+
+    class FakeReportingService:
+        def __init__(self, db_session=None):
+            self.db = db_session
+
+        async def generate_scheduled_report(self, schedule, start_date, end_date):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0)
+            running -= 1
+            if schedule.name == "broken":
+                raise RuntimeError("boom")
+            return {"success": True, "report_name": schedule.name}
+
+    monkeypatch.setattr(database, "postgres_session_factory", session_factory)
+    monkeypatch.setattr(reporting_tasks, "ReportingService", FakeReportingService)
+    schedules = [
+        ReportSchedule(name=name, frequency="daily", report_types=["summary"], recipients=[])
+        for name in ("broken", "first", "second")
+    ]
+
+    results = await reporting_tasks.run_scheduled_reports(schedules, datetime(2025, 1, 1), datetime(2025, 1, 2))
+
+    assert [result["success"] for result in results] == [False, True, True]
+    assert results[0]["error"] == "boom"
+    assert len(sessions) == 3
+    assert peak == 3
+
+
+def test_task_payloads_round_trip_through_orjson():
+    """Task results encode with the orjson serializer and decode under the app's accepted content."""
+    conf = celery_app.conf
+    result = {
+        "task": "daily_reports",
+        "completed_at": datetime(2024, 1, 2, 3, 4, 5).isoformat(),
+        "results": [{"success": True, "report_id": uuid.UUID(int=1)}],
+    }
+
+    content_type, encoding, payload = dumps(result, serializer=conf.result_serializer)
+
+    assert content_type == "application/x-orjson"
+    decoded = loads(payload, content_type, encoding, accept=prepare_accept_content(conf.accept_content))
+    assert decoded == {**result, "results": [{"success": True, "report_id": str(uuid.UUID(int=1))}]}
+    # Messages queued by producers still on plain JSON keep decoding
+    content_type, encoding, payload = dumps(result["results"][:0], serializer="json")
+    assert loads(payload, content_type, encoding, accept=prepare_accept_content(conf.accept_content)) == []
+
+
+def test_schedules_by_frequency_holds_enabled_default_schedules():
+    """The frequency index matches filtering DEFAULT_SCHEDULES by frequency and enabled."""
+    for frequency in ("daily", "weekly", "monthly"):
+        expected = [s for s in DEFAULT_SCHEDULES if s.frequency == frequency and s.enabled]
+        assert reporting_tasks._SCHEDULES_BY_FREQUENCY.get(frequency, []) == expected
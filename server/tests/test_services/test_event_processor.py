@@ -0,0 +1,83 @@
+"""
+Tests for EventProcessor batch processing
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.event_processor import EventProcessor
+
+
+class CountingEvaluator:
+    """Policy evaluator stub that counts policy loads."""
+
+    def __init__(self) -> None:
+        self.loads = 0
+
+    async def preload_policies(self) -> None:
+        self.loads += 1
+
+    async def evaluate_event(self, event):
+        return []
+
+
+def _event(event_id: str, **overrides):
+    event = {
+        "event_id": event_id,
+        "agent": {"id": "agent-1"},
+        "event": {"type": "file", "severity": "low"},
+    }
+    event.update(overrides)
+    return event
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_process_batch_loads_policies_once_and_skips_failures():
+    """Policies are loaded once per batch and a bad event does not drop the others"""
+    evaluator = CountingEvaluator()
+    processor = EventProcessor(policy_evaluator=evaluator)
+
+    processed = await processor.process_batch(
+        [_event("evt-1"), {"event_id": "evt-bad"}, _event("evt-2")]
+    )
+
+    assert evaluator.loads == 1
+    assert [event["event_id"] for event in processed] == ["evt-1", "evt-2"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_process_batch_empty_is_a_no_op():
+    """An empty batch returns immediately without touching policies"""
+    evaluator = CountingEvaluator()
+    processor = EventProcessor(policy_evaluator=evaluator)
+
+    assert await processor.process_batch([]) == []
+    assert evaluator.loads == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_process_batch_bounds_concurrency(monkeypatch):
+    """No more than BATCH_CONCURRENCY events are in the pipeline at once"""
+    processor = EventProcessor(policy_evaluator=CountingEvaluator())
+    monkeypatch.setattr(EventProcessor, "BATCH_CONCURRENCY", 2)
+    in_flight = 0
+    peak = 0
+
+    async def slow_process(event):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return event
+
+    monkeypatch.setattr(processor, "process_event", slow_process)
+
+    processed = await processor.process_batch([_event(f"evt-{index}") for index in range(5)])
+
+    assert len(processed) == 5
+    assert peak == 2
@@ -0,0 +1,288 @@
+"""
+Tests for PolicyService
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from app.services.policy_service import PolicyService
+
+
+async def _create_policy(service, mock_policy_data, name=None):
+    return await service.create_policy(
+        name=name or mock_policy_data["name"],
+        description=mock_policy_data["description"],
+        conditions=mock_policy_data["conditions"],
+        actions=mock_policy_data["actions"],
+        created_by=uuid.uuid4(),
+        priority=mock_policy_data["priority"],
+        compliance_tags=mock_policy_data["compliance_tags"],
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_update_policy_rename(db_session, mock_policy_data):
+    """Test renaming a policy, including to its current name"""
+    service = PolicyService(db_session)
+    policy = await _create_policy(service, mock_policy_data)
+
+    updated = await service.update_policy(policy.id, name=mock_policy_data["name"])
+    assert updated.name == mock_policy_data["name"]
+
+    updated = await service.update_policy(policy.id, name="Renamed Policy")
+    assert updated.id == policy.id
+    assert updated.name == "Renamed Policy"
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_update_policy_rename_conflict(db_session, mock_policy_data):
+    """Test renaming a policy to a name another policy already uses"""
+    service = PolicyService(db_session)
+    policy = await _create_policy(service, mock_policy_data)
+    await _create_policy(service, mock_policy_data, name="Other Policy")
+
+    with pytest.raises(ValueError, match="already exists"):
+        await service.update_policy(policy.id, name="Other Policy")
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_update_policy_not_found(db_session, mock_policy_data):
+    """Test updating a missing policy returns None even if the new name is taken"""
+    service = PolicyService(db_session)
+    await _create_policy(service, mock_policy_data)
+
+    assert await service.update_policy(uuid.uuid4(), name=mock_policy_data["name"]) is None
+    assert await service.update_policy(uuid.uuid4(), enabled=False) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_get_policy_stats(db_session, mock_policy_data):
+    """Test policy stats count total, active and inactive policies"""
+    service = PolicyService(db_session)
+    assert await service.get_policy_stats() == {"total": 0, "active": 0, "inactive": 0, "violations": 0}
+
+    await _create_policy(service, mock_policy_data)
+    disabled = await _create_policy(service, mock_policy_data, name="Disabled Policy")
+    await service.disable_policy(disabled.id)
+
+    assert await service.get_policy_stats() == {"total": 2, "active": 1, "inactive": 1, "violations": 0}
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_policy_lookups_reuse_compiled_statements(db_session, mock_policy_data):
+    """Test repeated lookups with different values hit the engine's compiled-statement cache"""
+    service = PolicyService(db_session)
+    policy = await _create_policy(service, mock_policy_data)
+    compiled_cache = db_session.bind.sync_engine._compiled_cache
+
+    db_session.expunge(policy)
+    await service.get_policy_by_id(policy.id)
+    await service.get_policy_by_name(mock_policy_data["name"])
+    cached_statements = len(compiled_cache)
+    assert cached_statements > 0
+
+    assert await service.get_policy_by_id(uuid.uuid4()) is None
+    assert await service.get_policy_by_name("Missing Policy") is None
+    assert len(compiled_cache) == cached_statements
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_enabled_policies_cached_until_write(db_session, mock_policy_data, monkeypatch):
+    """Test enabled policies are served from cache and reloaded after a policy write"""
+    service = PolicyService(db_session)
+    policy = await _create_policy(service, mock_policy_data)
+    loads = 0
+    real_get_all = PolicyService.get_all_policies
+
+    async def counting_get_all(self, *args, **kwargs):
+        nonlocal loads
+        loads += 1
+        return await real_get_all(self, *args, **kwargs)
+
+    monkeypatch.setattr(PolicyService, "get_all_policies", counting_get_all)
+
+    assert [p.id for p in await service.get_enabled_policies()] == [policy.id]
+    assert [p.id for p in await PolicyService(db_session).get_enabled_policies()] == [policy.id]
+    assert loads == 1
+
+    await service.disable_policy(policy.id)
+    assert await service.get_enabled_policies() == []
+    assert loads == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_list_policies_lite(db_session, mock_policy_data):
+    """Test policy summaries follow get_all_policies ordering without loading JSON columns"""
+    service = PolicyService(db_session)
+    low = await _create_policy(service, mock_policy_data)
+    high = await service.create_policy(
+        name="High Priority",
+        description="",
+        conditions=mock_policy_data["conditions"],
+        actions=mock_policy_data["actions"],
+        created_by=uuid.uuid4(),
+        priority=mock_policy_data["priority"] + 10,
+        severity="high",
+    )
+    await service.disable_policy(low.id)
+
+    rows = await service.list_policies_lite()
+    assert [row.id for row in rows] == [p.id for p in await service.get_all_policies()]
+    assert [row.id for row in rows] == [high.id, low.id]
+    assert rows[0].severity == "high"
+    assert not hasattr(rows[0], "conditions")
+
+    assert [row.name for row in await service.list_policies_lite(enabled_only=True)] == ["High Priority"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_update_policy_single_statement(db_session, mock_policy_data):
+    """Test updates apply with one UPDATE ... RETURNING and refresh instances already in the session"""
+    service = PolicyService(db_session)
+    policy = await _create_policy(service, mock_policy_data)
+    statements = []
+    engine = db_session.bind.sync_engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        updated = await service.update_policy(policy.id, priority=5, severity="low")
+        disabled = await service.disable_policy(policy.id)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert [s.split()[0] for s in statements] == ["UPDATE", "UPDATE"]
+    assert updated is policy and disabled is policy
+    assert (policy.priority, policy.severity, policy.enabled) == (5, "low", False)
+    # updated_at is set by the database clock in naive UTC
+    assert "updated_at=CURRENT_TIMESTAMP" in statements[0]
+    assert abs(policy.updated_at - datetime.utcnow()) < timedelta(minutes=1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_update_policy_without_changes_does_not_write(db_session, mock_policy_data):
+    """Test an empty update returns the policy without bumping updated_at"""
+    service = PolicyService(db_session)
+    policy = await _create_policy(service, mock_policy_data)
+    updated_at = policy.updated_at
+    statements = []
+    engine = db_session.bind.sync_engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        unchanged = await service.update_policy(policy.id)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert unchanged is policy
+    assert not any(s.split()[0] == "UPDATE" for s in statements)
+    await db_session.refresh(policy)
+    assert policy.updated_at == updated_at
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_create_policy_single_insert(db_session, mock_policy_data):
+    """Test creating a policy issues just the INSERT"""
+    service = PolicyService(db_session)
+    statements = []
+    engine = db_session.bind.sync_engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        policy = await _create_policy(service, mock_policy_data)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # Name uniqueness is left to the constraint: no pre-check SELECT and no refresh
+    assert [s.split()[0] for s in statements] == ["INSERT"]
+    assert policy.id is not None
+    assert policy.created_at is not None
+    assert policy.name == mock_policy_data["name"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_get_policy_by_id_uses_identity_map(db_session, mock_policy_data):
+    """Test repeated id lookups in one session, by UUID or string, issue no further SELECTs"""
+    service = PolicyService(db_session)
+    policy = await _create_policy(service, mock_policy_data)
+    statements = []
+    engine = db_session.bind.sync_engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert await service.get_policy_by_id(policy.id) is policy
+        assert await service.get_policy_by_id(str(policy.id)) is policy
+        assert await service.get_policy_by_id("not-a-uuid") is None
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert statements == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_create_policy_duplicate_name(db_session, mock_policy_data):
+    """Test creating a policy with a name already in use is rejected"""
+    service = PolicyService(db_session)
+    await _create_policy(service, mock_policy_data)
+
+    with pytest.raises(ValueError, match="already exists"):
+        await _create_policy(service, mock_policy_data)
+
+    # The failed INSERT is rolled back and the session stays usable
+    assert await service.get_policy_count() == 1
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "conditions, actions, message",
+    [
+        ([], {"alert": {}}, "Conditions must be a dictionary"),
+        ({"rules": []}, {"alert": {}}, "must contain 'match'"),
+        ({"match": "some", "rules": []}, {"alert": {}}, "Match type must be one of"),
+        ({"match": ["all"], "rules": []}, {"alert": {}}, "Match type must be one of"),
+        ({"match": "all"}, {"alert": {}}, "must contain 'rules'"),
+        ({"match": "all", "rules": {}}, {"alert": {}}, "Rules must be a list"),
+        ({"match": "all", "rules": []}, [], "Actions must be a dictionary"),
+        ({"match": "all", "rules": []}, {"notify": {}}, "At least one action"),
+    ],
+)
+def test_validate_policy_structure_rejects_invalid(conditions, actions, message):
+    """Test malformed conditions and actions raise ValueError with a descriptive message"""
+    service = PolicyService(db=None)
+
+    with pytest.raises(ValueError, match=message):
+        service._validate_policy_structure(conditions, actions)
+
+
+@pytest.mark.unit
+def test_validate_policy_structure_accepts_valid():
+    """Test a policy with a valid match type and a known action passes validation"""
+    PolicyService(db=None)._validate_policy_structure(
+        {"match": "any", "rules": [{"field": "content", "operator": "contains", "value": "x"}]},
+        {"log": {}, "notify": {}},
+    )
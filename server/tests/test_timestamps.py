@@ -0,0 +1,32 @@
+"""
+Tests for the shared UTC timestamp helpers.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from app.utils.timestamps import as_aware_utc, as_naive_utc, format_timestamp_utc, parse_timestamp_utc
+
+
+def test_utc_helpers_pass_through_utc_datetimes():
+    """UTC-aware datetimes are returned as-is; naive and offset datetimes are normalized to UTC."""
+    aware = datetime(2025, 2, 2, 10, 0, tzinfo=timezone.utc)
+    offset = datetime(2025, 2, 2, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+    naive = datetime(2025, 2, 2, 10, 0)
+
+    assert as_aware_utc(aware) is aware
+    assert as_aware_utc(offset).tzinfo is timezone.utc
+    assert as_aware_utc(naive) == aware
+    assert as_naive_utc(naive) is naive
+    assert as_naive_utc(aware) == naive
+    assert as_naive_utc(offset) == naive
+
+
+def test_parse_and_format_round_trip_through_utc():
+    """Offsets are converted to UTC on parse; formatting yields Z-suffixed seconds."""
+    parsed = parse_timestamp_utc("2025-02-02T12:00:00.5+02:00")
+
+    assert parsed == datetime(2025, 2, 2, 10, 0, 0, 500000, tzinfo=timezone.utc)
+    assert parsed.tzinfo is timezone.utc
+    assert parse_timestamp_utc("2025-02-02T12:00:00.5+02:00") is parsed
+    assert parse_timestamp_utc("not-a-date") is None
+    assert format_timestamp_utc(parsed) == "2025-02-02T10:00:00Z"
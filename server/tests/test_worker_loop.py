@@ -0,0 +1,113 @@
+"""
+Tests for the Celery worker event loop helpers.
+"""
+
+import asyncio
+
+import pytest
+
+import app.core.database as database
+from app.tasks import worker_loop
+
+
+@pytest.fixture
+def fresh_worker_loop(monkeypatch):
+    monkeypatch.setattr(worker_loop, "_WORKER_LOOP", None)
+    monkeypatch.setattr(database, "postgres_session_factory", None)
+    monkeypatch.setattr(database, "mongodb_database", None)
+    yield
+    loop = worker_loop._WORKER_LOOP
+    if loop is not None and not loop.is_closed():
+        loop.close()
+    asyncio.set_event_loop(None)
+
+
+def test_run_async_reuses_one_loop_and_initializes_databases_once(monkeypatch, fresh_worker_loop):
+    """Tasks share the worker loop; databases are initialized on first use and kept open."""
+    init_calls = []
+
+    async def fake_init():
+        init_calls.append(asyncio.get_running_loop())
+        database.postgres_session_factory = object()
+        database.mongodb_database = object()
+
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    monkeypatch.setattr(database, "init_databases", fake_init)
+
+    first = worker_loop.run_async(current_loop())
+    second = worker_loop.run_async(current_loop())
+
+    assert first is second
+    assert init_calls == [first]
+
+
+def test_interrupted_task_is_cancelled_before_the_next_one_runs(monkeypatch, fresh_worker_loop):
+    """A task interrupted mid-await (e.g. by a soft time limit) is unwound, not resumed by the next run_async."""
+    events = []
+
+    async def fake_init():
+        database.postgres_session_factory = object()
+        database.mongodb_database = object()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        events.append("finished")
+
+    async def quick():
+        await asyncio.sleep(0)
+        return "done"
+
+    def interrupt():
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(database, "init_databases", fake_init)
+    loop = worker_loop._get_worker_loop()
+    loop.call_later(0.01, interrupt)
+
+    with pytest.raises(KeyboardInterrupt):
+        worker_loop.run_async(slow())
+    assert events == ["cancelled"]
+
+    assert worker_loop.run_async(quick()) == "done"
+    assert events == ["cancelled"]
+    assert not asyncio.all_tasks(loop)
+
+
+def test_failed_database_init_closes_the_task_body(monkeypatch, fresh_worker_loop):
+    """If databases can't be initialized the task body is closed rather than left never-awaited."""
+
+    async def failing_init():
+        raise ConnectionError("postgres unavailable")
+
+    async def body():
+        return "unreachable"
+
+    monkeypatch.setattr(database, "init_databases", failing_init)
+    coro = body()
+
+    with pytest.raises(ConnectionError):
+        worker_loop.run_async(coro)
+    assert coro.cr_frame is None
+
+
+def test_shutdown_closes_databases_and_loop(monkeypatch, fresh_worker_loop):
+    """Worker shutdown disposes the pools on the worker loop and then closes it."""
+    closed = []
+
+    async def fake_close():
+        closed.append(asyncio.get_running_loop())
+
+    monkeypatch.setattr(database, "close_databases", fake_close)
+    loop = worker_loop._get_worker_loop()
+
+    worker_loop.shutdown_worker_loop()
+
+    assert closed == [loop]
+    assert loop.is_closed()
+    assert worker_loop._WORKER_LOOP is None